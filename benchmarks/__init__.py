@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks for the write and read paths. Each is run as a
+module, e.g. `python -m benchmarks.bulk_insert --help`, against a
+temporary SQLite database unless a database URL is given.
+"""
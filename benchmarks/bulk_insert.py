@@ -0,0 +1,76 @@
+"""
+Writing new maps, bands, and layers through the ORM, one object per row,
+against the Core executemany path in `tileadder.service.bulk`.
+"""
+
+from tilemaker.metadata.orm import BandORM, LayerORM, MapORM
+
+from .common import (
+    arguments,
+    create_map_group,
+    database,
+    provider,
+    synthetic_map_group,
+    timed,
+)
+
+
+def orm_insert(manager, name: str, maps: int, bands: int, layers: int):
+    with manager.session as session:
+        map_group_id = create_map_group(session, name)
+
+        for m in range(maps):
+            map_id = f"{name}-{m:08d}"
+            map_orm = MapORM(map_id=map_id, name=map_id, map_group_id=map_group_id)
+
+            for b in range(bands):
+                band_orm = BandORM(band_id=f"{map_id}-{b}", name=f"f{b:03d}")
+
+                for n in range(layers):
+                    layer_id = f"{map_id}-{b}-{n}"
+                    band_orm.layers.append(
+                        LayerORM(
+                            layer_id=layer_id,
+                            name=layer_id,
+                            quantity="T",
+                            units="uK",
+                            number_of_levels=8,
+                            tile_size=256,
+                            vmin="auto",
+                            vmax="auto",
+                            cmap="RdBu_r",
+                            provider=provider(map_id, n),
+                        )
+                    )
+
+                map_orm.bands.append(band_orm)
+
+            session.add(map_orm)
+
+        session.commit()
+
+
+def main():
+    parser = arguments(__doc__)
+    parser.add_argument("--layers", type=int, default=100_000)
+    parser.add_argument("--bands-per-map", type=int, default=3)
+    parser.add_argument("--layers-per-band", type=int, default=9)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    maps = max(1, args.layers // (args.bands_per_map * args.layers_per_band))
+    shape = (maps, args.bands_per_map, args.layers_per_band)
+    total = maps * args.bands_per_map * args.layers_per_band
+
+    print(f"{maps} maps x {args.bands_per_map} bands x {args.layers_per_band} layers")
+
+    with database(args.database_url) as manager:
+        with timed("ORM", rows=total):
+            orm_insert(manager, "orm", *shape)
+
+        with timed("Bulk", rows=total):
+            synthetic_map_group(manager, "bulk", *shape, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Shared pieces for the benchmarks: temporary databases, synthetic map
+groups, and timing.
+"""
+
+import argparse
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from tilemaker.metadata.orm import MapGroupORM
+
+from tileadder.server.database import EngineManager
+from tileadder.service.bulk import BulkInsert
+from tileadder.service.migrations import migrate
+
+
+def arguments(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--database-url",
+        default=None,
+        help="Database to run against; a temporary SQLite file by default.",
+    )
+
+    return parser
+
+
+@contextmanager
+def database(database_url: str | None = None) -> Iterator[EngineManager]:
+    """
+    A migrated database: the one given, or a temporary SQLite file that is
+    removed afterwards.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        manager = EngineManager(
+            database_url=database_url or f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        )
+        migrate(manager.engine)
+
+        try:
+            yield manager
+        finally:
+            manager.engine.dispose()
+
+
+@contextmanager
+def timed(label: str, rows: int | None = None) -> Iterator[None]:
+    start = time.perf_counter()
+
+    yield
+
+    elapsed = time.perf_counter() - start
+    rate = f" ({rows / elapsed:,.0f} rows/s)" if rows else ""
+
+    print(f"{label}: {elapsed:.3f}s{rate}")
+
+
+def provider(map_id: str, hdu: int) -> dict:
+    """
+    A provider like those written by ingestion, for a file that need not
+    exist.
+    """
+
+    return {
+        "provider_type": "fits",
+        "filename": f"/data/maps/depth1/{map_id[:5]}/{map_id}_map.fits",
+        "hdu": hdu,
+        "index": None,
+    }
+
+
+def create_map_group(session, name: str) -> int:
+    group = MapGroupORM(map_group_id=name, name=name, description=name)
+    session.add(group)
+    session.flush()
+
+    return group.id
+
+
+def synthetic_map_group(
+    manager: EngineManager,
+    name: str,
+    maps: int,
+    bands: int = 1,
+    layers: int = 1,
+    batch_size: int = 5000,
+) -> int:
+    """
+    Write a map group of `maps` maps of `bands` bands of `layers` layers
+    with the bulk inserter, returning its ID.
+    """
+
+    with manager.session as session:
+        map_group_id = create_map_group(session, name)
+        inserter = BulkInsert(batch_size=batch_size)
+
+        for m in range(maps):
+            map_id = f"{name}-{m:08d}"
+            inserter.add_map(map_id, name=map_id, map_group_id=map_group_id)
+
+            for b in range(bands):
+                band_id = f"{map_id}-{b}"
+                inserter.add_band(band_id, map_id, name=f"f{b:03d}")
+
+                for n in range(layers):
+                    layer_id = f"{band_id}-{n}"
+                    inserter.add_layer(
+                        layer_id,
+                        band_id,
+                        name=layer_id,
+                        quantity="T",
+                        units="uK",
+                        number_of_levels=8,
+                        tile_size=256,
+                        vmin="auto",
+                        vmax="auto",
+                        cmap="RdBu_r",
+                        provider=provider(map_id, n),
+                    )
+
+        inserter.write(session, measure_files=False)
+        session.commit()
+
+    return map_group_id
@@ -0,0 +1,99 @@
+"""
+Latency and memory use of rendering an evaluation preview from a large
+FITS image, which is read with a strided, memory-mapped sample rather than
+loaded whole.
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+BLOCK = 2880
+
+
+def write_image(path: Path, rows: int, columns: int, chunk_rows: int = 1024):
+    """
+    Write a float32 image of noise to `path` a block of rows at a time, so
+    that the image is never held in memory.
+    """
+
+    import numpy as np
+    from astropy.io import fits
+
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = -32
+    header["NAXIS"] = 2
+    header["NAXIS1"] = columns
+    header["NAXIS2"] = rows
+
+    generator = np.random.default_rng(0)
+
+    with open(path, "wb") as handle:
+        handle.write(header.tostring().encode("ascii"))
+
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            data = generator.standard_normal((count, columns), dtype=np.float32)
+            handle.write(data.astype(">f4").tobytes())
+
+        size = handle.tell()
+        handle.write(b"\0" * (-size % BLOCK))
+
+
+def peak_rss_mb() -> float:
+    # Kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=16384)
+    parser.add_argument("--columns", type=int, default=32768)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument(
+        "--directory",
+        default=None,
+        help="Where to write the test image; a temporary directory by default.",
+    )
+    args = parser.parse_args()
+
+    from tileadder.service.filesystem import _preview_image, preview_image
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        top_level = Path(directory)
+        path = top_level / "large.fits"
+
+        write_image(path, args.rows, args.columns)
+
+        print(
+            f"{args.rows} x {args.columns} float32 image, "
+            f"{path.stat().st_size / 1e9:.2f} GB"
+        )
+
+        # Imported up front so that neither the timings nor the memory
+        # growth include it.
+        import matplotlib.pyplot  # noqa: F401
+
+        before = peak_rss_mb()
+
+        for label in ("First", "Cached"):
+            start = time.perf_counter()
+            preview = preview_image(top_level=top_level, file_path=path, size=args.size)
+            print(
+                f"{label} preview: {time.perf_counter() - start:.3f}s, "
+                f"{len(preview) / 1e3:.0f} kB PNG"
+            )
+
+        _preview_image.cache_clear()
+        start = time.perf_counter()
+        preview_image(top_level=top_level, file_path=path, size=args.size)
+        print(f"Repeat uncached preview: {time.perf_counter() - start:.3f}s")
+
+        print(f"Peak RSS growth: {peak_rss_mb() - before:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Storage taken by layer providers, and the time to scan them, before and
+after they are rewritten in their compact form.
+"""
+
+import time
+
+from sqlalchemy import select, text
+from tilemaker.metadata.orm import LayerORM
+
+from tileadder.service.migrations import compact_providers, provider_storage
+
+from .common import arguments, database, synthetic_map_group, timed
+
+
+def report(manager, label: str):
+    with manager.engine.connect() as connection:
+        layers, size = provider_storage(connection)
+
+        start = time.perf_counter()
+        connection.execute(select(LayerORM.provider)).all()
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"{label}: {size / 1e6:.1f} MB of providers "
+        f"({size / max(layers, 1):.0f} bytes/layer), scanned in {elapsed:.3f}s"
+    )
+
+
+def main():
+    parser = arguments(__doc__)
+    parser.add_argument("--layers", type=int, default=100_000)
+    parser.add_argument("--bands-per-map", type=int, default=3)
+    parser.add_argument("--layers-per-band", type=int, default=9)
+    args = parser.parse_args()
+
+    maps = max(1, args.layers // (args.bands_per_map * args.layers_per_band))
+
+    with database(args.database_url) as manager:
+        # Providers are written as full dumps, as before they were compacted.
+        synthetic_map_group(
+            manager, "providers", maps, args.bands_per_map, args.layers_per_band
+        )
+
+        report(manager, "Before")
+
+        with timed("Compaction"):
+            with manager.engine.begin() as connection:
+                compact_providers(connection)
+
+        if manager.engine.dialect.name == "sqlite":
+            with manager.engine.connect() as connection:
+                connection.execute(text("VACUUM"))
+
+        report(manager, "After")
+
+
+if __name__ == "__main__":
+    main()
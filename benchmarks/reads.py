@@ -0,0 +1,78 @@
+"""
+Listing the maps of a large map group by loading full ORM entities, as
+the read helpers used to, against the column-projected queries in
+`tileadder.service.existing`.
+"""
+
+import time
+import tracemalloc
+
+from sqlalchemy import select
+from tilemaker.metadata.orm import MapORM
+
+from tileadder.service.existing import map_item, read_maps_for_map_group
+
+from .common import arguments, database, synthetic_map_group
+
+
+def entity_read(session, map_group_id: int) -> list[map_item]:
+    return [
+        map_item(
+            name=x.name,
+            id=x.id,
+            map_id=x.map_id,
+            map_group_id=x.map_group_id,
+            description=x.description,
+            grant=x.grant,
+            start_time=None,
+            end_time=None,
+        )
+        for x in session.execute(
+            select(MapORM).where(MapORM.map_group_id == map_group_id)
+        ).scalars()
+    ]
+
+
+def projected_read(session, map_group_id: int) -> list[map_item]:
+    return read_maps_for_map_group(session=session, map_group_id=map_group_id)
+
+
+def measure(manager, read, map_group_id: int, repeats: int) -> tuple[float, int]:
+    """
+    The best time of `repeats` reads, each in a fresh session, and the peak
+    memory allocated during one.
+    """
+
+    best = float("inf")
+
+    for _ in range(repeats):
+        with manager.session as session:
+            start = time.perf_counter()
+            read(session, map_group_id)
+            best = min(best, time.perf_counter() - start)
+
+    with manager.session as session:
+        tracemalloc.start()
+        read(session, map_group_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def main():
+    parser = arguments(__doc__)
+    parser.add_argument("--maps", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with database(args.database_url) as manager:
+        map_group_id = synthetic_map_group(manager, "reads", args.maps)
+
+        for label, read in (("Entities", entity_read), ("Projected", projected_read)):
+            elapsed, peak = measure(manager, read, map_group_id, args.repeats)
+            print(f"{label}: {elapsed:.3f}s, peak {peak / 1e6:.1f} MB allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Throughput of exporting a map group to a compressed JSON-lines file and
+importing it into an empty database.
+"""
+
+import gzip
+import os
+import tempfile
+from pathlib import Path
+
+from tileadder.service.transfer import export_map_group, import_map_group
+
+from .common import arguments, database, synthetic_map_group, timed
+
+
+def main():
+    parser = arguments(__doc__)
+    parser.add_argument(
+        "--target-database-url",
+        default=None,
+        help="Database to import into; a temporary SQLite file by default.",
+    )
+    parser.add_argument("--layers", type=int, default=1_000_000)
+    parser.add_argument("--bands-per-map", type=int, default=3)
+    parser.add_argument("--layers-per-band", type=int, default=9)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    maps = max(1, args.layers // (args.bands_per_map * args.layers_per_band))
+    total = maps * args.bands_per_map * args.layers_per_band
+
+    print(f"{maps} maps x {args.bands_per_map} bands x {args.layers_per_band} layers")
+
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        database(args.database_url) as source,
+        database(args.target_database_url) as target,
+    ):
+        path = Path(directory) / "export.jsonl.gz"
+
+        with timed("Setup", rows=total):
+            map_group_id = synthetic_map_group(
+                source,
+                "transfer",
+                maps,
+                args.bands_per_map,
+                args.layers_per_band,
+                batch_size=args.batch_size,
+            )
+
+        with timed("Export", rows=total):
+            with source.session as session, open(path, "wb") as handle:
+                for chunk in export_map_group(
+                    session=session,
+                    map_group_id=map_group_id,
+                    batch_size=args.batch_size,
+                ):
+                    handle.write(chunk)
+
+        print(f"Export size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        with timed("Import", rows=total):
+            with target.session as session, gzip.open(path) as lines:
+                _, written = import_map_group(
+                    session=session, lines=lines, batch_size=args.batch_size
+                )
+
+        assert written.layers == total
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Shared fixtures: a migrated SQLite database (or a PostgreSQL one, when
+TILEADDER_TEST_POSTGRES_URL points at a server), a way to fill it with
+synthetic map groups, and the web app configured from the environment.
+"""
+
+import importlib
+import os
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from tilemaker.metadata.orm import MapGroupORM
+
+from tileadder.server.database import EngineManager
+from tileadder.service.bulk import BulkInsert
+from tileadder.service.migrations import migrate
+from tileadder.settings import get_settings
+
+
+@pytest.fixture
+def manager(tmp_path) -> EngineManager:
+    manager = EngineManager(database_url=f"sqlite:///{tmp_path / 'tileadder.db'}")
+    migrate(manager.engine)
+
+    yield manager
+
+    manager.engine.dispose()
+
+
+@pytest.fixture
+def postgres_manager() -> EngineManager:
+    """
+    An EngineManager on a throwaway, migrated database on the PostgreSQL
+    server at TILEADDER_TEST_POSTGRES_URL. Skipped without one.
+    """
+    url = os.environ.get("TILEADDER_TEST_POSTGRES_URL")
+
+    if url is None:
+        pytest.skip("TILEADDER_TEST_POSTGRES_URL is not set")
+
+    name = f"tileadder_test_{uuid.uuid4().hex[:12]}"
+    server = create_engine(url, isolation_level="AUTOCOMMIT")
+
+    with server.connect() as connection:
+        connection.execute(text(f"CREATE DATABASE {name}"))
+
+    database_url = make_url(url).set(database=name)
+    manager = EngineManager(database_url=database_url.render_as_string(False))
+    migrate(manager.engine)
+
+    yield manager
+
+    manager.engine.dispose()
+
+    with server.connect() as connection:
+        connection.execute(text(f"DROP DATABASE {name}"))
+
+    server.dispose()
+
+
+@pytest.fixture
+def populate(manager):
+    """
+    Create a map group with `maps` maps of `bands` bands of `layers` layers
+    each, returning its ID. Layers point at files that do not exist.
+    """
+
+    def populate(name: str, maps: int, bands: int = 1, layers: int = 1) -> int:
+        with manager.session as session:
+            group = MapGroupORM(map_group_id=name, name=name, description=name)
+            session.add(group)
+            session.flush()
+
+            inserter = BulkInsert()
+
+            for m in range(maps):
+                map_id = f"{name}-{m}"
+                inserter.add_map(map_id, name=map_id, map_group_id=group.id)
+
+                for b in range(bands):
+                    band_id = f"{map_id}-{b}"
+                    inserter.add_band(band_id, map_id, name=f"band-{b}")
+
+                    for n in range(layers):
+                        layer_id = f"{band_id}-{n}"
+                        inserter.add_layer(
+                            layer_id,
+                            band_id,
+                            name=layer_id,
+                            provider={
+                                "provider_type": "fits",
+                                "filename": f"/maps/{map_id}.fits",
+                                "hdu": n,
+                            },
+                        )
+
+            inserter.write(session, measure_files=False)
+            session.commit()
+
+            return group.id
+
+    return populate
+
+
+@pytest.fixture
+def load_app(tmp_path, monkeypatch):
+    """
+    Import the web app afresh with the given TILEADDER_* settings (without
+    the prefix), on a database in the test's directory unless one is given.
+    Parts of the app, such as the replica middleware, are only set up at
+    import time.
+    """
+    import tileadder.server.app
+
+    def load_app(**environment: str) -> FastAPI:
+        environment = {
+            "auth_type": "mock",
+            "database_url": f"sqlite:///{tmp_path / 'tileadder.db'}",
+            **environment,
+        }
+
+        for name, value in environment.items():
+            monkeypatch.setenv(f"TILEADDER_{name.upper()}", value)
+
+        get_settings.cache_clear()
+
+        return importlib.reload(tileadder.server.app).app
+
+    yield load_app
+
+    monkeypatch.undo()
+    get_settings.cache_clear()
+    importlib.reload(tileadder.server.app)
@@ -0,0 +1,121 @@
+"""
+The authentication cache, and the cookie backend that uses it.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from soauth.toolkit.fastapi import SOAuthCookieBackend
+from starlette.authentication import AuthCredentials, SimpleUser, UnauthenticatedUser
+from starlette.requests import HTTPConnection
+
+from tileadder.server import auth
+from tileadder.server.auth import AuthCache, CachedSOAuthCookieBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(auth, "time", SimpleNamespace(time=lambda: clock.now))
+
+    return clock
+
+
+def _value(name: str) -> tuple[AuthCredentials, SimpleUser]:
+    return AuthCredentials(["maps:edit"]), SimpleUser(name)
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = AuthCache(max_size=2)
+
+    cache.put("a", _value("a"))
+    cache.put("b", _value("b"))
+    assert cache.get("a") is not None
+
+    cache.put("c", _value("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.info().evictions == 1
+    assert cache.info().size == 2
+
+
+def test_entries_expire_with_their_token(clock):
+    cache = AuthCache(ttl_seconds=60.0)
+
+    cache.put("long", _value("long"), token_expires=clock.now + 3600)
+    cache.put("short", _value("short"), token_expires=clock.now + 10)
+
+    clock.now += 10
+    assert cache.get("short") is None
+    assert cache.get("long") is not None
+
+    clock.now += 50
+    assert cache.get("long") is None
+    assert cache.info().expirations == 2
+
+
+def _connection(token: str | None) -> HTTPConnection:
+    headers = [] if token is None else [(b"cookie", f"access_token={token}".encode())]
+
+    return HTTPConnection({"type": "http", "headers": headers})
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """
+    A cached backend whose underlying soauth check accepts any token that
+    is not "bad", counting how often it is called.
+    """
+    calls = []
+
+    async def authenticate(self, conn):
+        token = conn.cookies.get("access_token")
+        calls.append(token)
+
+        if token is None or token == "bad":
+            return AuthCredentials([]), UnauthenticatedUser()
+
+        return _value(token)
+
+    monkeypatch.setattr(SOAuthCookieBackend, "authenticate", authenticate)
+
+    backend = CachedSOAuthCookieBackend(
+        cache=AuthCache(), public_key="", key_pair_type="HS256"
+    )
+    backend.calls = calls
+
+    return backend
+
+
+def test_authentications_are_served_from_the_cache(backend, clock):
+    token = jwt.encode(
+        {"exp": clock.now + 30}, "a-test-secret-of-at-least-32-bytes", algorithm="HS256"
+    )
+
+    first = asyncio.run(backend.authenticate(_connection(token)))
+    second = asyncio.run(backend.authenticate(_connection(token)))
+
+    assert first[1] is second[1]
+    assert backend.calls == [token]
+    assert backend.cache.info().hits == 1
+
+    # Cached only until the token itself expires.
+    clock.now += 30
+    asyncio.run(backend.authenticate(_connection(token)))
+
+    assert backend.calls == [token, token]
+
+
+def test_failures_are_not_cached(backend, clock):
+    for _ in range(2):
+        _, user = asyncio.run(backend.authenticate(_connection("bad")))
+        assert not user.is_authenticated
+
+    asyncio.run(backend.authenticate(_connection(None)))
+
+    assert backend.calls == ["bad", "bad", None]
+    assert backend.cache.info().size == 0
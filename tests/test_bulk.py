@@ -0,0 +1,121 @@
+"""
+The bulk inserter's fallback for databases without INSERT ... RETURNING,
+and its COPY path on PostgreSQL.
+"""
+
+import pytest
+from sqlalchemy import event, func, select
+from tilemaker.metadata.orm import BandORM, LayerORM, MapGroupORM, MapORM
+
+from tileadder.service.bulk import LOOKUP_CHUNK_SIZE, BulkInsert
+
+
+def test_fallback_lookups_stay_under_parameter_limit(manager, monkeypatch):
+    monkeypatch.setattr(manager.engine.dialect, "insert_executemany_returning", False)
+
+    parameters = []
+
+    def capture(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            parameters.append(len(params))
+
+    event.listen(manager.engine, "before_cursor_execute", capture)
+
+    with manager.session as session:
+        group = MapGroupORM(map_group_id="group", name="group", description="")
+        session.add(group)
+        session.flush()
+
+        inserter = BulkInsert(batch_size=5000)
+
+        for m in range(2000):
+            inserter.add_map(f"map-{m}", name=f"map-{m}", map_group_id=group.id)
+            inserter.add_band(f"band-{m}", f"map-{m}", name="f090")
+
+        written = inserter.write(session, measure_files=False)
+        session.commit()
+
+        assert written.maps == written.bands == 2000
+        assert len(inserter.map_ids) == len(inserter.band_ids) == 2000
+        assert session.execute(select(func.count(BandORM.id))).scalar_one() == 2000
+        assert set(inserter.map_ids.values()) == set(
+            session.execute(select(MapORM.id)).scalars()
+        )
+
+    event.remove(manager.engine, "before_cursor_execute", capture)
+
+    assert max(parameters) <= LOOKUP_CHUNK_SIZE + 1
+
+
+def test_repeated_layer_ids_are_rejected():
+    inserter = BulkInsert()
+    inserter.add_layer("layer", "band", name="first")
+
+    with pytest.raises(ValueError, match="layer"):
+        inserter.add_layer("layer", "band", name="second")
+
+    assert inserter.layers["layer"]["name"] == "first"
+
+
+def _write_group(session, name: str, copy: bool) -> BulkInsert:
+    group = MapGroupORM(map_group_id=name, name=name, description="")
+    session.add(group)
+    session.flush()
+
+    inserter = BulkInsert(copy=copy)
+
+    for m in range(20):
+        map_id = f"{name}-{m}"
+        inserter.add_map(map_id, name=map_id, map_group_id=group.id)
+
+        for b in range(3):
+            band_id = f"{map_id}-{b}"
+            inserter.add_band(band_id, map_id, name=f"band-{b}")
+            inserter.add_layer(
+                f"{band_id}-0",
+                band_id,
+                name='layer, with "quotes"\tand tabs',
+                provider={"provider_type": "fits", "filename": f"/{map_id}.fits"},
+            )
+
+    inserter.write(session, measure_files=False)
+
+    return inserter
+
+
+def test_copy_and_executemany_return_the_same_keys(postgres_manager):
+    with postgres_manager.session as session:
+        copied = _write_group(session, "copy", copy=True)
+        inserted = _write_group(session, "insert", copy=False)
+        session.commit()
+
+        def strip(ids: dict[str, int], prefix: str) -> set[str]:
+            return {x.removeprefix(prefix) for x in ids}
+
+        assert strip(copied.map_ids, "copy") == strip(inserted.map_ids, "insert")
+        assert strip(copied.band_ids, "copy") == strip(inserted.band_ids, "insert")
+
+        # Every returned ID belongs to the row with that key.
+        for inserter in (copied, inserted):
+            assert inserter.map_ids == dict(
+                session.execute(
+                    select(MapORM.map_id, MapORM.id).where(
+                        MapORM.id.in_(inserter.map_ids.values())
+                    )
+                ).all()
+            )
+            assert inserter.band_ids == dict(
+                session.execute(
+                    select(BandORM.band_id, BandORM.id).where(
+                        BandORM.id.in_(inserter.band_ids.values())
+                    )
+                ).all()
+            )
+
+        layers = session.execute(
+            select(LayerORM.layer_id, LayerORM.name, BandORM.band_id).join(BandORM)
+        ).all()
+
+        assert len(layers) == 120
+        assert all(band_id == layer_id[:-2] for layer_id, _, band_id in layers)
+        assert {x.name for x in layers} == {'layer, with "quotes"\tand tabs'}
@@ -0,0 +1,40 @@
+"""
+Evaluating a batch of files from the map directory.
+"""
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from astropy.wcs import WCS
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(tmp_path, load_app):
+    maps = tmp_path / "maps"
+    maps.mkdir()
+
+    wcs = WCS(naxis=2)
+    wcs.wcs.ctype = ["RA---CAR", "DEC--CAR"]
+    wcs.wcs.cdelt = [-0.5, 0.5]
+    wcs.wcs.crpix = [32.5, 24.5]
+    wcs.wcs.crval = [0.0, 0.0]
+
+    data = np.ones((48, 64), dtype="float32")
+    fits.PrimaryHDU(data, header=wcs.to_header()).writeto(maps / "good.fits")
+    (maps / "broken.fits").write_bytes(b"not a FITS file")
+
+    with TestClient(load_app(map_directory=str(maps))) as client:
+        yield client
+
+
+def test_unreadable_files_get_an_error_card(client):
+    response = client.post(
+        "/add/evaluate/batch", json={"paths": ["good.fits", "broken.fits"]}
+    )
+
+    assert response.status_code == 200
+    assert response.text.count("Failed") == 1
+    assert "Could not read broken.fits" in response.text
+    assert "Could not read good.fits" not in response.text
+    assert "Band created from good.fits" in response.text
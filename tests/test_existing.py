@@ -0,0 +1,87 @@
+"""
+Reading maps from a map group, optionally filtered by observation time.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tilemaker.metadata.orm import MapGroupORM
+
+from tileadder.service.bulk import BulkInsert
+from tileadder.service.existing import read_maps_for_map_group
+
+# Each map's bands, as (start, end) days of January 2024.
+MAPS = {
+    "late": [(5, 6)],
+    "early": [(1, 2)],
+    "split": [(3, 3.5), (3.5, 4)],
+    "untimed": [],
+}
+
+
+def _day(day: float) -> datetime:
+    return datetime(2023, 12, 31) + timedelta(days=day)
+
+
+@pytest.fixture
+def group(manager) -> int:
+    with manager.session as session:
+        ids = []
+
+        for name in ("group", "other"):
+            group = MapGroupORM(map_group_id=name, name=name, description="")
+            session.add(group)
+            session.flush()
+            ids.append(group.id)
+
+            inserter = BulkInsert()
+
+            for map_id, bands in MAPS.items():
+                map_id = f"{name}-{map_id}"
+                inserter.add_map(map_id, name=map_id, map_group_id=group.id)
+
+                for index, (start, end) in enumerate(bands):
+                    band_id = f"{map_id}-{index}"
+                    inserter.add_band(band_id, map_id, name=band_id)
+                    inserter.add_band_times(band_id, _day(start), None, _day(end))
+
+            inserter.write(session, measure_files=False)
+
+        session.commit()
+
+    return ids[0]
+
+
+def _names(manager, group: int, **bounds) -> list[str]:
+    with manager.session as session:
+        maps = read_maps_for_map_group(session, map_group_id=group, **bounds)
+
+    return [x.name.removeprefix("group-") for x in maps]
+
+
+def test_unfiltered_reads_include_untimed_maps(manager, group):
+    assert sorted(_names(manager, group)) == sorted(MAPS)
+
+
+@pytest.mark.parametrize(
+    "bounds, expected",
+    [
+        ({"start": _day(3.75)}, ["split", "late"]),
+        ({"end": _day(3.25)}, ["early", "split"]),
+        ({"start": _day(2.5), "end": _day(2.75)}, []),
+        # Bounds are inclusive.
+        ({"start": _day(2), "end": _day(3)}, ["early", "split"]),
+        ({"start": _day(0), "end": _day(10)}, ["early", "split", "late"]),
+    ],
+)
+def test_maps_overlapping_the_range_earliest_first(manager, group, bounds, expected):
+    assert _names(manager, group, **bounds) == expected
+
+
+def test_aware_bounds_are_compared_in_utc(manager, group):
+    tz = timezone(timedelta(hours=-12))
+
+    # 18:00 on the 3rd, twelve hours behind UTC, is after "split" ends.
+    start = _day(3.75).replace(tzinfo=tz)
+
+    assert _names(manager, group, start=start) == ["late"]
@@ -0,0 +1,48 @@
+"""
+Path checks for files read from the map directory.
+"""
+
+import pytest
+
+from tileadder.service.filesystem import preview_image, safe_file_path
+
+
+@pytest.fixture
+def top_level(tmp_path):
+    top_level = tmp_path / "maps"
+    top_level.mkdir()
+
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    (elsewhere / "stored.fits").write_bytes(b"")
+
+    (top_level / "linked.fits").symlink_to(elsewhere / "stored.fits")
+    (top_level / "notes.txt").write_text("")
+
+    return top_level
+
+
+def test_ingestion_follows_links_out_of_the_top_level(top_level):
+    path = top_level / "linked.fits"
+
+    assert safe_file_path(top_level, path) == path.absolute()
+
+    with pytest.raises(ValueError, match="not within"):
+        safe_file_path(top_level, top_level / "../elsewhere/stored.fits")
+
+
+@pytest.mark.parametrize("name", ["linked.fits", "../elsewhere/stored.fits"])
+def test_resolved_paths_must_stay_in_the_top_level(top_level, name):
+    with pytest.raises(ValueError, match="not within"):
+        safe_file_path(top_level, top_level / name, resolve_links=True)
+
+    with pytest.raises(ValueError, match="not within"):
+        preview_image(top_level=top_level, file_path=top_level / name)
+
+
+def test_extensions_are_checked(top_level):
+    with pytest.raises(ValueError, match="Extension"):
+        safe_file_path(top_level, top_level / "notes.txt")
+
+    with pytest.raises(ValueError, match="Extension"):
+        preview_image(top_level=top_level, file_path=top_level / "notes.txt")
@@ -0,0 +1,54 @@
+"""
+Importing the web app must stay cheap: every server worker pays for it at
+start-up. The FITS, plotting, and mapcat stacks are only imported by the
+code paths that need them.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ("astropy", "mapcat", "matplotlib", "numpy", "scipy")
+
+# Cumulative import time of the app module, in microseconds. FastAPI and
+# SQLAlchemy alone take around a second; the FITS stack would add several.
+IMPORT_BUDGET_US = 3_000_000
+
+
+def test_app_import_defers_heavy_modules():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, sys, tileadder.server.app; "
+            "print(json.dumps(sorted({x.split('.')[0] for x in sys.modules})))",
+        ],
+        env={**os.environ, "TILEADDER_AUTH_TYPE": "mock"},
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    imported = set(json.loads(loaded.stdout.splitlines()[-1]))
+
+    assert not imported & set(HEAVY_MODULES)
+
+
+def test_app_import_within_budget():
+    loaded = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import tileadder.server.app"],
+        env={**os.environ, "TILEADDER_AUTH_TYPE": "mock"},
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    # Lines read "import time: <self> | <cumulative> | <module>".
+    cumulative = {
+        fields[2].strip(): int(fields[1])
+        for fields in (x.split("|") for x in loaded.stderr.splitlines())
+        if len(fields) == 3 and fields[1].strip().isdigit()
+    }
+
+    assert cumulative["tileadder.server.app"] < IMPORT_BUDGET_US
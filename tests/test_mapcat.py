@@ -0,0 +1,96 @@
+"""
+Change detection and check scheduling for mapcat registrations.
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from tileadder.service.mapcat import adapt_interval, cadence_bounds, mapcat_fingerprint
+
+
+def _fingerprint(path) -> str | None:
+    return mapcat_fingerprint("sqlite", str(path), "depth_one_maps")
+
+
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_sqlite_fingerprint_changes_after_a_write(tmp_path, journal_mode):
+    path = tmp_path / "mapcat.db"
+
+    connection = sqlite3.connect(path)
+    connection.execute(f"PRAGMA journal_mode={journal_mode}")
+    connection.execute("CREATE TABLE depth_one_maps (id INTEGER, name TEXT)")
+    connection.execute("INSERT INTO depth_one_maps VALUES (1, 'a')")
+    connection.commit()
+
+    before = _fingerprint(path)
+
+    assert before is not None
+    assert _fingerprint(path) == before
+
+    # Past the file system's timestamp granularity; checks of a real mapcat
+    # are minutes apart.
+    time.sleep(0.05)
+
+    # An update in place leaves the size of the file unchanged.
+    connection.execute("UPDATE depth_one_maps SET name = 'b'")
+    connection.commit()
+
+    after = _fingerprint(path)
+
+    assert after != before
+    assert _fingerprint(path) == after
+
+    connection.close()
+
+
+def test_missing_catalogs_have_no_fingerprint(tmp_path):
+    assert _fingerprint(tmp_path / "missing.db") is None
+
+
+BOUNDS = cadence_bounds(minimum=timedelta(minutes=15), maximum=timedelta(days=7))
+
+
+def _history(*changed: bool, every: timedelta = timedelta(hours=1)):
+    start = datetime(2024, 1, 1)
+
+    return [(start + every * index, x) for index, x in enumerate(changed)]
+
+
+@pytest.mark.parametrize(
+    "history, current, expected",
+    [
+        # Too little history to judge: keep the current interval.
+        ([], timedelta(hours=1), timedelta(hours=1)),
+        (_history(True), timedelta(hours=1), timedelta(hours=1)),
+        # Two changes in four hours: check every hour.
+        (
+            _history(False, True, False, True, False),
+            timedelta(hours=1),
+            timedelta(hours=1),
+        ),
+        # One change in four hours: check every two hours.
+        (
+            _history(False, False, True, False, False),
+            timedelta(hours=1),
+            timedelta(hours=2),
+        ),
+        # The first check's flag is outside the window and is ignored.
+        (_history(True, False, False), timedelta(hours=3), timedelta(hours=6)),
+        # No changes: back off.
+        (_history(False, False, False), timedelta(hours=3), timedelta(hours=6)),
+    ],
+)
+def test_interval_follows_changes(history, current, expected):
+    assert adapt_interval(history, current, BOUNDS) == expected
+
+
+def test_interval_is_clamped():
+    busy = _history(*[True] * 10, every=timedelta(minutes=1))
+    quiet = _history(False, False)
+
+    assert adapt_interval(busy, timedelta(hours=1), BOUNDS) == BOUNDS.minimum
+    assert adapt_interval(quiet, timedelta(days=5), BOUNDS) == BOUNDS.maximum
+    assert adapt_interval([], timedelta(minutes=1), BOUNDS) == BOUNDS.minimum
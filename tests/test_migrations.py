@@ -0,0 +1,83 @@
+"""
+Merging the duplicate bands and layers that would stop the upsert indexes
+from being built.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+from tilemaker.metadata.orm import BandORM, LayerORM
+
+from tileadder.service.migrations import UPSERT_INDEXES, upsert_indexes
+from tileadder.service.summary import MapGroupSummary
+from tileadder.service.times import BandTime, MapTime, refresh_map_times
+
+
+def test_duplicates_are_merged_with_their_times_and_summaries(manager):
+    with manager.engine.begin() as connection:
+        for index in UPSERT_INDEXES:
+            index.drop(bind=connection)
+
+        connection.execute(
+            text(
+                "INSERT INTO map_groups (id, map_group_id, name, description) "
+                "VALUES (1, 'group', 'group', '')"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO maps (id, map_id, name, description, map_group_id) "
+                "VALUES (1, 'map', 'map', '', 1)"
+            )
+        )
+
+        for band in (1, 2):
+            connection.execute(
+                text(
+                    "INSERT INTO bands (id, band_id, map_id, name) "
+                    f"VALUES ({band}, 'band-{band}', 1, 'f090')"
+                )
+            )
+            connection.execute(
+                BandTime.__table__.insert().values(
+                    band_id=band,
+                    map_id=1,
+                    start_time=datetime(2024, 1, band),
+                    end_time=datetime(2024, 1, band + 1),
+                )
+            )
+
+        for id, band, layer_id in ((1, 1, "a"), (2, 2, "b"), (3, 1, "c")):
+            connection.execute(
+                text(
+                    "INSERT INTO layers (id, layer_id, band_id, name, provider) "
+                    f"VALUES ({id}, '{layer_id}', {band}, '{layer_id}', '{{}}')"
+                )
+            )
+
+        refresh_map_times(connection, [1])
+        connection.execute(
+            MapGroupSummary.__table__.insert().values(
+                map_group_id=1, maps=1, bands=2, layers=3, total_fits_bytes=0
+            )
+        )
+
+    with manager.engine.begin() as connection:
+        upsert_indexes(connection)
+
+    with manager.engine.connect() as connection:
+        assert connection.execute(select(BandORM.id)).scalars().all() == [1]
+        assert connection.execute(
+            select(LayerORM.id, LayerORM.band_id).order_by(LayerORM.id)
+        ).all() == [(1, 1), (2, 1), (3, 1)]
+        assert connection.execute(select(BandTime.band_id)).scalars().all() == [1]
+        assert connection.execute(select(MapTime.end_time)).scalar_one() == datetime(
+            2024, 1, 2
+        )
+        assert connection.execute(select(MapGroupSummary.map_group_id)).all() == []
+
+    names = {x["name"] for x in inspect(manager.engine).get_indexes("bands")} | {
+        x["name"] for x in inspect(manager.engine).get_indexes("layers")
+    }
+
+    assert {x.name for x in UPSERT_INDEXES} <= names
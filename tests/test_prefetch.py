@@ -0,0 +1,68 @@
+"""
+Read-ahead of file metadata after a directory listing.
+"""
+
+import threading
+from pathlib import Path
+
+import pytest
+
+from tileadder.service import prefetch
+from tileadder.service.prefetch import MetadataPrefetcher
+
+
+class Reads(list):
+    release: threading.Event
+    started: threading.Event
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    Replace file reads with ones that record their path, and block until
+    `reads.release` is set.
+    """
+    reads = Reads()
+    reads.release = threading.Event()
+    reads.started = threading.Event()
+
+    def read(top_level: Path, file_path: Path):
+        reads.append(file_path.name)
+        reads.started.set()
+        reads.release.wait(timeout=10)
+
+    monkeypatch.setattr(prefetch, "safe_evaluate", read)
+
+    return reads
+
+
+def _paths(*names: str) -> list[Path]:
+    return [Path(x) for x in names]
+
+
+def test_listing_again_cancels_queued_reads(reads, tmp_path):
+    prefetcher = MetadataPrefetcher(workers=1, max_files=16)
+
+    assert prefetcher.prefetch("user", tmp_path, _paths("a", "b", "c")) == 3
+    reads.started.wait(timeout=10)
+
+    # "a" is already being read; "b" and "c" are still queued.
+    assert prefetcher.prefetch("user", tmp_path, _paths("d", "e")) == 2
+
+    reads.release.set()
+    prefetcher._executor.shutdown(wait=True)
+
+    assert reads == ["a", "d", "e"]
+
+
+def test_listings_are_skipped_when_too_many_reads_are_pending(reads, tmp_path):
+    prefetcher = MetadataPrefetcher(workers=1, max_files=2, max_pending=3)
+
+    assert prefetcher.prefetch("first", tmp_path, _paths("a", "b", "c")) == 2
+    assert prefetcher.prefetch("second", tmp_path, _paths("d", "e")) == 1
+    assert prefetcher.prefetch("third", tmp_path, _paths("f")) == 0
+
+    reads.release.set()
+    prefetcher._executor.shutdown(wait=True)
+
+    assert reads == ["a", "b", "d"]
@@ -0,0 +1,28 @@
+"""
+The queue of layers waiting to have their top levels pre-rendered.
+"""
+
+from sqlalchemy import update
+from tilemaker.metadata.orm import LayerORM
+
+from tileadder.service.pregenerate import count_layers_to_pregenerate
+
+
+def test_layers_without_ranges_are_queued(manager, populate):
+    populate("group", maps=4)
+
+    with manager.session as session:
+        # Left unset, as by populate, for group-0; the rest are set below.
+        for layer_id, vmin, vmax in (
+            ("group-1-0-0", "0", "1"),
+            ("group-2-0-0", "auto", "1"),
+            ("group-3-0-0", None, "auto"),
+        ):
+            session.execute(
+                update(LayerORM)
+                .where(LayerORM.layer_id == layer_id)
+                .values(vmin=vmin, vmax=vmax)
+            )
+
+        # Unset and concrete ranges are ready; those still on "auto" wait.
+        assert count_layers_to_pregenerate(session) == 2
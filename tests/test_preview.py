@@ -0,0 +1,48 @@
+"""
+Previews of files in the map directory, served from /add/preview.png.
+"""
+
+import struct
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(tmp_path, load_app):
+    maps = tmp_path / "maps"
+    maps.mkdir()
+
+    data = np.arange(48 * 64, dtype="float32").reshape(48, 64)
+    fits.PrimaryHDU(data).writeto(maps / "map.fits")
+    (maps / "map.txt").write_text("not a map")
+    (tmp_path / "outside.fits").write_bytes((maps / "map.fits").read_bytes())
+
+    app = load_app(map_directory=str(maps), preview_size="32")
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_preview_of_a_map(client):
+    response = client.get("/add/preview.png", params={"path": "map.fits"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+    # Width and height from the PNG header.
+    width, height = struct.unpack(">II", response.content[16:24])
+
+    assert max(width, height) <= 32
+    assert (width, height) != (64, 48)
+
+
+@pytest.mark.parametrize(
+    "path", ["map.txt", "../outside.fits", "missing.fits", "/etc/passwd"]
+)
+def test_disallowed_paths_have_no_preview(client, path):
+    response = client.get("/add/preview.png", params={"path": path})
+
+    assert response.status_code == 404
@@ -0,0 +1,121 @@
+"""
+The read helpers behind /current must be answered from indexes. Each one
+is run against a migrated SQLite database while its statements are
+captured, and SQLite's plan for every statement is checked.
+"""
+
+import re
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from tileadder.service import existing
+
+STEP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)")
+
+# Listings of every map group necessarily scan the map group table.
+READ_HELPERS = {
+    "read_map_groups": (
+        lambda s, ids: existing.read_map_groups(session=s),
+        {"map_groups"},
+    ),
+    "read_map_group_summaries": (
+        lambda s, ids: existing.read_map_group_summaries(session=s),
+        {"map_groups"},
+    ),
+    "read_map_group": (
+        lambda s, ids: existing.read_map_group(session=s, map_group_id=ids["group"]),
+        set(),
+    ),
+    "read_maps_for_map_group": (
+        lambda s, ids: existing.read_maps_for_map_group(
+            session=s, map_group_id=ids["group"]
+        ),
+        set(),
+    ),
+    "read_maps_for_map_group_by_time": (
+        lambda s, ids: existing.read_maps_for_map_group(
+            session=s,
+            map_group_id=ids["group"],
+            start=datetime(2024, 1, 1),
+            end=datetime(2024, 2, 1),
+        ),
+        set(),
+    ),
+    "read_map": (
+        lambda s, ids: existing.read_map(session=s, map_id=ids["map"]),
+        set(),
+    ),
+    "read_bands_for_map": (
+        lambda s, ids: existing.read_bands_for_map(session=s, map_id=ids["map"]),
+        set(),
+    ),
+}
+
+
+def query_plans(manager, call) -> list[list[str]]:
+    """
+    Run `call` with a session, returning SQLite's query plan for each
+    statement it executed.
+    """
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(manager.engine, "before_cursor_execute", capture)
+
+    try:
+        with manager.session as session:
+            call(session)
+    finally:
+        event.remove(manager.engine, "before_cursor_execute", capture)
+
+    with manager.engine.connect() as connection:
+        return [
+            [
+                row[-1]
+                for row in connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            for statement, parameters in statements
+        ]
+
+
+@pytest.mark.parametrize("name", READ_HELPERS)
+def test_read_helpers_use_indexes(manager, populate, name):
+    call, may_scan = READ_HELPERS[name]
+
+    for index in range(3):
+        populate(f"group-{index}", maps=10, bands=2, layers=2)
+
+    with manager.session as session:
+        group = existing.read_map_groups(session=session)[1].id
+        map_id = existing.read_maps_for_map_group(session=session, map_group_id=group)[
+            0
+        ].id
+
+    plans = query_plans(manager, lambda s: call(s, {"group": group, "map": map_id}))
+
+    assert plans
+
+    for plan in plans:
+        for detail in plan:
+            step = STEP.match(detail)
+
+            if step is None:
+                continue
+
+            kind, table = step.groups()
+
+            if table in may_scan:
+                continue
+
+            assert kind == "SEARCH", f"{name}: {detail}"
+            assert re.search(
+                r"USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY", detail
+            ), f"{name}: {detail}"
@@ -0,0 +1,64 @@
+"""
+Filling in colour ranges, and remembering the layers that cannot have one.
+"""
+
+import numpy as np
+from astropy.io import fits
+from sqlalchemy import select, update
+from tilemaker.metadata.orm import LayerORM
+
+from tileadder.service.ranges import (
+    LayerRangeFailure,
+    compute_layer_ranges,
+    layers_missing_ranges,
+    store_layer_ranges,
+)
+
+
+def _run(manager) -> tuple[int, int]:
+    with manager.session as session:
+        layers = layers_missing_ranges(session, limit=100)
+        results = compute_layer_ranges(layers, workers=2)
+        updated = store_layer_ranges(session, layers=layers, results=results)
+
+    return len(layers), updated
+
+
+def test_failed_layers_are_recorded_and_skipped(manager, populate, tmp_path):
+    populate("group", maps=3)
+
+    # One readable map; the others point at files that do not exist.
+    readable = tmp_path / "readable.fits"
+    fits.PrimaryHDU(np.arange(1, 101, dtype="float32").reshape(10, 10)).writeto(
+        readable
+    )
+
+    with manager.session as session:
+        session.execute(update(LayerORM).values(vmin="auto", vmax="auto"))
+        session.execute(
+            update(LayerORM)
+            .where(LayerORM.layer_id == "group-0-0-0")
+            .values(provider={"provider_type": "fits", "filename": str(readable)})
+        )
+        session.commit()
+
+    assert _run(manager) == (3, 1)
+
+    with manager.session as session:
+        failures = session.execute(
+            select(LayerORM.layer_id, LayerRangeFailure.error).join(
+                LayerRangeFailure, LayerRangeFailure.layer_id == LayerORM.id
+            )
+        ).all()
+        vmin, vmax = session.execute(
+            select(LayerORM.vmin, LayerORM.vmax).where(
+                LayerORM.layer_id == "group-0-0-0"
+            )
+        ).one()
+
+    assert sorted(x.layer_id for x in failures) == ["group-1-0-0", "group-2-0-0"]
+    assert all(x.error for x in failures)
+    assert 1.0 <= float(vmin) < float(vmax) <= 100.0
+
+    # Failures persist, so nothing is read again.
+    assert _run(manager) == (0, 0)
@@ -0,0 +1,69 @@
+"""
+Routing between a primary database and a read replica, with the
+read-your-writes cookie sending a client's reads back to the primary.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from tilemaker.metadata.orm import MapGroupORM
+
+from tileadder.server.database import READ_YOUR_WRITES_COOKIE, EngineManager
+from tileadder.service.migrations import migrate
+
+
+def _create_group(url: str, name: str) -> int:
+    manager = EngineManager(database_url=url)
+    migrate(manager.engine)
+
+    with manager.session as session:
+        group = MapGroupORM(map_group_id=name, name=name, description=name)
+        session.add(group)
+        session.commit()
+        id = group.id
+
+    manager.engine.dispose()
+
+    return id
+
+
+@pytest.fixture
+def client(tmp_path, load_app):
+    primary = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica = f"sqlite:///{tmp_path / 'replica.db'}"
+
+    # The same group ID in both, under different names, so that each page
+    # shows which database it was read from.
+    assert _create_group(primary, "from-primary") == 1
+    assert _create_group(replica, "from-replica") == 1
+
+    app = load_app(database_url=primary, database_replica_url=replica)
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_reads_use_the_replica_until_this_client_writes(client):
+    page = client.get("/current")
+
+    assert page.status_code == 200
+    assert "from-replica" in page.text
+    assert "from-primary" not in page.text
+    assert READ_YOUR_WRITES_COOKIE not in page.cookies
+
+    response = client.post(
+        "/current/groups/edit/1",
+        json={"group_name": "edited", "description": "edited", "grant": None},
+    )
+
+    assert response.status_code < 400
+    assert READ_YOUR_WRITES_COOKIE in response.cookies
+
+    page = client.get("/current")
+
+    assert "edited" in page.text
+    assert "from-replica" not in page.text
+
+    # Other clients, without the cookie, still read the stale replica.
+    client.cookies.clear()
+
+    assert "from-replica" in client.get("/current").text
@@ -0,0 +1,108 @@
+"""
+Map group summaries, maintained incrementally by the write paths.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select
+from tilemaker.metadata.orm import MapGroupORM, MapORM
+
+from tileadder.service.bulk import BulkInsert, bulk_result
+from tileadder.service.existing import delete_map
+from tileadder.service.summary import (
+    MapGroupSummary,
+    record_additions,
+    refresh_summary,
+)
+
+
+def test_concurrent_additions_are_not_lost(manager, populate):
+    map_group_id = populate("group", maps=1)
+
+    with manager.session as session:
+        record_additions(session, map_group_id, bulk_result(0, 0, 0, 0))
+        session.commit()
+
+    with manager.session as first, manager.session as second:
+        # The first writer has the summary loaded before the second commits.
+        stale = first.get(MapGroupSummary, map_group_id)
+        assert stale.maps == 0
+
+        record_additions(
+            second,
+            map_group_id,
+            bulk_result(maps=2, bands=2, layers=2, fits_bytes=10),
+            start_time=datetime(2024, 1, 5),
+            end_time=datetime(2024, 1, 6),
+        )
+        second.commit()
+
+        record_additions(
+            first,
+            map_group_id,
+            bulk_result(maps=3, bands=3, layers=3, fits_bytes=20),
+            start_time=datetime(2024, 1, 1),
+            end_time=datetime(2024, 1, 2),
+        )
+        first.commit()
+
+    with manager.session as session:
+        summary = session.get(MapGroupSummary, map_group_id)
+
+        assert (summary.maps, summary.layers, summary.total_fits_bytes) == (5, 5, 30)
+        assert summary.start_time == datetime(2024, 1, 1)
+        assert summary.end_time == datetime(2024, 1, 6)
+
+
+def test_file_sizes_balance_between_additions_and_removals(manager, tmp_path):
+    shared = tmp_path / "shared.fits"
+    shared.write_bytes(b"x" * 1000)
+    own = tmp_path / "own.fits"
+    own.write_bytes(b"x" * 300)
+
+    with manager.session as session:
+        map_group_id = populate_with_files(session, shared, own)
+
+    with manager.session as session:
+        summary = session.get(MapGroupSummary, map_group_id)
+        incremental = summary.total_fits_bytes
+
+        refresh_summary(session, map_group_id)
+        session.flush()
+        session.refresh(summary)
+
+        # Each layer counts the files it refers to: two share a file.
+        assert incremental == summary.total_fits_bytes == 2 * 1000 + 300
+
+        for map_id in session.execute(select(MapORM.id)).scalars().all():
+            delete_map(session, map_id)
+
+        session.refresh(summary)
+
+        assert (summary.maps, summary.layers, summary.total_fits_bytes) == (0, 0, 0)
+
+
+def populate_with_files(session, shared, own) -> int:
+    group = MapGroupORM(map_group_id="files", name="files", description="")
+    session.add(group)
+    session.flush()
+
+    # Written in two batches, so that the shared file is seen by both.
+    for m, filenames in enumerate(([shared, own], [shared])):
+        inserter = BulkInsert()
+        inserter.add_map(f"map-{m}", name=f"map-{m}", map_group_id=group.id)
+        inserter.add_band(f"band-{m}", f"map-{m}", name="f090")
+
+        for n, filename in enumerate(filenames):
+            inserter.add_layer(
+                f"layer-{m}-{n}",
+                f"band-{m}",
+                name=f"layer-{m}-{n}",
+                provider={"provider_type": "fits", "filename": str(filename)},
+            )
+
+        record_additions(session, group.id, inserter.write(session))
+
+    session.commit()
+
+    return group.id
@@ -0,0 +1,50 @@
+"""
+The supervisor restarts children that exit, and those that stop beating.
+"""
+
+import time
+
+from tileadder.scripts.cli import Supervisor
+
+
+def beating(heartbeat):
+    while True:
+        heartbeat.value = time.monotonic()
+        time.sleep(0.05)
+
+
+def hanging(heartbeat):
+    time.sleep(60)
+
+
+def _supervise(supervisor: Supervisor, seconds: float) -> dict[str, set[int]]:
+    pids = {x.name: set() for x in supervisor.children}
+
+    for child in supervisor.children:
+        supervisor._start(child)
+
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for child in supervisor.children:
+            supervisor._check(child)
+            pids[child.name].add(child.process.pid)
+
+        time.sleep(0.05)
+
+    supervisor.shutdown()
+
+    return pids
+
+
+def test_hung_children_are_restarted():
+    supervisor = Supervisor(backoff=0.05, backoff_max=0.05, grace=1.0)
+    supervisor.add("beating", beating, timeout=0.5)
+    supervisor.add("hanging", hanging, timeout=0.5)
+    supervisor.add("unwatched", hanging)
+
+    pids = _supervise(supervisor, seconds=2.0)
+
+    assert len(pids["beating"]) == 1
+    assert len(pids["hanging"]) > 1
+    assert len(pids["unwatched"]) == 1
@@ -0,0 +1,59 @@
+"""
+Streamed templates render exactly as their buffered counterparts.
+"""
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from soauth.toolkit.fastapi import mock_global_setup
+
+from tileadder.server.templating import (
+    LoggerDependency,
+    setup_templating,
+    stream_template,
+    templateify,
+)
+
+
+def test_streamed_and_buffered_templates_match(tmp_path):
+    (tmp_path / "rows.html").write_text(
+        "<p>{{ user.display_name }} {{ title }}</p>\n"
+        "{% for row in rows %}<li>{{ loop.index }}: {{ row }}</li>\n{% endfor %}"
+    )
+
+    templates = setup_templating(
+        template_directory=tmp_path, available_strings={"title": "Rows"}
+    )
+    Templates = Depends(templates)
+    rows = [f"row <{x}> & more" for x in range(2000)]
+
+    app = FastAPI()
+
+    @app.get("/buffered")
+    @templateify(template_name="rows.html", log_name="test.buffered")
+    def buffered(request: Request, log: LoggerDependency, templates=Templates):
+        return {"rows": rows}
+
+    @app.get("/streamed")
+    @templateify(template_name="rows.html", log_name="test.streamed", stream=True)
+    def streamed(request: Request, log: LoggerDependency, templates=Templates):
+        return {"rows": rows}
+
+    @app.get("/small-chunks")
+    def small_chunks(request: Request, templates=Templates):
+        return stream_template(
+            request=request,
+            templates=templates,
+            name="rows.html",
+            context={"rows": rows},
+            chunk_size=100,
+        )
+
+    client = TestClient(mock_global_setup(app, grants=[]))
+
+    expected = client.get("/buffered").text
+
+    assert expected.startswith("<p>test_user Rows</p>")
+    assert len(expected) > 16384
+    assert "&lt;1999&gt; &amp; more" in expected
+    assert client.get("/streamed").text == expected
+    assert client.get("/small-chunks").text == expected
@@ -0,0 +1,46 @@
+"""
+Re-adding layers to an existing map.
+"""
+
+from sqlalchemy import select
+from tilemaker.metadata.orm import BandORM, LayerORM
+
+from tileadder.service.upsert import upsert_layers
+
+
+def _layer(vmin: str, vmax: str, cmap: str = "viridis") -> dict:
+    return {
+        "layer_id": "group-0-0-0",
+        "name": "readded",
+        "provider": {"provider_type": "fits", "filename": "/maps/group-0.fits"},
+        "vmin": vmin,
+        "vmax": vmax,
+        "cmap": cmap,
+    }
+
+
+def _ranges(session) -> tuple[str, str, str, str]:
+    return session.execute(
+        select(LayerORM.name, LayerORM.vmin, LayerORM.vmax, LayerORM.cmap)
+    ).one()
+
+
+def test_readding_keeps_computed_ranges(manager, populate):
+    populate("group", maps=1)
+
+    with manager.session as session:
+        band_id = session.execute(select(BandORM.id)).scalar_one()
+
+        # As left by ComputeLayerRanges.
+        session.execute(LayerORM.__table__.update().values(vmin="-1.5", vmax="2.5"))
+
+        created, updated = upsert_layers(
+            session, band_id, [_layer("auto", "auto", cmap="plasma")]
+        )
+
+        assert (created, updated) == ([], ["group-0-0-0"])
+        assert tuple(_ranges(session)) == ("readded", "-1.5", "2.5", "plasma")
+
+        upsert_layers(session, band_id, [_layer("0", "auto")])
+
+        assert tuple(_ranges(session)) == ("readded", "0", "2.5", "viridis")
@@ -0,0 +1,57 @@
+"""
+Watching SQLite mapcats for changes.
+"""
+
+import time
+
+import pytest
+
+from tileadder.background.watch import ChangeWatcher
+
+
+def _wait_for_change(watcher: ChangeWatcher, timeout: float = 5.0) -> set:
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        changed = watcher.drain(debounce_seconds=0.0)
+
+        if changed:
+            return changed
+
+        time.sleep(0.05)
+
+    return set()
+
+
+def test_no_files_starts_no_thread():
+    watcher = ChangeWatcher(files=set())
+    watcher.start()
+
+    assert watcher._thread is None
+
+    watcher.stop()
+
+
+@pytest.mark.parametrize("exists", [True, False])
+def test_changes_are_seen(tmp_path, exists):
+    directory = tmp_path / "mapcats"
+    path = directory / "mapcat.db"
+
+    if exists:
+        directory.mkdir()
+        path.write_bytes(b"")
+
+    watcher = ChangeWatcher(files={path}, poll_interval=0.05)
+    watcher.start()
+
+    try:
+        # Give the watcher time to start, then check that it is still up.
+        time.sleep(0.2)
+        assert watcher._thread.is_alive()
+
+        directory.mkdir(exist_ok=True)
+        path.with_name("mapcat.db-wal").write_bytes(b"changed")
+
+        assert _wait_for_change(watcher) == {path}
+    finally:
+        watcher.stop()
@@ -3,25 +3,63 @@ Background task processing for tileadder. Processes things like map cat
 additions and other long-running tasks.
 """
 
-import time
+import signal
+import threading
+from datetime import timedelta
+from typing import Callable
 
 from structlog import get_logger
 
+from tileadder.settings import get_settings
+
 from .core import SafeScheduler
 
 from .mapcat import ProcessMapCat
+from .pregenerate import PregenerateTiles
+from .ranges import ComputeLayerRanges
+from .summary import BackfillSummaries
+from .watch import WatchForChanges
 
 log = get_logger()
 
 
-def background(run_once: bool = False):
+def background(
+    run_once: bool = False,
+    worker_index: int = 0,
+    worker_count: int = 1,
+    heartbeat: Callable[[], None] | None = None,
+):
     scheduler = SafeScheduler()
     # Set scheduling...
 
+    shard = {"worker_index": worker_index, "worker_count": worker_count}
+
+    # Adapted intervals can be shorter than the default hourly check.
+    mapcat_every = (
+        {"every": timedelta(minutes=get_settings().mapcat_min_interval_minutes)}
+        if get_settings().adapt_mapcat_cadence
+        else {}
+    )
+
     all_tasks = (
-        ProcessMapCat(name="process_mapcat"),
+        ProcessMapCat(name="process_mapcat", **mapcat_every, **shard),
+        BackfillSummaries(name="backfill_summaries", **shard),
     )
 
+    if get_settings().watch_for_changes:
+        all_tasks += (WatchForChanges(name="watch_for_changes", **shard),)
+
+    if get_settings().compute_layer_ranges:
+        all_tasks += (ComputeLayerRanges(name="compute_layer_ranges", **shard),)
+
+    if get_settings().pregenerate_tiles:
+        all_tasks += (PregenerateTiles(name="pregenerate_tiles", **shard),)
+
+    # Finish the task in progress, rather than dying mid-write, when the
+    # supervisor asks us to stop.
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
     for task in all_tasks:
         log.debug(
             "background.schedule_task",
@@ -36,9 +74,15 @@ def background(run_once: bool = False):
     log.debug("background.run_all.end")
 
     # ...begin scheduling operations.
-    while not run_once:
+    while not run_once and not stop.is_set():
         try:
             scheduler.run_pending()
-            time.sleep(1)
+
+            if heartbeat is not None:
+                heartbeat()
+
+            stop.wait(1)
         except KeyboardInterrupt:
-            break
\ No newline at end of file
+            break
+
+    log.info("background.stopped", worker_index=worker_index)
@@ -5,18 +5,40 @@ Processes mapcats in the background and updates their definitions.
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from tileadder.settings import Settings
+from tileadder.settings import Settings, get_settings
 from tileadder.server.database import EngineManager
 
 from datetime import timedelta, datetime, timezone
 
-from tileadder.service.mapcat import MapCatRegistration
+from tileadder.service.connections import mapcat_engines
+from tileadder.service.mapcat import (
+    MapCatRegistration,
+    as_utc_datetime,
+    cadence_bounds,
+    update_mapcats,
+)
 
 from structlog import get_logger
 
 
 from .task import Task
 
+
+def mapcat_cadence(settings: Settings) -> cadence_bounds | None:
+    """
+    The bounds within which mapcat check intervals adapt, or None if they
+    are fixed at each registration's configured cadence.
+    """
+
+    if not settings.adapt_mapcat_cadence:
+        return None
+
+    return cadence_bounds(
+        minimum=timedelta(minutes=settings.mapcat_min_interval_minutes),
+        maximum=timedelta(minutes=settings.mapcat_max_interval_minutes),
+    )
+
+
 class ProcessMapCat(Task):
     """
     A background task that processes the mapcats that are stored in the
@@ -24,10 +46,14 @@ class ProcessMapCat(Task):
     """
 
     def on_call(self):
-        manager = EngineManager(database_url=Settings().database_url)
+        settings = get_settings()
+        manager = EngineManager(database_url=settings.database_url)
         with manager.session as session:
             self.core(session=session)
 
+        mapcat_engines.max_idle_seconds = settings.mapcat_engine_max_idle_seconds
+        mapcat_engines.evict_idle()
+
     def core(self, session: Session):
         """
         The core of the task that does the actual work. This is called by
@@ -39,15 +65,47 @@ class ProcessMapCat(Task):
 
         query = select(MapCatRegistration)
 
-        result = session.execute(query).scalars().all()
+        result = [
+            x
+            for x in session.execute(query).scalars().all()
+            if self.owns(x.mapcat_path)
+        ]
 
         logger.info("process_mapcat", num_mapcats=len(result))
 
+        due = []
+
         for res in result:
-            needs_update = res.last_updated.astimezone(timezone.utc) + timedelta(hours=res.update_cadence_hours) < datetime.now(tz=timezone.utc)
+            if res.next_update is not None:
+                due_at = as_utc_datetime(res.next_update)
+            else:
+                due_at = res.last_updated.astimezone(timezone.utc) + timedelta(
+                    hours=res.update_cadence_hours
+                )
+            needs_update = due_at < datetime.now(tz=timezone.utc)
             has_never_been_updated = res.mapcat_last_update_time is None
-            logger.debug("process_mapcat.check_update", mapcat_id=res.id, needs_update=needs_update, has_never_been_updated=has_never_been_updated)
+            logger.debug(
+                "process_mapcat.check_update",
+                mapcat_id=res.id,
+                needs_update=needs_update,
+                has_never_been_updated=has_never_been_updated,
+            )
             if needs_update or has_never_been_updated:
-                logger.info("process_mapcat.update", mapcat_id=res.id)
-                res.update_mapcat(session=session)
-                logger.info("process_mapcat.update_complete", mapcat_id=res.id)
\ No newline at end of file
+                due.append(res)
+
+        if not due:
+            return
+
+        logger.info("process_mapcat.update", mapcat_ids=[x.id for x in due])
+        settings = get_settings()
+        written = update_mapcats(
+            registrations=due,
+            session=session,
+            cadence=mapcat_cadence(settings),
+            keep_syncs=settings.mapcat_sync_history,
+        )
+        logger.info(
+            "process_mapcat.update_complete",
+            mapcat_ids=[x.id for x in due],
+            written={k: v._asdict() for k, v in written.items()},
+        )
@@ -0,0 +1,72 @@
+"""
+Pre-renders the top of the tile pyramid in the background for new layers.
+"""
+
+from datetime import timedelta
+
+from structlog import get_logger
+
+from tileadder.server.database import EngineManager
+from tileadder.service.pregenerate import (
+    count_layers_to_pregenerate,
+    layers_to_pregenerate,
+    pregenerate_layers,
+    store_pregeneration,
+)
+from tileadder.settings import get_settings
+
+from .task import Task
+
+
+class PregenerateTiles(Task):
+    """
+    Renders the top levels of a batch of layers on each run, those in the
+    most recently added maps first. Layers that fail are recorded with
+    their error and not retried.
+    """
+
+    every: timedelta = timedelta(minutes=1)
+    batch_size: int = 20
+
+    def on_call(self):
+        settings = get_settings()
+        manager = EngineManager(database_url=settings.database_url)
+
+        with manager.session as session:
+            layers = layers_to_pregenerate(
+                session=session,
+                limit=self.batch_size,
+                worker_index=self.worker_index,
+                worker_count=self.worker_count,
+            )
+
+            if not layers:
+                return
+
+            results = pregenerate_layers(
+                layers=layers,
+                directory=settings.tile_cache_directory,
+                levels=settings.pregenerate_levels,
+                workers=settings.pregenerate_workers,
+                ext=settings.pregenerate_format,
+            )
+
+            store_pregeneration(session=session, results=results)
+
+            remaining = count_layers_to_pregenerate(
+                session=session,
+                worker_index=self.worker_index,
+                worker_count=self.worker_count,
+            )
+
+        seconds = sum(x.seconds for x in results)
+        tiles = sum(x.tiles for x in results)
+
+        get_logger().info(
+            "pregenerate_tiles",
+            layers=len(results),
+            failed=sum(x.error is not None for x in results),
+            tiles=tiles,
+            tiles_per_second=tiles / seconds if seconds else 0.0,
+            remaining=remaining,
+        )
@@ -0,0 +1,61 @@
+"""
+Computes colour ranges in the background for layers left on "auto".
+"""
+
+from datetime import timedelta
+
+from structlog import get_logger
+
+from tileadder.server.database import EngineManager
+from tileadder.service.ranges import (
+    compute_layer_ranges,
+    layers_missing_ranges,
+    store_layer_ranges,
+)
+from tileadder.settings import get_settings
+
+from .task import Task
+
+
+class ComputeLayerRanges(Task):
+    """
+    Fills in vmin/vmax for a batch of layers on each run, computing robust
+    percentiles from a downsampled read of their files in parallel. Layers
+    whose ranges cannot be computed are recorded as failed and not retried.
+    """
+
+    every: timedelta = timedelta(minutes=1)
+    batch_size: int = 200
+
+    def on_call(self):
+        settings = get_settings()
+        manager = EngineManager(database_url=settings.database_url)
+
+        with manager.session as session:
+            layers = layers_missing_ranges(
+                session=session,
+                limit=self.batch_size,
+                worker_index=self.worker_index,
+                worker_count=self.worker_count,
+            )
+
+            if not layers:
+                return
+
+            results = compute_layer_ranges(
+                layers=layers,
+                workers=settings.layer_range_workers,
+                percentiles=settings.layer_range_percentiles,
+                max_samples=settings.layer_range_max_samples,
+            )
+
+            updated = store_layer_ranges(
+                session=session, layers=layers, results=results
+            )
+
+        get_logger().info(
+            "compute_layer_ranges",
+            layers=len(layers),
+            updated=updated,
+            failed=len(layers) - updated,
+        )
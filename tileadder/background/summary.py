@@ -0,0 +1,38 @@
+"""
+Backfills summaries for map groups that were created without one.
+"""
+
+from datetime import timedelta
+
+from structlog import get_logger
+
+from tileadder.server.database import EngineManager
+from tileadder.service.summary import backfill_summaries
+from tileadder.settings import get_settings
+
+from .task import Task
+
+
+class BackfillSummaries(Task):
+    """
+    Computes the summaries of a batch of map groups that have none on each
+    run. Groups written by tileadder keep their summaries up to date, so
+    this only has work to do after upgrades or writes made elsewhere.
+    """
+
+    every: timedelta = timedelta(minutes=5)
+    batch_size: int = 20
+
+    def on_call(self):
+        manager = EngineManager(database_url=get_settings().database_url)
+
+        with manager.session as session:
+            backfilled = backfill_summaries(
+                session=session,
+                limit=self.batch_size,
+                worker_index=self.worker_index,
+                worker_count=self.worker_count,
+            )
+
+        if backfilled:
+            get_logger().info("backfill_summaries", map_groups=backfilled)
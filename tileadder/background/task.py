@@ -3,6 +3,7 @@ A pydantic model that implements callable so that it can be executed as a task.
 """
 
 import abc
+import zlib
 from datetime import timedelta
 
 from pydantic import BaseModel
@@ -24,10 +25,22 @@ class Task(BaseModel, abc.ABC):
     "Whether or not to reschedule the task if it fails."
     every: timedelta = timedelta(hours=1)
     "How often to run the task"
+    worker_index: int = 0
+    "Index of the background worker running this task."
+    worker_count: int = 1
+    "Number of background workers that work is shared between."
 
     def task(self):
         return self.__call__()
 
+    def owns(self, key: str) -> bool:
+        """
+        Whether this worker is responsible for the piece of work identified
+        by `key`. Work is sharded between background workers by a stable hash
+        so that each piece is only ever handled by one of them.
+        """
+        return zlib.crc32(key.encode("utf-8")) % self.worker_count == self.worker_index
+
     @abc.abstractmethod
     def on_call(self):
         """
@@ -41,4 +54,4 @@ class Task(BaseModel, abc.ABC):
         Calls the function with the given keyword arguments.
         """
 
-        return self.on_call()
\ No newline at end of file
+        return self.on_call()
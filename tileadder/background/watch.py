@@ -0,0 +1,215 @@
+"""
+Watches mapcat databases for changes, so that registrations can be synced
+as soon as their catalog is written to rather than on their next scheduled
+run.
+"""
+
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from pydantic import PrivateAttr
+from sqlalchemy import select
+from structlog import get_logger
+
+from tileadder.server.database import EngineManager
+from tileadder.service.mapcat import MapCatRegistration, update_mapcats
+from tileadder.settings import get_settings
+
+from .mapcat import mapcat_cadence
+from .task import Task
+
+# A SQLite file, its rollback journal, and its write-ahead log. The shared
+# memory index (-shm) is left out, as readers write to it too, so our own
+# syncs would set it off.
+WATCHED_SUFFIXES = ("", "-journal", "-wal")
+
+
+class ChangeWatcher:
+    """
+    Watches a set of files for changes, using inotify through `watchfiles`
+    when it is installed and falling back to polling `stat` otherwise.
+    Changes to a file's SQLite journal or write-ahead log are attributed to
+    the file itself.
+
+    Changes are recorded with the time they were last seen; `drain` hands
+    back those that have been quiet for at least the debounce interval.
+    """
+
+    def __init__(self, files: set[Path], poll_interval: float = 2.0):
+        self.files = {x.absolute() for x in files}
+        self.poll_interval = poll_interval
+
+        self._changes: dict[Path, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _target(self, path: Path) -> Path | None:
+        """
+        The watched file that a changed path belongs to.
+        """
+
+        path = path.absolute()
+
+        for file in self.files:
+            if path.parent == file.parent and path.name in (
+                f"{file.name}{suffix}" for suffix in WATCHED_SUFFIXES
+            ):
+                return file
+
+        return None
+
+    def _record(self, path: Path):
+        target = self._target(path)
+
+        if target is not None:
+            with self._lock:
+                self._changes[target] = time.monotonic()
+
+    def _signature(self, path: Path) -> tuple[int, int] | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _poll(self):
+        watched = [
+            path.with_name(f"{path.name}{suffix}")
+            for path in self.files
+            for suffix in WATCHED_SUFFIXES
+        ]
+
+        signatures = {x: self._signature(x) for x in watched}
+
+        while not self._stop.wait(self.poll_interval):
+            for path in watched:
+                signature = self._signature(path)
+
+                if signature != signatures[path]:
+                    signatures[path] = signature
+                    self._record(path)
+
+    def _inotify(self):
+        import watchfiles
+
+        roots = {x.parent for x in self.files if x.parent.exists()}
+
+        # watchfiles needs at least one directory; until one of ours
+        # exists, poll for it instead.
+        if not roots:
+            self._poll()
+            return
+
+        for changes in watchfiles.watch(*roots, recursive=False, stop_event=self._stop):
+            for _, path in changes:
+                self._record(Path(path))
+
+    def start(self):
+        if not self.files:
+            get_logger().info("watch.idle")
+            return
+
+        try:
+            import watchfiles  # noqa: F401
+
+            target = self._inotify
+            mode = "inotify"
+        except ImportError:
+            target = self._poll
+            mode = "polling"
+
+        get_logger().info(
+            "watch.start",
+            mode=mode,
+            files=[str(x) for x in self.files],
+        )
+
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval * 2)
+
+    def drain(self, debounce_seconds: float) -> set[Path]:
+        """
+        Return (and forget) all changed paths that have not changed again
+        for at least `debounce_seconds`.
+        """
+
+        cutoff = time.monotonic() - debounce_seconds
+
+        with self._lock:
+            settled = {k for k, v in self._changes.items() if v <= cutoff}
+
+            for path in settled:
+                self._changes.pop(path)
+
+        return settled
+
+
+class WatchForChanges(Task):
+    """
+    A background task that keeps a `ChangeWatcher` running over every
+    registered SQLite mapcat, and immediately syncs registrations whose
+    mapcat has changed, regardless of their cadence.
+    """
+
+    every: timedelta = timedelta(seconds=5)
+
+    _watcher: ChangeWatcher | None = PrivateAttr(default=None)
+
+    def on_call(self):
+        settings = get_settings()
+        manager = EngineManager(database_url=settings.database_url)
+        with manager.session as session:
+            registrations = [
+                x
+                for x in session.execute(select(MapCatRegistration)).scalars().all()
+                if self.owns(x.mapcat_path)
+            ]
+
+            files = {
+                Path(x.mapcat_path).absolute()
+                for x in registrations
+                if x.mapcat_database_type == "sqlite"
+            }
+
+            if self._watcher is None or self._watcher.files != files:
+                if self._watcher is not None:
+                    self._watcher.stop()
+
+                self._watcher = ChangeWatcher(files=files)
+                self._watcher.start()
+
+            changed = self._watcher.drain(
+                debounce_seconds=settings.watch_debounce_seconds
+            )
+
+            if not changed:
+                return
+
+            log = get_logger()
+            log.info("watch.changed", paths=[str(x) for x in changed])
+
+            due = [
+                x
+                for x in registrations
+                if x.mapcat_database_type == "sqlite"
+                and Path(x.mapcat_path).absolute() in changed
+            ]
+
+            if due:
+                log.info("watch.sync", mapcat_ids=[x.id for x in due])
+                update_mapcats(
+                    registrations=due,
+                    session=session,
+                    cadence=mapcat_cadence(settings),
+                    keep_syncs=settings.mapcat_sync_history,
+                )
@@ -3,36 +3,308 @@ A simple CLI for running a sample server.
 """
 
 import os
+import signal
+import socket
 import sys
 import time
-from multiprocessing import Process
+from ctypes import c_double
+from dataclasses import dataclass, field
+from multiprocessing import Process, RawValue
+from typing import Any, Callable
 
 import uvicorn
+from structlog import get_logger
 
+APP = "tileadder.server.app:app"
 
-def run_server(**kwargs):
+
+class HeartbeatServer(uvicorn.Server):
+    """
+    A uvicorn server that records the time on every tick of its main loop,
+    so that the supervisor can tell a blocked event loop from a live one.
+    """
+
+    def __init__(self, config: uvicorn.Config, heartbeat: c_double):
+        super().__init__(config)
+        self.heartbeat = heartbeat
+
+    async def on_tick(self, counter: int) -> bool:
+        self.heartbeat.value = time.monotonic()
+        return await super().on_tick(counter)
+
+
+def run_server(sock: socket.socket, heartbeat: c_double, **kwargs):
     for k, v in kwargs.items():
         os.environ[k] = v
 
-    uvicorn.run("tileadder.server.app:app", host="0.0.0.0", use_colors=True)
+    config = uvicorn.Config(APP, use_colors=True)
+    HeartbeatServer(config, heartbeat=heartbeat).run(sockets=[sock])
 
 
-def run_background(**kwargs):
+def run_background(
+    heartbeat: c_double, worker_index: int = 0, worker_count: int = 1, **kwargs
+):
     for k, v in kwargs.items():
         os.environ[k] = v
 
     from tileadder.background import background
 
-    background()
+    def beat():
+        heartbeat.value = time.monotonic()
+
+    background(worker_index=worker_index, worker_count=worker_count, heartbeat=beat)
+
+
+@dataclass
+class Child:
+    name: str
+    target: Callable
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    timeout: float = 0.0
+    process: Process | None = None
+    heartbeat: c_double | None = None
+    started_at: float = 0.0
+    failures: int = 0
+    restart_at: float | None = None
+
+
+class Supervisor:
+    """
+    Runs a set of child processes, restarting any that exit with an
+    exponential backoff, and forwarding SIGTERM/SIGINT to them so that they
+    can drain before the supervisor itself exits.
+
+    Each child is given a shared heartbeat value that it sets to
+    `time.monotonic()` while it is making progress. A child with a timeout
+    whose heartbeat is older than that is treated as hung: it is killed and
+    restarted like one that had crashed.
+    """
+
+    def __init__(self, backoff: float, backoff_max: float, grace: float):
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.grace = grace
+        self.children: list[Child] = []
+        self.stopping = False
+        self.log = get_logger()
+
+    def add(self, name: str, target: Callable, timeout: float = 0.0, **kwargs):
+        self.children.append(
+            Child(name=name, target=target, kwargs=kwargs, timeout=timeout)
+        )
+
+    def _start(self, child: Child):
+        child.started_at = time.monotonic()
+        child.heartbeat = RawValue("d", child.started_at)
+        child.process = Process(
+            target=child.target, kwargs={**child.kwargs, "heartbeat": child.heartbeat}
+        )
+        child.process.start()
+        child.restart_at = None
+        self.log.info("supervisor.start", child=child.name, pid=child.process.pid)
+
+    def _check(self, child: Child):
+        now = time.monotonic()
+
+        if child.process.is_alive():
+            silent = now - child.heartbeat.value
+
+            if not child.timeout or silent <= child.timeout:
+                # Children that have stayed up for a full backoff period are
+                # considered healthy again.
+                if child.failures and now - child.started_at > self.backoff_max:
+                    child.failures = 0
+                return
+
+            self.log.warning("supervisor.child_hung", child=child.name, silent=silent)
+            child.process.kill()
+            child.process.join()
+
+        if child.restart_at is None:
+            delay = min(self.backoff * 2**child.failures, self.backoff_max)
+            child.failures += 1
+            child.restart_at = now + delay
+            self.log.warning(
+                "supervisor.child_exited",
+                child=child.name,
+                exitcode=child.process.exitcode,
+                restart_in=delay,
+            )
+        elif now >= child.restart_at:
+            self._start(child)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def shutdown(self):
+        self.log.info("supervisor.shutdown", grace=self.grace)
+
+        for child in self.children:
+            if child.process.is_alive():
+                child.process.terminate()
+
+        deadline = time.monotonic() + self.grace
+
+        for child in self.children:
+            child.process.join(timeout=max(deadline - time.monotonic(), 0))
+
+        for child in self.children:
+            if child.process.is_alive():
+                self.log.warning("supervisor.kill", child=child.name)
+                child.process.kill()
+                child.process.join()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for child in self.children:
+            self._start(child)
+
+        while not self.stopping:
+            for child in self.children:
+                self._check(child)
+
+            time.sleep(0.5)
+
+        self.shutdown()
+
+
+def supervise(environment: dict[str, str]):
+    # Set in our own environment too, so that the settings we read here
+    # match the ones the children will see.
+    os.environ.update(environment)
+
+    from tileadder.settings import get_settings
+
+    settings = get_settings()
+
+    # Migrate before any workers start; they only check the schema version,
+    # so that they do not race each other to apply migrations.
+    from tileadder.server.database import EngineManager
+    from tileadder.service.migrations import migrate
+
+    engine = EngineManager(database_url=settings.database_url).engine
+    migrate(engine)
+    engine.dispose()
+    environment = {**environment, "TILEADDER_MIGRATE_ON_STARTUP": "false"}
+
+    # Bind once in the supervisor; every server worker accepts on the same
+    # socket, and it survives worker restarts.
+    sock = uvicorn.Config(APP, host=settings.host, port=settings.port).bind_socket()
+
+    supervisor = Supervisor(
+        backoff=settings.restart_backoff_seconds,
+        backoff_max=settings.restart_backoff_max_seconds,
+        grace=settings.shutdown_grace_seconds,
+    )
+
+    for index in range(settings.server_workers):
+        supervisor.add(
+            f"server-{index}",
+            run_server,
+            timeout=settings.server_heartbeat_timeout_seconds,
+            sock=sock,
+            **environment,
+        )
+
+    for index in range(settings.background_workers):
+        supervisor.add(
+            f"background-{index}",
+            run_background,
+            timeout=settings.background_heartbeat_timeout_seconds,
+            worker_index=index,
+            worker_count=settings.background_workers,
+            **environment,
+        )
+
+    supervisor.run()
+
+
+def transfer(command: str, arguments: list[str]):
+    """
+    Export a map group to, or import one from, a gzipped JSON-lines file
+    using the configured database.
+    """
+    import gzip
+
+    from tileadder.server.database import EngineManager
+    from tileadder.service.migrations import migrate
+    from tileadder.service.transfer import export_map_group, import_map_group
+    from tileadder.settings import get_settings
+
+    manager = EngineManager(database_url=get_settings().database_url)
+    migrate(manager.engine)
+
+    with manager.session as session:
+        if command == "export":
+            map_group_id, path = arguments
+
+            with open(path, "wb") as handle:
+                for chunk in export_map_group(
+                    session=session, map_group_id=int(map_group_id)
+                ):
+                    handle.write(chunk)
+        else:
+            (path,) = arguments
+
+            with gzip.open(path) as lines:
+                map_group_id, written = import_map_group(session=session, lines=lines)
+
+            print(
+                f"Imported map group {map_group_id}: {written.maps} maps, "
+                f"{written.bands} bands, {written.layers} layers"
+            )
+
+
+def run_migrations():
+    """
+    Apply any outstanding migrations to the configured database.
+    """
+    from tileadder.server.database import EngineManager
+    from tileadder.service.migrations import migrate
+    from tileadder.settings import get_settings
+
+    engine = EngineManager(database_url=get_settings().database_url).engine
+    version = migrate(engine)
+    engine.dispose()
+
+    print(f"Database schema is at version {version}")
+
+
+USAGE = """Usage:
+  tileadder run dev|prod
+  tileadder migrate
+  tileadder export MAP_GROUP_ID PATH
+  tileadder import PATH"""
 
 
 def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "migrate":
+        run_migrations()
+        return
+
+    if command in ("export", "import"):
+        if len(sys.argv) != (4 if command == "export" else 3):
+            print(USAGE)
+            exit(1)
+
+        try:
+            transfer(command=command, arguments=sys.argv[2:])
+        except ValueError as e:
+            print(e)
+            exit(1)
+
+        return
+
     try:
-        run = sys.argv[1] == "run"
+        run = command == "run"
         dev = sys.argv[2] == "dev"
         prod = sys.argv[2] == "prod"
     except IndexError:
-        print("Only supported command is tileadder run dev or tilemaker run prod")
+        print(USAGE)
         exit(1)
 
     if run and dev:
@@ -41,20 +313,6 @@ def main():
             "TILEADDER_APP_BASE_URL": "http://localhost:8000",
         }
 
-        server_process = Process(target=run_server, kwargs=environment)
-        background_process = Process(target=run_background, kwargs=environment)
-
-        server_process.start()
-        background_process.start()
-
-        while True:
-            time.sleep(1)
+        supervise(environment=environment)
     if run and prod:
-        server_process = Process(target=run_server)
-        background_process = Process(target=run_background)
-
-        server_process.start()
-        background_process.start()
-
-        while True:
-            time.sleep(1)
+        supervise(environment={})
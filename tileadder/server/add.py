@@ -2,11 +2,14 @@
 API endpoints for adding new maps to the system.
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any
 
 from fastapi import APIRouter, HTTPException, Request, Response
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from starlette.authentication import requires
 
 from tileadder.service.creation import (
@@ -18,11 +21,19 @@ from tileadder.service.creation import (
 )
 from tileadder.service.existing import read_map_groups, read_maps_for_map_group
 from tileadder.service.filesystem import (
+    preview_image,
     safe_evaluate,
     safe_read_directory_specific_file_types,
 )
-
-from .templating import LoggerDependency, TemplateDependency, templateify
+from tileadder.settings import get_settings
+
+from .database import read_session
+from .templating import (
+    LoggerDependency,
+    TemplateDependency,
+    template_context,
+    templateify,
+)
 
 router = APIRouter(prefix="/add")
 
@@ -39,7 +50,9 @@ class PathPOSTRequest(BaseModel):
 
 @router.post("/list")
 @requires("maps:add")
-@templateify(template_name="htmx/directory_listing.html", log_name="add.list")
+@templateify(
+    template_name="htmx/directory_listing.html", log_name="add.list", stream=True
+)
 def get_list(
     x: PathPOSTRequest,
     request: Request,
@@ -53,6 +66,13 @@ def get_list(
         request.app.map_directory, search_path
     )
 
+    if request.app.prefetcher is not None:
+        request.app.prefetcher.prefetch(
+            owner=str(request.user.display_name),
+            top_level=request.app.map_directory,
+            paths=files,
+        )
+
     show_directory = (
         x.path is not None and x.path.absolute() != request.app.map_directory.absolute()
     )
@@ -67,6 +87,26 @@ def get_list(
     }
 
 
+def evaluation_context(top_level: Path, path: Path) -> dict[str, Any]:
+    """
+    Read the layers from a file and build the context for its evaluation
+    card in `htmx/evaluate.html`.
+    """
+    layers = safe_evaluate(top_level=top_level, file_path=top_level / path)
+
+    if not layers:
+        raise ValueError(f"No layers found in {path}")
+
+    return {
+        "filename": path.name,
+        "path": path,
+        "layers": layers,
+        "band_id": layers[0].layer_id.replace("-0-", "-"),
+        "default_band_name": path.name.replace(".fits", ""),
+        "default_band_description": f"Band created from {path}",
+    }
+
+
 @router.post("/evaluate")
 @requires("maps:add")
 @templateify(template_name="htmx/evaluate.html", log_name="add.evaluate")
@@ -77,20 +117,102 @@ def evaluate(
     templates: TemplateDependency,
 ):
     try:
-        layers = safe_evaluate(
-            top_level=request.app.map_directory,
-            file_path=request.app.map_directory / x.path,
-        )
-    except OSError:
+        return evaluation_context(top_level=request.app.map_directory, path=x.path)
+    except (OSError, ValueError):
         raise HTTPException(500, "Error with FITS file")
-    return {
-        "filename": x.path.name,
-        "path": x.path,
-        "layers": layers,
-        "band_id": layers[0].layer_id.replace("-0-", "-"),
-        "default_band_name": x.path.name.replace(".fits", ""),
-        "default_band_description": f"Band created from {x.path}",
-    }
+
+
+class BatchPathPOSTRequest(BaseModel):
+    paths: list[Path] = Field(min_length=1)
+
+
+@router.post("/evaluate/batch")
+@requires("maps:add")
+def evaluate_batch(
+    x: BatchPathPOSTRequest,
+    request: Request,
+    log: LoggerDependency,
+    templates: TemplateDependency,
+):
+    """
+    Evaluate many files at once. They are read in parallel, and each card
+    is sent as soon as its file has been read, so a directory's worth of
+    files takes about as long as the slowest one. Files that cannot be read
+    get an error card in place of their evaluation.
+    """
+    log = log.bind(user=request.user, scopes=request.auth.scopes, paths=x.paths)
+    log.info("add.evaluate_batch")
+
+    top_level = request.app.map_directory
+    paths = list(dict.fromkeys(x.paths))
+
+    card = templates.get_template("htmx/evaluate.html")
+    failed = templates.get_template("htmx/evaluate_failed.html")
+
+    def cards():
+        executor = ThreadPoolExecutor(
+            max_workers=min(get_settings().evaluate_workers, len(paths))
+        )
+
+        try:
+            futures = {
+                executor.submit(evaluation_context, top_level, path): path
+                for path in paths
+            }
+
+            for future in as_completed(futures):
+                path = futures[future]
+
+                try:
+                    context = future.result()
+                except Exception as e:
+                    # One unreadable file must not end the stream for the rest.
+                    log.warning(
+                        "add.evaluate_batch.failed",
+                        path=path,
+                        error=str(e),
+                        exc_info=True,
+                    )
+                    context = {"filename": path.name, "path": path, "error": str(e)}
+                    yield failed.render(template_context(request, templates, context))
+                    continue
+
+                yield card.render(template_context(request, templates, context))
+        finally:
+            # Stop reading files nobody will see if the client goes away.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return StreamingResponse(cards(), media_type="text/html")
+
+
+@router.get("/preview.png")
+@requires("maps:add")
+async def preview(
+    path: Path, request: Request, hdu: int = 0, index: int | None = None
+) -> Response:
+    """
+    A small preview of one layer of a file, rendered on the app's preview
+    pool so that a page full of them cannot tie up the server.
+    """
+    try:
+        content = await asyncio.wrap_future(
+            request.app.preview_executor.submit(
+                preview_image,
+                top_level=request.app.map_directory,
+                file_path=request.app.map_directory / path,
+                hdu=hdu,
+                index=index,
+                size=get_settings().preview_size,
+            )
+        )
+    except (OSError, ValueError, IndexError):
+        raise HTTPException(404, "No preview available")
+
+    return Response(
+        content=content,
+        media_type="image/png",
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
 
 
 class GroupCreationRequest(BaseModel):
@@ -121,7 +243,7 @@ def create_map_form(
     log: LoggerDependency,
     templates: TemplateDependency,
 ):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         map_groups = read_map_groups(session=s)
 
     return {"map_groups": map_groups, "band_id": bandid}
@@ -149,7 +271,7 @@ def existing_map_form(
     log: LoggerDependency,
     templates: TemplateDependency,
 ):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         map_groups = read_map_groups(session=s)
 
     return {"map_groups": map_groups, "band_id": bandid}
@@ -158,7 +280,7 @@ def existing_map_form(
 @router.get("/maps")
 @requires("maps:add")
 def map_data_for_map_group(map_group_id: int, request: Request):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         maps = read_maps_for_map_group(session=s, map_group_id=map_group_id)
 
     return HTMLResponse(
@@ -170,10 +292,13 @@ def map_data_for_map_group(map_group_id: int, request: Request):
 @requires("maps:add")
 def existing(x: ExistingMapFormData, request: Request):
     with request.app.engine.session as s:
-        parse_existing_map_to_orm(
+        result = parse_existing_map_to_orm(
             form=x,
             session=s,
             top_level=request.app.map_directory,
         )
 
-    return HTMLResponse(f"<p>Added new band to {x.map_id}.</p>")
+    return HTMLResponse(
+        f"<p>{'Added new' if result.band_created else 'Updated'} band in {x.map_id}: "
+        f"{len(result.created)} layers created, {len(result.updated)} updated.</p>"
+    )
@@ -4,40 +4,78 @@ This does not require any access to the database, and purely uses the
 soauth authentication scheme. It is packed purely for simplicity.
 """
 
-from fastapi import FastAPI
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from fastapi import FastAPI, Request
 from fastapi.responses import FileResponse
-from soauth.toolkit.fastapi import global_setup, mock_global_setup
+from soauth.toolkit.fastapi import global_setup, mock_global_setup, on_auth_error
+from starlette.middleware.authentication import AuthenticationMiddleware
 
-from tileadder.service.mapcat import MapCatRegistration, Base
+from tileadder.service.migrations import check_version, migrate
+from tileadder.service.prefetch import MetadataPrefetcher
 
-from tileadder.settings import Settings
+from tileadder.settings import get_settings
 
 from .add import router as add_router
+from .auth import AuthCache, CachedSOAuthCookieBackend
 from .current import router as current_router
-from .database import EngineManager
+from .database import READ_YOUR_WRITES_COOKIE, EngineManager
 from .templating import template_endpoint
 
-settings = Settings()
+settings = get_settings()
 
 key_type = settings.key_pair_type
 
-favicon = FileResponse(
-    __file__.replace("app.py", "favicon.ico"), media_type="image/x-icon"
-)
-apple_touch = FileResponse(
-    __file__.replace("app.py", "apple-touch-icon.png"), media_type="image/png"
-)
+
+@lru_cache
+def favicon() -> FileResponse:
+    return FileResponse(
+        __file__.replace("app.py", "favicon.ico"), media_type="image/x-icon"
+    )
+
+
+@lru_cache
+def apple_touch() -> FileResponse:
+    return FileResponse(
+        __file__.replace("app.py", "apple-touch-icon.png"), media_type="image/png"
+    )
 
 
 async def lifespan(app: FastAPI):
     app.app_id = str(settings.app_id)
-    app.engine = EngineManager(database_url=settings.database_url)
+    app.engine = EngineManager(
+        database_url=settings.database_url, replica_url=settings.database_replica_url
+    )
     app.map_directory = settings.map_directory
+    app.prefetcher = (
+        MetadataPrefetcher(
+            workers=settings.prefetch_workers, max_files=settings.prefetch_max_files
+        )
+        if settings.prefetch_metadata
+        else None
+    )
+    app.preview_executor = ThreadPoolExecutor(
+        max_workers=settings.preview_workers, thread_name_prefix="preview"
+    )
 
-    Base.metadata.create_all(app.engine.engine)
+    # A single process, such as a plain `uvicorn tileadder.server.app:app`,
+    # migrates for itself. Several processes would race to do so: under
+    # `tileadder run` the supervisor migrates and turns this off for its
+    # workers, and anyone starting workers by hand should do the same after
+    # running `tileadder migrate`.
+    if settings.migrate_on_startup:
+        migrate(app.engine.engine)
+    else:
+        check_version(app.engine.engine)
 
     yield
 
+    if app.prefetcher is not None:
+        app.prefetcher.shutdown()
+
+    app.preview_executor.shutdown(wait=False, cancel_futures=True)
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -51,11 +89,50 @@ if settings.auth_type == "soauth":
         client_secret=settings.client_secret,
         public_key=settings.public_key,
         key_pair_type=key_type,
+        add_middleware=False,
+    )
+    app.add_middleware(
+        AuthenticationMiddleware,
+        backend=CachedSOAuthCookieBackend(
+            cache=AuthCache(
+                max_size=settings.auth_cache_size,
+                ttl_seconds=settings.auth_cache_ttl_seconds,
+            ),
+            public_key=app.public_key,
+            key_pair_type=app.key_pair_type,
+            use_refresh_token=app.use_refresh_token,
+        ),
+        on_error=on_auth_error,
     )
 else:
     app = mock_global_setup(app, grants=["maps:add", "maps:edit", "maps:admin"])
 
 
+if settings.database_replica_url is not None:
+
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        """
+        After a successful mutation, send this client's reads to the primary
+        for a while, so that HTMX refreshes show the change even if the
+        replica has not caught up with it yet.
+        """
+        response = await call_next(request)
+
+        if request.method not in ("GET", "HEAD", "OPTIONS") and (
+            response.status_code < 400
+        ):
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE,
+                "1",
+                max_age=settings.replica_read_your_writes_seconds,
+                httponly=True,
+                samesite="lax",
+            )
+
+        return response
+
+
 template_endpoint(app=app, path="/", template="index.html", log_name="app.home")
 
 app.include_router(router=current_router)
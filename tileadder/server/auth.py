@@ -0,0 +1,158 @@
+"""
+Caching of decoded authentication state. HTMX pages fire many fragment
+requests per user, and each would otherwise re-parse the access token and
+rebuild the user and grants from scratch.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import jwt
+from soauth.toolkit.fastapi import SOAuthCookieBackend
+from starlette.authentication import AuthCredentials, BaseUser
+from starlette.requests import HTTPConnection
+from structlog import get_logger
+
+cache_info = namedtuple(
+    "CacheInfo", ("hits", "misses", "evictions", "expirations", "size", "max_size")
+)
+
+
+class AuthCache:
+    """
+    A bounded, least-recently-used cache of authentication results keyed
+    by a hash of the access token (the token itself is never stored). An
+    entry lives for at most `ttl_seconds`, and never beyond the expiry of
+    the token it was decoded from.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[
+            str, tuple[float, tuple[AuthCredentials, BaseUser]]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[AuthCredentials, BaseUser] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires, value = entry
+
+            if time.time() >= expires:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def put(
+        self,
+        key: str,
+        value: tuple[AuthCredentials, BaseUser],
+        token_expires: float | None = None,
+    ):
+        expires = time.time() + self.ttl_seconds
+
+        if token_expires is not None:
+            expires = min(expires, token_expires)
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def info(self) -> cache_info:
+        return cache_info(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            size=len(self._entries),
+            max_size=self.max_size,
+        )
+
+
+def token_expiry(token: str) -> float | None:
+    """
+    Read the expiry time of an access token that has already been verified.
+    """
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+
+    return float(exp) if exp is not None else None
+
+
+class CachedSOAuthCookieBackend(SOAuthCookieBackend):
+    """
+    The soauth cookie backend, with successful authentications cached per
+    access token. Failures (missing, expired, or undecodable tokens) are
+    never cached and always go through the full soauth path, so that its
+    refresh and redirect handling still applies.
+    """
+
+    def __init__(self, cache: AuthCache, log_every: int = 1000, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.log_every = log_every
+
+    def _access_token(self, conn: HTTPConnection) -> str | None:
+        if "Authorization" in conn.headers:
+            contents = conn.headers["Authorization"].split(" ")
+            return (
+                contents[1] if contents[0] == "Bearer" and len(contents) == 2 else None
+            )
+
+        return conn.cookies.get(self.access_token_name)
+
+    async def authenticate(self, conn: HTTPConnection):
+        token = self._access_token(conn)
+
+        if not token:
+            return await super().authenticate(conn)
+
+        key = self.cache.key(token)
+        cached = self.cache.get(key)
+
+        if cached is None:
+            credentials, user = await super().authenticate(conn)
+
+            if user.is_authenticated:
+                self.cache.put(
+                    key, (credentials, user), token_expires=token_expiry(token)
+                )
+
+            cached = (credentials, user)
+
+        info = self.cache.info()
+
+        if (info.hits + info.misses) % self.log_every == 0:
+            get_logger().info("auth_cache.stats", **info._asdict())
+
+        return cached
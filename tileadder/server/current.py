@@ -2,8 +2,14 @@
 Handling for currently loaded maps
 """
 
-from fastapi import APIRouter, Request, Response
+import gzip
+from datetime import date, datetime, time, timezone
+from tempfile import SpooledTemporaryFile
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.authentication import requires
+from starlette.concurrency import run_in_threadpool
 
 from tileadder.service.existing import (
     MapEdit,
@@ -14,7 +20,7 @@ from tileadder.service.existing import (
     read_bands_for_map,
     read_map,
     read_map_group,
-    read_map_groups,
+    read_map_group_summaries,
     read_maps_for_map_group,
     update_map,
     update_map_group,
@@ -22,8 +28,12 @@ from tileadder.service.existing import (
 from tileadder.service.mapcat import (
     MapCatRegistrationFormData,
     create_mapcat_registration,
+    read_mapcat_registrations,
+    read_mapcat_syncs,
 )
+from tileadder.service.transfer import export_map_group, import_map_group
 
+from .database import read_session
 from .templating import LoggerDependency, TemplateDependency, templateify
 
 router = APIRouter(prefix="/current")
@@ -33,8 +43,8 @@ router = APIRouter(prefix="/current")
 @requires("maps:edit")
 @templateify(template_name="current.html", log_name="current.index")
 def groups(request: Request, log: LoggerDependency, templates: TemplateDependency):
-    with request.app.engine.session as s:
-        map_groups = read_map_groups(session=s)
+    with read_session(request) as s:
+        map_groups = read_map_group_summaries(session=s)
 
     return {"map_groups": map_groups}
 
@@ -45,7 +55,11 @@ def groups(request: Request, log: LoggerDependency, templates: TemplateDependenc
 def mapcat_registration_page(
     request: Request, log: LoggerDependency, templates: TemplateDependency
 ):
-    return {}
+    with read_session(request) as s:
+        registrations = read_mapcat_registrations(session=s)
+        syncs = read_mapcat_syncs(session=s)
+
+    return {"registrations": registrations, "syncs": syncs}
 
 
 @router.post("/mapcat/register")
@@ -83,6 +97,55 @@ def delete_map_group_endpoint(
         delete_map_group(session=s, map_group_id=map_group_id)
 
 
+@router.get("/groups/{map_group_id}/export")
+@requires("maps:admin")
+def export_map_group_endpoint(map_group_id: int, request: Request) -> Response:
+    with read_session(request) as s:
+        try:
+            read_map_group(session=s, map_group_id=map_group_id)
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+
+    def stream():
+        with read_session(request) as s:
+            yield from export_map_group(session=s, map_group_id=map_group_id)
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="map-group-{map_group_id}.jsonl.gz"'
+            )
+        },
+    )
+
+
+@router.post("/groups/import")
+@requires("maps:admin")
+async def import_map_group_endpoint(request: Request) -> Response:
+    # Spool the upload so that large exports go to disk rather than memory.
+    with SpooledTemporaryFile(max_size=64 * 1024 * 1024) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+
+        upload.seek(0)
+
+        def load():
+            with request.app.engine.session as s, gzip.open(upload) as lines:
+                return import_map_group(session=s, lines=lines)
+
+        try:
+            map_group_id, written = await run_in_threadpool(load)
+        except (OSError, ValueError) as e:
+            raise HTTPException(400, f"Could not import map group: {e}")
+
+    return JSONResponse(
+        status_code=201,
+        content={"map_group_id": map_group_id, **written._asdict()},
+    )
+
+
 @router.get("/groups/edit/{map_group_id}")
 @requires("maps:edit")
 @templateify(template_name="htmx/edit_map_group.html", log_name="current.edit_form")
@@ -92,7 +155,7 @@ def get_group_edit_form(
     log: LoggerDependency,
     templates: TemplateDependency,
 ):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         map_group = read_map_group(session=s, map_group_id=map_group_id)
 
     return {"map_group": map_group}
@@ -122,12 +185,31 @@ def maps_from_map_group(
     request: Request,
     log: LoggerDependency,
     templates: TemplateDependency,
+    start: str | None = None,
+    end: str | None = None,
 ):
-    with request.app.engine.session as s:
+    # Dates come from the filter form, where empty inputs are sent as empty
+    # strings; both ends of the range are inclusive, in UTC.
+    try:
+        start_date = date.fromisoformat(start) if start else None
+        end_date = date.fromisoformat(end) if end else None
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid date: {e}")
+
+    with read_session(request) as s:
         map_group = read_map_group(session=s, map_group_id=map_group_id)
-        maps = read_maps_for_map_group(session=s, map_group_id=map_group_id)
+        maps = read_maps_for_map_group(
+            session=s,
+            map_group_id=map_group_id,
+            start=None
+            if start_date is None
+            else datetime.combine(start_date, time.min, tzinfo=timezone.utc),
+            end=None
+            if end_date is None
+            else datetime.combine(end_date, time.max, tzinfo=timezone.utc),
+        )
 
-    return {"map_group": map_group, "maps": maps}
+    return {"map_group": map_group, "maps": maps, "start": start, "end": end}
 
 
 @router.get("/maps/edit/{map_id}")
@@ -139,7 +221,7 @@ def get_map_edit_form(
     log: LoggerDependency,
     templates: TemplateDependency,
 ):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         map = read_map(session=s, map_id=map_id)
 
     return {"map": map}
@@ -175,6 +257,7 @@ def delete_map_endpoint(
 @templateify(
     template_name="htmx/bands_from_map.html",
     log_name="current.bands_from_map",
+    stream=True,
 )
 def bands_from_map(
     map_id: int,
@@ -182,7 +265,7 @@ def bands_from_map(
     log: LoggerDependency,
     templates: TemplateDependency,
 ):
-    with request.app.engine.session as s:
+    with read_session(request) as s:
         bands = read_bands_for_map(session=s, map_id=map_id)
         map = read_map(session=s, map_id=map_id)
 
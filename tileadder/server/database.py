@@ -2,29 +2,65 @@
 Tools for connecting to the database for tilemaker.
 """
 
+import json
+
+from fastapi import Request
 from sqlalchemy import Engine, create_engine, event
 from sqlalchemy.orm import Session, sessionmaker
 
+# Set after a mutation, so that the same client's reads go to the primary
+# until the replica has had time to catch up.
+READ_YOUR_WRITES_COOKIE = "tileadder_read_primary"
+
 
 class EngineManager:
+    """
+    Engines and sessions for the primary database and, optionally, a
+    read-only replica of it. Without a replica URL, reads use the primary.
+    """
+
     _engine: Engine | None = None
     _sessionmaker: sessionmaker | None = None
+    _replica_engine: Engine | None = None
+    _read_sessionmaker: sessionmaker | None = None
 
-    def __init__(self, database_url: str):
+    def __init__(self, database_url: str, replica_url: str | None = None):
         self.database_url = database_url
+        self.replica_url = replica_url
+
+    @staticmethod
+    def _create_engine(database_url: str) -> Engine:
+        # JSON columns (e.g. layer providers) are stored without whitespace.
+        engine = create_engine(
+            database_url,
+            json_serializer=lambda x: json.dumps(x, separators=(",", ":")),
+        )
+
+        if "sqlite" in database_url:
+
+            def _fk_pragma_on_connect(dbapi_con, con_record):
+                dbapi_con.execute("pragma foreign_keys=ON")
+
+            event.listen(engine, "connect", _fk_pragma_on_connect)
+
+        return engine
 
     @property
     def engine(self) -> Engine:
         if self._engine is None:
-            self._engine = create_engine(self.database_url)
-            if "sqlite" in self.database_url:
+            self._engine = self._create_engine(self.database_url)
+
+        return self._engine
 
-                def _fk_pragma_on_connect(dbapi_con, con_record):
-                    dbapi_con.execute("pragma foreign_keys=ON")
+    @property
+    def replica_engine(self) -> Engine:
+        if self.replica_url is None:
+            return self.engine
 
-                event.listen(self._engine, "connect", _fk_pragma_on_connect)
+        if self._replica_engine is None:
+            self._replica_engine = self._create_engine(self.replica_url)
 
-        return self._engine
+        return self._replica_engine
 
     @property
     def session(self) -> Session:
@@ -32,3 +68,26 @@ class EngineManager:
             self._sessionmaker = sessionmaker(bind=self.engine)
 
         return self._sessionmaker()
+
+    @property
+    def read_session(self) -> Session:
+        """
+        A session on the replica, for reads that can tolerate replication
+        lag. Never write through it.
+        """
+        if self._read_sessionmaker is None:
+            self._read_sessionmaker = sessionmaker(bind=self.replica_engine)
+
+        return self._read_sessionmaker()
+
+
+def read_session(request: Request) -> Session:
+    """
+    A session for the read-only parts of a request: on the replica, unless
+    this client has recently made a change that the replica may not have
+    caught up with yet.
+    """
+    if READ_YOUR_WRITES_COOKIE in request.cookies:
+        return request.app.engine.session
+
+    return request.app.engine.read_session
@@ -7,13 +7,14 @@ from pathlib import Path
 from typing import Annotated, Any, Callable, Iterable
 
 from fastapi import Depends, FastAPI, Request
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
 from structlog import get_logger
 from structlog.types import FilteringBoundLogger
 
-from tileadder.settings import Settings
+from tileadder.settings import get_settings
 
-settings = Settings()
+settings = get_settings()
 
 
 def setup_templating(
@@ -86,12 +87,70 @@ def template_endpoint(
     app.add_api_route(path=path, endpoint=core)
 
 
-def templateify(template_name: str | None = None, log_name: str | None = None):
+def template_context(
+    request: Request, templates: Jinja2Templates, context: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    The full context for rendering a template outside of `TemplateResponse`,
+    with the request and the output of the context processors added.
+    """
+
+    context.setdefault("request", request)
+
+    for context_processor in templates.context_processors:
+        context.update(context_processor(request))
+
+    return context
+
+
+def stream_template(
+    request: Request,
+    templates: Jinja2Templates,
+    name: str,
+    context: dict[str, Any],
+    chunk_size: int = 16384,
+) -> StreamingResponse:
+    """
+    Render a template incrementally with Jinja's `generate()`, sending it
+    in chunks of roughly `chunk_size` characters as it is rendered rather
+    than holding the whole page in memory first. The context is built in
+    the same way as `TemplateResponse`, including context processors.
+    """
+
+    context = template_context(request=request, templates=templates, context=context)
+    template = templates.get_template(name)
+
+    def chunks():
+        buffer = []
+        size = 0
+
+        for part in template.generate(context):
+            buffer.append(part)
+            size += len(part)
+
+            if size >= chunk_size:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield "".join(buffer)
+
+    return StreamingResponse(chunks(), media_type="text/html")
+
+
+def templateify(
+    template_name: str | None = None,
+    log_name: str | None = None,
+    stream: bool = False,
+):
     """
     Apply a template to a route. Your route should return a dictionary
     which is added to the template context. You must have `request: Request`
     and `templates: TemplateDependency` in your kwargs. If log_name is not
-    None, you must also have `log: LoggerDependency`.
+    None, you must also have `log: LoggerDependency`. With `stream`, the
+    template is rendered and sent incrementally; use this for fragments
+    that can grow very large.
     """
 
     def decorator(route: Callable):
@@ -112,6 +171,14 @@ def templateify(template_name: str | None = None, log_name: str | None = None):
                 )
                 log.info(log_name)
 
+            if stream:
+                return stream_template(
+                    request=request,
+                    templates=templates,
+                    name=template_name,
+                    context=context,
+                )
+
             return templates.TemplateResponse(
                 request=request,
                 name=template_name,
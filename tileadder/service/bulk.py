@@ -0,0 +1,354 @@
+"""
+Bulk insertion of new maps, bands, and layers. Rows are collected as plain
+dictionaries and written with Core executemany statements, avoiding the
+per-object flush and identity-map bookkeeping of the ORM path.
+
+On Postgres, large writes instead stream rows into temporary staging tables
+with `COPY FROM STDIN` and move them into the tilemaker tables with a
+single `INSERT ... SELECT` per table.
+"""
+
+import csv
+import io
+import json
+from collections import namedtuple
+from contextlib import closing
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON, Table, func, insert, select, text
+from sqlalchemy.orm import Session
+from tilemaker.metadata.orm import BandORM, LayerORM, MapORM
+
+from tileadder.service.filesystem import layers_file_size
+from tileadder.service.times import record_band_times
+
+bulk_result = namedtuple("BulkResult", ("maps", "bands", "layers", "fits_bytes"))
+
+# SQLite before 3.32 allows at most 999 bound parameters in a statement, so
+# follow-up lookups by key are made in chunks of at most this many keys.
+LOOKUP_CHUNK_SIZE = 900
+
+
+class BulkInsert:
+    """
+    Collects new map, band, and layer rows and writes them in batches.
+
+    Maps are keyed by their string `map_id` and bands by their string
+    `band_id`; children refer to their parents through these keys rather
+    than through database IDs, which are only resolved at write time.
+    Parents that already exist in the database can be registered with
+    `known_map` and `known_band` so that new children can hang off them.
+    Observation times for new bands are written to the band time table
+    alongside them.
+    """
+
+    def __init__(
+        self, batch_size: int = 5000, copy: bool | None = None, copy_min_rows: int = 500
+    ):
+        self.batch_size = batch_size
+        self.copy = copy
+        self.copy_min_rows = copy_min_rows
+
+        self.maps: dict[str, dict[str, Any]] = {}
+        self.bands: dict[str, dict[str, Any]] = {}
+        self.layers: dict[str, dict[str, Any]] = {}
+        self.band_times: dict[str, dict[str, Any]] = {}
+
+        self.map_ids: dict[str, int] = {}
+        self.band_ids: dict[str, int] = {}
+        self.layer_ids: set[str] = set()
+
+    @classmethod
+    def for_map_group(
+        cls, session: Session, map_group_id: int, batch_size: int = 5000
+    ) -> "BulkInsert":
+        """
+        Create a bulk inserter that already knows about every map, band,
+        and layer in the given map group. Only the key columns are loaded.
+        """
+
+        inserter = cls(batch_size=batch_size)
+
+        for id, map_id in session.execute(
+            select(MapORM.id, MapORM.map_id).where(MapORM.map_group_id == map_group_id)
+        ):
+            inserter.known_map(map_id=map_id, id=id)
+
+        for id, band_id in session.execute(
+            select(BandORM.id, BandORM.band_id)
+            .join(MapORM, BandORM.map_id == MapORM.id)
+            .where(MapORM.map_group_id == map_group_id)
+        ):
+            inserter.known_band(band_id=band_id, id=id)
+
+        inserter.layer_ids.update(
+            session.execute(
+                select(LayerORM.layer_id)
+                .join(BandORM, LayerORM.band_id == BandORM.id)
+                .join(MapORM, BandORM.map_id == MapORM.id)
+                .where(MapORM.map_group_id == map_group_id)
+            ).scalars()
+        )
+
+        return inserter
+
+    def known_map(self, map_id: str, id: int):
+        self.map_ids[map_id] = id
+
+    def known_band(self, band_id: str, id: int):
+        self.band_ids[band_id] = id
+
+    def has_map(self, map_id: str) -> bool:
+        return map_id in self.map_ids or map_id in self.maps
+
+    def has_band(self, band_id: str) -> bool:
+        return band_id in self.band_ids or band_id in self.bands
+
+    def has_layer(self, layer_id: str) -> bool:
+        return layer_id in self.layer_ids
+
+    def add_map(self, map_id: str, **columns):
+        self.maps[map_id] = {"map_id": map_id, **columns}
+
+    def add_band(self, band_id: str, map_id: str, **columns):
+        """
+        Add a new band, belonging to the map with the string ID `map_id`.
+        """
+        self.bands[band_id] = {"band_id": band_id, "map_id": map_id, **columns}
+
+    def add_band_times(
+        self,
+        band_id: str,
+        start_time: datetime,
+        central_time: datetime | None,
+        end_time: datetime,
+    ):
+        """
+        Record the observation times of a new band, added with `add_band`
+        under the string ID `band_id`.
+        """
+        self.band_times[band_id] = {
+            "band_id": band_id,
+            "start_time": start_time,
+            "central_time": central_time,
+            "end_time": end_time,
+        }
+
+    def add_layer(self, layer_id: str, band_id: str, **columns):
+        """
+        Add a new layer, belonging to the band with the string ID `band_id`.
+        Layer IDs are unique, so adding one that is already known or pending
+        raises a ValueError rather than replacing it.
+        """
+        if layer_id in self.layer_ids:
+            raise ValueError(f"Layer {layer_id} has already been added")
+
+        self.layers[layer_id] = {"layer_id": layer_id, "band_id": band_id, **columns}
+        self.layer_ids.add(layer_id)
+
+    def _insert_returning_ids(
+        self, session: Session, table: Table, key: str, rows: list[dict[str, Any]]
+    ) -> dict[str, int]:
+        """
+        Insert rows in batches, returning a mapping from the string key
+        column to the new primary key. Uses INSERT ... RETURNING when the
+        dialect supports it for executemany, and a follow-up select otherwise.
+        """
+
+        ids = {}
+        key_column = table.c[key]
+        returning = session.get_bind().dialect.insert_executemany_returning
+
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start : start + self.batch_size]
+
+            if returning:
+                result = session.execute(
+                    insert(table).returning(table.c.id, key_column), batch
+                )
+            else:
+                previous_max = session.execute(
+                    select(func.coalesce(func.max(table.c.id), 0))
+                ).scalar_one()
+                session.execute(insert(table), batch)
+                keys = [x[key] for x in batch]
+                result = [
+                    row
+                    for chunk in range(0, len(keys), LOOKUP_CHUNK_SIZE)
+                    for row in session.execute(
+                        select(table.c.id, key_column).where(
+                            table.c.id > previous_max,
+                            key_column.in_(keys[chunk : chunk + LOOKUP_CHUNK_SIZE]),
+                        )
+                    )
+                ]
+
+            ids.update({k: id for id, k in result})
+
+        return ids
+
+    @staticmethod
+    def _cursor(session: Session):
+        # A raw DBAPI cursor on the session's connection, in its transaction.
+        return session.connection().connection.dbapi_connection.cursor()
+
+    def _use_copy(self, session: Session) -> bool:
+        """
+        Whether to write through COPY: by default, only on Postgres through
+        a psycopg (3) or psycopg2 connection, and only once there are enough
+        rows for the staging tables to pay for themselves.
+        """
+
+        if self.copy is False or session.get_bind().dialect.name != "postgresql":
+            return False
+
+        with closing(self._cursor(session)) as cursor:
+            if not (hasattr(cursor, "copy") or hasattr(cursor, "copy_expert")):
+                return False
+
+        if self.copy:
+            return True
+
+        pending = len(self.maps) + len(self.bands) + len(self.layers)
+
+        return pending >= self.copy_min_rows
+
+    def _copy_returning_ids(
+        self,
+        session: Session,
+        table: Table,
+        key: str | None,
+        rows: list[dict[str, Any]],
+    ) -> dict[str, int]:
+        """
+        COPY rows into a temporary staging table shaped like `table`, then
+        insert them all into `table` in one statement. Returns a mapping
+        from the string key column to the new primary key, if `key` is
+        given.
+        """
+
+        if not rows:
+            return {}
+
+        quote = session.get_bind().dialect.identifier_preparer.quote
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        json_columns = {x for x in columns if isinstance(table.c[x].type, JSON)}
+
+        target = quote(table.name)
+        staging = quote(f"tileadder_staging_{table.name}")
+        column_list = ", ".join(quote(x) for x in columns)
+
+        session.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        session.execute(
+            text(
+                f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM {target} WITH NO DATA"
+            )
+        )
+
+        values = (
+            [
+                json.dumps(row.get(x), separators=(",", ":"))
+                if x in json_columns
+                else row.get(x)
+                for x in columns
+            ]
+            for row in rows
+        )
+
+        copy = f"COPY {staging} ({column_list}) FROM STDIN"
+        with closing(self._cursor(session)) as cursor:
+            if hasattr(cursor, "copy"):
+                # psycopg 3 adapts each value itself.
+                with cursor.copy(copy) as copier:
+                    for value in values:
+                        copier.write_row(value)
+            else:
+                # psycopg2 takes a file. In CSV, unquoted empty fields are
+                # NULL, and QUOTE_STRINGS quotes every string (even empty
+                # ones).
+                buffer = io.StringIO()
+                csv.writer(buffer, quoting=csv.QUOTE_STRINGS).writerows(values)
+                buffer.seek(0)
+                cursor.copy_expert(f"{copy} WITH (FORMAT csv)", buffer)
+
+        merge = (
+            f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging}"
+        )
+
+        if key is None:
+            session.execute(text(merge))
+            return {}
+
+        result = session.execute(text(f"{merge} RETURNING id, {quote(key)}"))
+
+        return {k: id for id, k in result}
+
+    def write(self, session: Session, measure_files: bool = True) -> bulk_result:
+        """
+        Write all pending rows, resolving parent keys to database IDs as we go.
+        Does not commit; that is left to the caller. With `measure_files`
+        False, the files referenced by new layers are not stat'd and
+        `fits_bytes` is reported as zero.
+        """
+
+        use_copy = self._use_copy(session)
+        insert_returning_ids = (
+            self._copy_returning_ids if use_copy else self._insert_returning_ids
+        )
+
+        self.map_ids.update(
+            insert_returning_ids(
+                session, MapORM.__table__, "map_id", list(self.maps.values())
+            )
+        )
+
+        band_rows = [
+            {**x, "map_id": self.map_ids[x["map_id"]]} for x in self.bands.values()
+        ]
+        self.band_ids.update(
+            insert_returning_ids(session, BandORM.__table__, "band_id", band_rows)
+        )
+
+        record_band_times(
+            session,
+            [
+                {
+                    **x,
+                    "band_id": self.band_ids[x["band_id"]],
+                    "map_id": self.map_ids[self.bands[x["band_id"]]["map_id"]],
+                }
+                for x in self.band_times.values()
+            ],
+            batch_size=self.batch_size,
+        )
+
+        layer_rows = [
+            {**x, "band_id": self.band_ids[x["band_id"]]} for x in self.layers.values()
+        ]
+
+        if use_copy:
+            self._copy_returning_ids(session, LayerORM.__table__, None, layer_rows)
+        else:
+            for start in range(0, len(layer_rows), self.batch_size):
+                session.execute(
+                    insert(LayerORM.__table__),
+                    layer_rows[start : start + self.batch_size],
+                )
+
+        result = bulk_result(
+            maps=len(self.maps),
+            bands=len(self.bands),
+            layers=len(self.layers),
+            fits_bytes=layers_file_size(x["provider"] for x in self.layers.values())
+            if measure_files
+            else 0,
+        )
+
+        self.maps.clear()
+        self.bands.clear()
+        self.layers.clear()
+        self.band_times.clear()
+
+        return result
@@ -0,0 +1,162 @@
+"""
+A process-wide pool of engines for mapcat databases, so that registrations
+pointing at the same mapcat (and repeated background runs) share a single
+engine rather than each building their own.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+
+@dataclass
+class PooledEngine:
+    engine: Engine
+    signature: tuple[int, int] | None
+    last_used: float
+
+
+def sqlite_signature(path: str | Path) -> tuple[int, int] | None:
+    """
+    A cheap signature for a SQLite file, used to decide whether an immutable
+    connection is still valid. Returns None if the file cannot be opened
+    immutably, i.e. it does not exist or has an un-checkpointed write-ahead
+    log that immutable connections would ignore.
+    """
+
+    path = Path(path)
+    wal = path.with_name(f"{path.name}-wal")
+
+    try:
+        if wal.exists() and wal.stat().st_size > 0:
+            return None
+
+        stat = path.stat()
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def sqlite_file_signature(path: str | Path) -> tuple[int, ...] | None:
+    """
+    A signature of a SQLite file and its write-ahead log that changes with
+    every committed write, including updates in place. Returns None if the
+    file cannot be stat-ed.
+    """
+
+    path = Path(path)
+
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    try:
+        wal = path.with_name(f"{path.name}-wal").stat()
+        wal_signature = (wal.st_mtime_ns, wal.st_size)
+    except OSError:
+        wal_signature = (0, 0)
+
+    return (stat.st_mtime_ns, stat.st_size, *wal_signature)
+
+
+class MapCatEnginePool:
+    """
+    Engines for mapcat databases, keyed by (database_type, path). SQLite
+    catalogs are opened read-only, and immutable where possible; immutable
+    engines are replaced as soon as the file on disk changes. Engines that
+    have not been used for `max_idle_seconds` are disposed of by `evict_idle`.
+    """
+
+    def __init__(self, max_idle_seconds: float = 3600.0):
+        self.max_idle_seconds = max_idle_seconds
+        self._engines: dict[tuple[str, str], PooledEngine] = {}
+        self._lock = threading.Lock()
+
+    def url(self, database_type: str, path: str, immutable: bool = False) -> str:
+        if database_type == "sqlite":
+            options = "mode=ro&immutable=1" if immutable else "mode=ro"
+            return f"sqlite:///file:{quote(str(path))}?{options}&uri=true"
+        if database_type == "postgresql":
+            return f"postgresql://{path}"
+
+        raise ValueError(f"Unknown mapcat database type: {database_type}")
+
+    def _create(self, database_type: str, path: str) -> PooledEngine:
+        if database_type == "sqlite":
+            signature = sqlite_signature(path)
+            engine = create_engine(
+                self.url(database_type, path, immutable=signature is not None)
+            )
+        else:
+            signature = None
+            engine = create_engine(
+                self.url(database_type, path),
+                connect_args={"options": "-c default_transaction_read_only=on"},
+                pool_pre_ping=True,
+            )
+
+        get_logger().info(
+            "mapcat_pool.create",
+            database_type=database_type,
+            path=path,
+            immutable=signature is not None,
+        )
+
+        return PooledEngine(
+            engine=engine, signature=signature, last_used=time.monotonic()
+        )
+
+    def engine(self, database_type: str, path: str) -> Engine:
+        key = (database_type, str(path))
+
+        with self._lock:
+            pooled = self._engines.get(key)
+
+            if pooled is not None and pooled.signature is not None:
+                if sqlite_signature(path) != pooled.signature:
+                    pooled.engine.dispose()
+                    pooled = None
+
+            if pooled is None:
+                pooled = self._create(database_type=database_type, path=str(path))
+                self._engines[key] = pooled
+
+            pooled.last_used = time.monotonic()
+
+            return pooled.engine
+
+    def session(self, database_type: str, path: str) -> Session:
+        return Session(
+            bind=self.engine(database_type=database_type, path=path),
+            expire_on_commit=False,
+        )
+
+    def evict_idle(self) -> int:
+        """
+        Dispose of engines that have been idle for longer than
+        `max_idle_seconds`. Returns the number of engines evicted.
+        """
+
+        cutoff = time.monotonic() - self.max_idle_seconds
+
+        with self._lock:
+            idle = [k for k, v in self._engines.items() if v.last_used < cutoff]
+
+            for key in idle:
+                self._engines.pop(key).engine.dispose()
+
+        if idle:
+            get_logger().info("mapcat_pool.evict", evicted=len(idle))
+
+        return len(idle)
+
+
+mapcat_engines = MapCatEnginePool()
@@ -3,19 +3,23 @@ Tools for creating new database rows.
 """
 
 from pathlib import Path
-from typing import Literal
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 from sqlalchemy import select
 from sqlalchemy.orm import Session
-from tilemaker.metadata.database import (
-    BandORM,
-    LayerORM,
+from tilemaker.metadata.orm import (
     MapGroupORM,
     MapORM,
 )
 
-from tileadder.service.filesystem import parse_layer_metadata
+from tileadder.service.bulk import BulkInsert, bulk_result
+from tileadder.service.filesystem import (
+    layers_file_size,
+    parse_layer_metadata,
+)
+from tileadder.service.summary import MapGroupSummary, record_additions
+from tileadder.service.upsert import upsert_band, upsert_layers, upsert_result
 
 
 def create_map_group(
@@ -23,6 +27,8 @@ def create_map_group(
 ) -> MapGroupORM:
     new_map_group = MapGroupORM(name=name, description=description, grant=grant)
     session.add(new_map_group)
+    session.flush()
+    session.add(MapGroupSummary(map_group_id=new_map_group.id))
     session.commit()
 
     return new_map_group
@@ -64,20 +70,24 @@ class ExistingMapFormData(BaseModel):
     form_data: BandFormData
 
 
-def parse_map_form_to_orm(
-    form: MapFormData,
-    session: Session,
+def _form_layer_rows(
+    form: BandFormData,
+    grant: str | None,
     top_level: Path,
-    extensions: tuple[str] = ("fits",),
-) -> MapORM:
+    extensions: tuple[str],
+) -> list[dict[str, Any]]:
+    """
+    Re-parse the underlying file of a band form and return rows for its
+    included layers, with the user's overrides applied.
+    """
     layer_metadata = parse_layer_metadata(
         top_level=top_level,
-        file_path=form.form_data.path,
+        file_path=form.path,
         extensions=extensions,
     )
 
     try:
-        for x in form.form_data.layers:
+        for x in form.layers:
             layer_metadata[x.layer_id].update(
                 quantity=x.quantity,
                 units=x.units,
@@ -86,43 +96,62 @@ def parse_map_form_to_orm(
                 cmap=x.cmap,
             )
 
-        layers = [
-            LayerORM(
+        return [
+            dict(
                 layer_id=x.layer_id,
                 name=x.name,
                 description=x.description,
-                grant=form.form_data.required_grant,
+                grant=grant,
                 **layer_metadata[x.layer_id],
             )
-            for x in form.form_data.layers
+            for x in form.layers
             if x.included
         ]
     except KeyError:
         raise ValueError(
-            f"Layers {[x.layer_id for x in form.form_data.layers]} not found in {form.form_data.path}"
+            f"Layers {[x.layer_id for x in form.layers]} not found in {form.path}"
         )
 
-    band = BandORM(
-        band_id=form.form_data.band_id,
-        name=form.form_data.name,
-        description=form.form_data.description,
-        grant=form.form_data.required_grant,
-        layers=layers,
-    )
 
-    map = MapORM(
-        map_id=form.form_data.band_id[2:],
+def parse_map_form_to_orm(
+    form: MapFormData,
+    session: Session,
+    top_level: Path,
+    extensions: tuple[str] = ("fits",),
+) -> MapORM:
+    inserter = BulkInsert()
+
+    map_id = form.form_data.band_id[2:]
+
+    inserter.add_map(
+        map_id=map_id,
         name=form.name,
         description=form.description,
         grant=form.required_grant,
         map_group_id=form.map_group_id,
-        bands=[band],
     )
 
-    session.add(map)
+    inserter.add_band(
+        band_id=form.form_data.band_id,
+        map_id=map_id,
+        name=form.form_data.name,
+        description=form.form_data.description,
+        grant=form.form_data.required_grant,
+    )
+
+    for layer in _form_layer_rows(
+        form=form.form_data,
+        grant=form.form_data.required_grant,
+        top_level=top_level,
+        extensions=extensions,
+    ):
+        inserter.add_layer(band_id=form.form_data.band_id, **layer)
+
+    written = inserter.write(session=session)
+    record_additions(session=session, map_group_id=form.map_group_id, written=written)
     session.commit()
 
-    return map
+    return session.get(MapORM, inserter.map_ids[map_id])
 
 
 def parse_existing_map_to_orm(
@@ -130,65 +159,55 @@ def parse_existing_map_to_orm(
     session: Session,
     top_level: Path,
     extensions: tuple[str] = ("fits",),
-) -> MapORM:
+) -> upsert_result:
+    """
+    Add a band (or more layers to a band with the same name) to an existing
+    map. Re-adding the same file is idempotent: existing layers are updated
+    in place rather than duplicated. Returns which layers were created and
+    which were updated.
+    """
+
     map = session.execute(
-        select(MapORM).where(MapORM.map_id == form.map_id)
-    ).scalar_one_or_none()
+        select(MapORM.id, MapORM.map_group_id).where(MapORM.map_id == form.map_id)
+    ).one_or_none()
 
     if map is None:
         raise ValueError(f"Map with ID {form.map_id} does not exist")
 
-    # We may have an existing band with that name. Let's do the smart thing
-    # and upsert it.
-    band = session.execute(
-        select(BandORM).where(BandORM.name == form.form_data.name)
-    ).scalar_one_or_none()
-
-    if band is None:
-        band = BandORM(
-            band_id=form.form_data.band_id,
-            name=form.form_data.name,
-            description=form.form_data.description,
-            grant=form.form_data.required_grant,
-            map_id=map.id,
-        )
+    band_id, grant, band_created = upsert_band(
+        session=session,
+        map_id=map.id,
+        band_id=form.form_data.band_id,
+        name=form.form_data.name,
+        description=form.form_data.description,
+        grant=form.form_data.required_grant,
+    )
 
-    # Re-parse from filesystem to grab base data.
-    layer_metadata = parse_layer_metadata(
+    layers = _form_layer_rows(
+        form=form.form_data,
+        grant=grant,
         top_level=top_level,
-        file_path=form.form_data.path,
         extensions=extensions,
     )
 
-    try:
-        for x in form.form_data.layers:
-            layer_metadata[x.layer_id].update(
-                quantity=x.quantity,
-                units=x.units,
-                vmin=x.vmin,
-                vmax=x.vmax,
-                cmap=x.cmap,
-            )
-
-        layers = [
-            LayerORM(
-                layer_id=x.layer_id,
-                name=x.name,
-                description=x.description,
-                grant=band.grant,
-                **layer_metadata[x.layer_id],
-            )
-            for x in form.form_data.layers
-            if x.included
-        ]
-    except KeyError:
-        raise ValueError(
-            f"Layers {[x.layer_id for x in form.form_data.layers]} not found in {form.form_data.path}"
-        )
-
-    band.layers += layers
-
-    session.add(band)
+    created, updated = upsert_layers(session=session, band_id=band_id, layers=layers)
+
+    created_ids = set(created)
+
+    record_additions(
+        session=session,
+        map_group_id=map.map_group_id,
+        written=bulk_result(
+            maps=0,
+            bands=int(band_created),
+            layers=len(created),
+            fits_bytes=layers_file_size(
+                x["provider"] for x in layers if x["layer_id"] in created_ids
+            ),
+        ),
+    )
     session.commit()
 
-    return map
+    return upsert_result(
+        band_id=band_id, band_created=band_created, created=created, updated=updated
+    )
@@ -2,16 +2,50 @@
 Tools for looking at existing maps in the database.
 """
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple
+from datetime import datetime
 
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.orm import Session
-from tilemaker.metadata.database import BandORM, MapGroupORM, MapORM
+from tilemaker.metadata.orm import BandORM, LayerORM, MapGroupORM, MapORM
+
+from tileadder.service.summary import (
+    MapGroupSummary,
+    record_band_removal,
+    record_map_removal,
+)
+from tileadder.service.times import MapTime, overlapping, refresh_map_times
 
 map_group = namedtuple("MapGroup", ("name", "id", "grant"))
+map_group_summary = namedtuple(
+    "MapGroupSummary",
+    (
+        "name",
+        "id",
+        "description",
+        "grant",
+        "maps",
+        "bands",
+        "layers",
+        "start_time",
+        "end_time",
+        "last_sync",
+        "total_fits_bytes",
+    ),
+)
 map_item = namedtuple(
-    "MapItem", ("name", "id", "map_id", "map_group_id", "description", "grant")
+    "MapItem",
+    (
+        "name",
+        "id",
+        "map_id",
+        "map_group_id",
+        "description",
+        "grant",
+        "start_time",
+        "end_time",
+    ),
 )
 band_item = namedtuple(
     "BandItem", ("name", "id", "band_id", "map_id", "description", "grant", "layers")
@@ -38,9 +72,36 @@ def read_map_groups(session: Session) -> list[map_group]:
     Read only the names of the map and their IDs
     """
 
-    results = session.execute(select(MapGroupORM)).scalars().all()
+    results = session.execute(
+        select(MapGroupORM.name, MapGroupORM.id, MapGroupORM.grant)
+    )
 
-    return [map_group(name=x.name, id=x.id, grant=x.grant) for x in results]
+    return [map_group._make(x) for x in results]
+
+
+def read_map_group_summaries(session: Session) -> list[map_group_summary]:
+    """
+    Read all map groups along with their precomputed summary statistics,
+    in a single query.
+    """
+
+    results = session.execute(
+        select(
+            MapGroupORM.name,
+            MapGroupORM.id,
+            MapGroupORM.description,
+            MapGroupORM.grant,
+            MapGroupSummary.maps,
+            MapGroupSummary.bands,
+            MapGroupSummary.layers,
+            MapGroupSummary.start_time,
+            MapGroupSummary.end_time,
+            MapGroupSummary.last_sync,
+            MapGroupSummary.total_fits_bytes,
+        ).outerjoin(MapGroupSummary, MapGroupSummary.map_group_id == MapGroupORM.id)
+    ).all()
+
+    return [map_group_summary._make(x) for x in results]
 
 
 def read_map_group(session: Session, map_group_id: int) -> map_group:
@@ -49,37 +110,80 @@ def read_map_group(session: Session, map_group_id: int) -> map_group:
     """
 
     result = session.execute(
-        select(MapGroupORM).where(MapGroupORM.id == map_group_id)
-    ).scalar_one_or_none()
+        select(MapGroupORM.name, MapGroupORM.id, MapGroupORM.grant).where(
+            MapGroupORM.id == map_group_id
+        )
+    ).one_or_none()
 
     if result is None:
         raise ValueError(f"Map group with id={map_group_id} not found")
 
-    return map_group(name=result.name, id=result.id, grant=result.grant)
+    return map_group._make(result)
+
 
+# The columns of each item, selected directly rather than loading entities.
+MAP_ITEM_COLUMNS = (
+    MapORM.name,
+    MapORM.id,
+    MapORM.map_id,
+    MapORM.map_group_id,
+    MapORM.description,
+    MapORM.grant,
+    MapTime.start_time,
+    MapTime.end_time,
+)
+BAND_ITEM_COLUMNS = (
+    BandORM.name,
+    BandORM.id,
+    BandORM.band_id,
+    BandORM.map_id,
+    BandORM.description,
+    BandORM.grant,
+)
+LAYER_ITEM_COLUMNS = (
+    LayerORM.name,
+    LayerORM.id,
+    LayerORM.layer_id,
+    LayerORM.band_id,
+    LayerORM.description,
+    LayerORM.grant,
+    LayerORM.quantity,
+    LayerORM.units,
+    LayerORM.number_of_levels,
+    LayerORM.tile_size,
+)
 
-def read_maps_for_map_group(session: Session, map_group_id: int) -> list[map_item]:
+
+def read_maps_for_map_group(
+    session: Session,
+    map_group_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[map_item]:
     """
-    Read the map item information for a specific map group.
+    Read the map item information for a specific map group. With `start`
+    and/or `end`, only maps whose recorded time span overlaps that range are
+    read, earliest first.
     """
 
-    results = (
-        session.execute(select(MapORM).where(MapORM.map_group_id == map_group_id))
-        .scalars()
-        .all()
-    )
-
-    return [
-        map_item(
-            name=x.name,
-            id=x.id,
-            map_id=x.map_id,
-            map_group_id=x.map_group_id,
-            description=x.description,
-            grant=x.grant,
+    if start is None and end is None:
+        query = (
+            select(*MAP_ITEM_COLUMNS)
+            .outerjoin(MapTime, MapTime.map_id == MapORM.id)
+            .where(MapORM.map_group_id == map_group_id)
         )
-        for x in results
-    ]
+    else:
+        query = (
+            select(*MAP_ITEM_COLUMNS)
+            .join(MapTime, MapTime.map_id == MapORM.id)
+            .where(
+                MapTime.map_group_id == map_group_id,
+                *overlapping(MapTime, start=start, end=end),
+            )
+            .order_by(MapTime.start_time)
+        )
+
+    return [map_item._make(x) for x in session.execute(query)]
 
 
 def read_map(session: Session, map_id: int) -> map_group:
@@ -88,57 +192,38 @@ def read_map(session: Session, map_id: int) -> map_group:
     """
 
     result = session.execute(
-        select(MapORM).where(MapORM.id == map_id)
-    ).scalar_one_or_none()
+        select(*MAP_ITEM_COLUMNS)
+        .outerjoin(MapTime, MapTime.map_id == MapORM.id)
+        .where(MapORM.id == map_id)
+    ).one_or_none()
 
     if result is None:
         raise ValueError(f"Map with id={map_id} not found")
 
-    return map_item(
-        name=result.name,
-        id=result.id,
-        map_id=result.map_id,
-        map_group_id=result.map_group_id,
-        description=result.description,
-        grant=result.grant,
-    )
+    return map_item._make(result)
 
 
 def read_bands_for_map(session: Session, map_id: int) -> list[band_item]:
     """
-    Read the band information for a specific map.
+    Read the band information for a specific map, with the layers of all
+    of its bands read in one further query.
     """
 
-    results = (
-        session.execute(select(BandORM).where(BandORM.map_id == map_id)).scalars().all()
-    )
+    bands = session.execute(
+        select(*BAND_ITEM_COLUMNS).where(BandORM.map_id == map_id)
+    ).all()
 
-    return [
-        band_item(
-            name=x.name,
-            id=x.id,
-            band_id=x.band_id,
-            map_id=x.map_id,
-            description=x.description,
-            grant=x.grant,
-            layers=[
-                layer_item(
-                    name=y.name,
-                    id=y.id,
-                    layer_id=y.layer_id,
-                    band_id=y.band_id,
-                    description=y.description,
-                    grant=y.grant,
-                    quantity=y.quantity,
-                    units=y.units,
-                    number_of_levels=y.number_of_levels,
-                    tile_size=y.tile_size,
-                )
-                for y in x.layers
-            ],
-        )
-        for x in results
-    ]
+    layers = defaultdict(list)
+
+    for x in session.execute(
+        select(*LAYER_ITEM_COLUMNS)
+        .join(BandORM, BandORM.id == LayerORM.band_id)
+        .where(BandORM.map_id == map_id)
+        .order_by(LayerORM.id)
+    ):
+        layers[x.band_id].append(layer_item._make(x))
+
+    return [band_item._make((*x, layers[x.id])) for x in bands]
 
 
 class MapGroupEdit(BaseModel):
@@ -193,6 +278,8 @@ def delete_map_group(session: Session, map_group_id: int):
 
 
 def delete_map(session: Session, map_id: int):
+    record_map_removal(session=session, map_id=map_id)
+
     data = session.execute(
         select(MapORM).where(MapORM.id == map_id)
     ).scalar_one_or_none()
@@ -203,10 +290,16 @@ def delete_map(session: Session, map_id: int):
 
 
 def delete_band(session: Session, band_id: int):
+    record_band_removal(session=session, band_id=band_id)
+
     data = session.execute(
         select(BandORM).where(BandORM.id == band_id)
     ).scalar_one_or_none()
+    map_id = data.map_id
     session.delete(data)
+    session.flush()
+
+    refresh_map_times(session, [map_id])
     session.commit()
 
     return
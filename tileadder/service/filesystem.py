@@ -2,12 +2,28 @@
 Service functions for interactions with the filesystem.
 """
 
+import math
+import os
 import stat
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterable
 
 from pydantic import TypeAdapter
-from tilemaker.metadata.generation import Layer, layers_from_fits
+
+if TYPE_CHECKING:
+    import numpy as np
+    from tilemaker.metadata.generation import Layer
+
+
+@lru_cache(maxsize=1024)
+def _list_directory(search: Path, mtime_ns: int) -> tuple[Path, ...]:
+    """
+    The non-hidden children of a directory. Keyed on the directory's
+    modification time, which changes whenever an entry is added, removed,
+    or renamed, so stale listings are never served.
+    """
+    return tuple(x for x in search.iterdir() if not x.name.startswith("."))
 
 
 def safe_read_directory(top_level: Path, search: Path) -> list[Path]:
@@ -19,7 +35,8 @@ def safe_read_directory(top_level: Path, search: Path) -> list[Path]:
         raise ValueError(f"Requested path {search} not within {top_level}")
 
     return [
-        x.relative_to(top_level) for x in search.iterdir() if not x.name.startswith(".")
+        x.relative_to(top_level)
+        for x in _list_directory(search, search.stat().st_mtime_ns)
     ]
 
 
@@ -58,10 +75,118 @@ def safe_read_directory_specific_file_types(
     return files, directories
 
 
-def safe_evaluate(
-    top_level: Path, file_path: Path, extensions: tuple[str] = ("fits",)
-) -> list[Layer]:
-    if not file_path.absolute().is_relative_to(top_level.absolute()):
+def provider_filenames(provider: dict[str, Any]) -> set[str]:
+    """
+    The filenames referenced by a serialized layer provider, including those
+    of the providers underlying a combination.
+    """
+
+    if "providers" in provider:
+        return set().union(*(provider_filenames(x) for x in provider["providers"]))
+
+    if "filename" in provider:
+        return {str(provider["filename"])}
+
+    return set()
+
+
+def compact_provider(provider: dict[str, Any]) -> dict[str, Any]:
+    """
+    A serialized layer provider with every field that is at its default
+    value (e.g. `hdu: 0`, `index: null`) removed, recursing into the
+    providers underlying a combination. `provider_type` is always kept, so
+    that tilemaker still validates the result to the same provider, and
+    providers of unknown types are returned unchanged.
+    """
+
+    from tilemaker.metadata.fits import (
+        FITSCombinationLayerProvider,
+        FITSLayerProvider,
+    )
+
+    provider_type = provider.get("provider_type", "fits")
+    model = {
+        "fits": FITSLayerProvider,
+        "fits_combination": FITSCombinationLayerProvider,
+    }.get(provider_type)
+
+    if model is None:
+        return provider
+
+    compact = {"provider_type": provider_type}
+
+    for key, value in provider.items():
+        if key == "providers":
+            compact[key] = [compact_provider(x) for x in value]
+        elif key not in model.model_fields or value != model.model_fields[key].default:
+            compact[key] = value
+
+    return compact
+
+
+def total_file_size(filenames: Iterable[str]) -> int:
+    """
+    The total size in bytes of the given files. Files that cannot be
+    stat-ed are ignored.
+    """
+
+    total = 0
+
+    for filename in set(filenames):
+        try:
+            total += os.stat(filename).st_size
+        except OSError:
+            continue
+
+    return total
+
+
+def layers_file_size(providers: Iterable[dict[str, Any]]) -> int:
+    """
+    The total size in bytes of the files referenced by a set of layers,
+    given their serialized providers, counting each file once for every
+    layer that refers to it. Summaries use this rule for both additions and
+    removals, so that the two balance. Files that cannot be stat-ed are
+    ignored.
+    """
+
+    sizes: dict[str, int] = {}
+    total = 0
+
+    for provider in providers:
+        for filename in provider_filenames(provider):
+            if filename not in sizes:
+                sizes[filename] = total_file_size([filename])
+
+            total += sizes[filename]
+
+    return total
+
+
+def safe_file_path(
+    top_level: Path,
+    file_path: Path,
+    extensions: tuple[str] = ("fits",),
+    resolve_links: bool = False,
+) -> Path:
+    """
+    Check that a file may be read: it must have one of the given extensions
+    and lie below the top-level. Data directories commonly hold symbolic
+    links to files stored elsewhere, so containment is checked on the
+    normalised absolute path by default, which removes '..' but leaves links
+    in place; with `resolve_links`, links are resolved too, so nothing
+    outside the top-level can be reached at all.
+    Returns the absolute (unresolved) path, which is the one recorded in
+    layer providers.
+    """
+    if resolve_links:
+        contained = file_path.resolve().is_relative_to(top_level.resolve())
+    else:
+        contained = Path(os.path.normpath(file_path.absolute())).is_relative_to(
+            top_level.absolute()
+        )
+
+    if not contained:
         raise ValueError(f"Requested path {file_path} not within {top_level}")
 
     valid_extension = False
@@ -73,9 +198,32 @@ def safe_evaluate(
     if not valid_extension:
         raise ValueError(f"Extension of {file_path} is not valid")
 
-    layers = layers_from_fits(filename=file_path)
+    return file_path.absolute()
 
-    return layers
+
+def safe_evaluate(
+    top_level: Path, file_path: Path, extensions: tuple[str] = ("fits",)
+) -> list["Layer"]:
+    file_path = safe_file_path(top_level, file_path, extensions)
+    stat_result = file_path.stat()
+
+    return list(
+        _layers_from_fits(file_path, stat_result.st_mtime_ns, stat_result.st_size)
+    )
+
+
+@lru_cache(maxsize=256)
+def _layers_from_fits(file_path: Path, mtime_ns: int, size: int) -> tuple["Layer", ...]:
+    """
+    The layers in a FITS file. Keyed on its modification time and size, so
+    a file that is rewritten in place is read again. This is shared by
+    evaluation, map creation, and the listing prefetch.
+    """
+
+    # Deferred, as this pulls in the whole FITS stack.
+    from tilemaker.metadata.generation import layers_from_fits
+
+    return tuple(layers_from_fits(filename=file_path))
 
 
 def parse_layer_metadata(
@@ -92,7 +240,9 @@ def parse_layer_metadata(
 
     layer_metadata = {
         x.layer_id: {
-            "provider": provider_adapter.dump_python(x.provider, mode="json"),
+            "provider": compact_provider(
+                provider_adapter.dump_python(x.provider, mode="json")
+            ),
             "bounding_left": x.bounding_left,
             "bounding_right": x.bounding_right,
             "bounding_top": x.bounding_top,
@@ -109,3 +259,159 @@ def parse_layer_metadata(
     }
 
     return layer_metadata
+
+
+def sample_image(
+    filename: str | Path,
+    hdu: int = 0,
+    index: int | None = None,
+    max_samples: int = 1_000_000,
+    chunk_rows: int = 256,
+) -> "np.ndarray":
+    """
+    A regularly strided sample of at most roughly `max_samples` pixels from
+    an image HDU. The file is memory-mapped and read a block of rows at a
+    time, so only the sampled pixels are ever held in memory.
+    """
+
+    import numpy as np
+    from astropy.io import fits
+
+    with fits.open(filename, memmap=True, do_not_scale_image_data=True) as handle:
+        image = handle[hdu]
+        data = image.data
+
+        if index is not None:
+            data = data[index]
+
+        if data.ndim > 2:
+            data = data.reshape(-1, data.shape[-1])
+
+        stride = max(1, math.ceil(math.sqrt(data.size / max_samples)))
+
+        sample = np.concatenate(
+            [
+                np.array(
+                    data[start : start + stride * chunk_rows : stride, ::stride],
+                    dtype=np.float64,
+                )
+                for start in range(0, data.shape[0], stride * chunk_rows)
+            ]
+        )
+
+        bscale = image.header.get("BSCALE", 1.0)
+        bzero = image.header.get("BZERO", 0.0)
+
+    if bscale != 1.0 or bzero != 0.0:
+        sample = sample * bscale + bzero
+
+    return sample
+
+
+def preview_image(
+    top_level: Path,
+    file_path: Path,
+    hdu: int = 0,
+    index: int | None = None,
+    size: int = 512,
+) -> bytes:
+    """
+    A PNG preview of an image HDU, at most `size` pixels along its longest
+    side. Built from a strided read of the memory-mapped data (the full
+    array is never loaded) and coloured between its 1st and 99th
+    percentiles. Cached on the file's modification time.
+    """
+    # Previews are served straight to the browser, so links out of the
+    # top-level are not followed.
+    file_path = safe_file_path(top_level, file_path, resolve_links=True)
+
+    return _preview_image(file_path, file_path.stat().st_mtime_ns, hdu, index, size)
+
+
+@lru_cache(maxsize=128)
+def _preview_image(
+    file_path: Path, mtime_ns: int, hdu: int, index: int | None, size: int
+) -> bytes:
+    import io
+
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    sample = sample_image(
+        filename=file_path, hdu=hdu, index=index, max_samples=size * size
+    )
+
+    # The sample is strided evenly in both directions, so may still be
+    # longer than `size` along one side; thin it further in memory.
+    step = max(1, math.ceil(max(sample.shape) / size))
+    sample = sample[::step, ::step]
+
+    usable = sample[np.isfinite(sample) & (sample != 0.0)]
+
+    if usable.size:
+        vmin, vmax = np.percentile(usable, (1.0, 99.0))
+    else:
+        vmin, vmax = -1.0, 1.0
+
+    cmap = plt.get_cmap("viridis").copy()
+    cmap.set_bad("#dddddd", 0.0)
+
+    with io.BytesIO() as output:
+        # Flipped to match the orientation of tilemaker's tiles.
+        plt.imsave(
+            output,
+            np.fliplr(sample),
+            cmap=cmap,
+            vmin=vmin,
+            vmax=vmax,
+            format="png",
+            origin="lower",
+        )
+        return output.getvalue()
+
+
+def layer_range(
+    provider: dict[str, Any],
+    percentiles: tuple[float, float] = (1.0, 99.0),
+    max_samples: int = 1_000_000,
+) -> tuple[float, float] | None:
+    """
+    A robust colour range (vmin, vmax) for a serialized layer provider,
+    taken as percentiles of a downsampled read of its data. Non-finite and
+    exactly-zero (typically unobserved) pixels are ignored. Returns None if
+    there is no usable data.
+    """
+
+    import numpy as np
+
+    if provider.get("provider_type") == "fits_combination":
+        from tilemaker.metadata.fits import FITSCombinationLayerProvider
+
+        combination = FITSCombinationLayerProvider.model_validate(provider)
+        sample = combination.chain(
+            [
+                sample_image(
+                    filename=x.filename,
+                    hdu=x.hdu,
+                    index=x.index,
+                    max_samples=max_samples,
+                )
+                for x in combination.providers
+            ]
+        )
+    else:
+        sample = sample_image(
+            filename=provider["filename"],
+            hdu=provider.get("hdu", 0),
+            index=provider.get("index"),
+            max_samples=max_samples,
+        )
+
+    sample = sample[np.isfinite(sample) & (sample != 0.0)]
+
+    if sample.size == 0:
+        return None
+
+    low, high = np.percentile(sample, percentiles)
+
+    return float(low), float(high)
@@ -3,29 +3,66 @@ Integration with the mapcat library.
 """
 
 import os
-from datetime import datetime, timezone
-from functools import cached_property
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Sequence
+from typing import TYPE_CHECKING, Iterator, Sequence
 
-from mapcat.database import (
-    DepthOneMapTable,
-)
 from pydantic import BaseModel, Field
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     Column,
     DateTime,
+    Float,
     ForeignKey,
     Integer,
     String,
+    UniqueConstraint,
+    delete,
+    func,
+    literal_column,
+    or_,
     select,
     text,
 )
 from sqlalchemy.orm import Session, relationship
-from tilemaker.metadata.generation import filename_to_id
-from tilemaker.metadata.orm import BandORM, Base, LayerORM, MapGroupORM, MapORM
+from structlog import get_logger
+from tilemaker.metadata.orm import Base, MapGroupORM
 
+from tileadder.service.bulk import BulkInsert, bulk_result
+from tileadder.service.connections import mapcat_engines, sqlite_file_signature
 from tileadder.service.filesystem import parse_layer_metadata
+from tileadder.service.summary import record_additions
+from tileadder.service.times import naive_utc
+
+if TYPE_CHECKING:
+    from mapcat.database import DepthOneMapTable
+
+SUPPORTED_MAP_TYPES = (
+    "depth_one_maps",
+    # TODO: Support non-depth-one maps.
+    # "depth_one_coadds",
+    # "atomic_maps",
+    # "atomic_coadds",
+)
+
+
+def mapcat_table(map_type: str):
+    """
+    The mapcat table model for a map type. Mapcat (and the astropy stack it
+    pulls in) is only imported here, so that importing this module stays cheap
+    for the web routes that never touch a catalog.
+    """
+
+    if map_type not in SUPPORTED_MAP_TYPES:
+        raise ValueError(f"Unknown map type: {map_type}")
+
+    from mapcat.database import DepthOneMapTable
+
+    return {"depth_one_maps": DepthOneMapTable}[map_type]
+
 
 MAP_ATTRIBUTES_TO_USE = [
     (0, "map_path", "Map"),
@@ -40,16 +77,46 @@ MAP_ATTRIBUTES_TO_USE = [
 ]
 
 
+def as_utc_datetime(value: datetime | float | None) -> datetime | None:
+    """
+    Mapcat times may be stored as unix timestamps or as datetimes depending on
+    the version of the catalog; normalize them to timezone-aware UTC.
+    """
+
+    if value is None:
+        return None
+
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class MapCatRowError(Exception):
+    """
+    A mapcat row that could not be parsed because of the file at `path`.
+    """
+
+    def __init__(self, path: Path, error: Exception):
+        super().__init__(f"{path}: {error}")
+        self.path = path
+        self.error = error
+
+
 def parse_depth_one_map(
-    depth_one_map: DepthOneMapTable,
+    depth_one_map: "DepthOneMapTable",
     depth_one_parent: str | Path,
     map_group_id: int,
     prefix: str,
     grant: str,
-    existing_maps: dict[str, MapORM],
-) -> MapORM:
+    inserter: BulkInsert,
+) -> str:
     """
-    Parse a DepthOneMapTable object into a MapORM object.
+    Parse a DepthOneMapTable object into new map, band, and layer rows, which
+    are added to the bulk inserter. Returns the map_id of the map that the
+    depth one map was sorted into.
 
     Parameters
     ----------
@@ -61,22 +128,24 @@ def parse_depth_one_map(
         The grant to use for the map.
     depth_one_map : DepthOneMapTable
         The DepthOneMapTable object to parse.
-    existing_maps : dict[str, MapORM]
-        A dictionary of existing maps, keyed by their map_id. This is used to avoid
-        creating duplicate maps as 'maps' are sorted into maps by their central date.
+    inserter : BulkInsert
+        The bulk inserter that new rows are added to. This must know about the
+        existing maps, bands, and layers in the group (see
+        `BulkInsert.for_map_group`) to avoid creating duplicates, as 'maps' are
+        sorted into maps by their central date.
+
+    Raises
+    ------
+    MapCatRowError
+        If any of the row's files could not be read. Nothing is added to the
+        inserter in this case.
     """
 
-    map_central_time = datetime.fromtimestamp(depth_one_map.ctime, tz=timezone.utc)
-    map_start_time = (
-        datetime.fromtimestamp(depth_one_map.start_time, tz=timezone.utc)
-        if depth_one_map.start_time is not None
-        else None
-    )
-    map_end_time = (
-        datetime.fromtimestamp(depth_one_map.stop_time, tz=timezone.utc)
-        if depth_one_map.stop_time is not None
-        else None
-    )
+    from tilemaker.metadata.generation import filename_to_id
+
+    map_central_time = as_utc_datetime(depth_one_map.ctime)
+    map_start_time = as_utc_datetime(depth_one_map.start_time)
+    map_end_time = as_utc_datetime(depth_one_map.stop_time)
 
     map_name = map_central_time.strftime("%Y-%m-%d")
     map_description = (
@@ -85,17 +154,6 @@ def parse_depth_one_map(
 
     map_id = f"{prefix}-{filename_to_id(map_name)}"
 
-    if map_id not in existing_maps:
-        existing_maps[map_id] = MapORM(
-            map_id=map_id,
-            name=map_name,
-            description=map_description,
-            grant=grant,
-            map_group_id=map_group_id,
-        )
-
-    map_orm = existing_maps.get(map_id)
-
     band_name = f"{depth_one_map.tube_slot}"
 
     if map_start_time is not None and map_end_time is not None:
@@ -114,26 +172,11 @@ def parse_depth_one_map(
 
         band_name = f"{band_name} ({time_start} - {time_end})"
 
-    band_orm = None
+    band_id = f"{map_id}-{filename_to_id(band_name)}"
 
-    for band in map_orm.bands:
-        if band.name == band_name:
-            band_orm = band
-            break
-
-    if band_orm is None:
-        band_id = f"{map_orm.map_id}-{filename_to_id(band_name)}"
-
-        band_orm = BandORM(
-            name=band_name,
-            band_id=band_id,
-            description=f"Band for tube slot {depth_one_map.tube_slot} from {map_start_time} to {map_end_time}",
-            grant=grant,
-            map_id=map_orm.map_id,
-        )
-        map_orm.bands.append(band_orm)
-
-    band_existing_layers = set(x.layer_id for x in band_orm.layers)
+    # Read every new file before adding anything, so that a row with one bad
+    # file is skipped as a whole rather than half-added.
+    new_layers = []
 
     for _, attribute_name, attribute_description in MAP_ATTRIBUTES_TO_USE:
         attribute_path = getattr(depth_one_map, attribute_name, None)
@@ -141,29 +184,62 @@ def parse_depth_one_map(
         if attribute_path is None:
             continue
 
-        layer_id = f"{band_orm.band_id}-{filename_to_id(attribute_path)}-{filename_to_id(attribute_description)}"
+        layer_id = f"{band_id}-{filename_to_id(attribute_path)}-{filename_to_id(attribute_description)}"
 
-        if layer_id in band_existing_layers:
+        if inserter.has_layer(layer_id):
             continue
 
-        if attribute_path is not None:
+        try:
             layers = parse_layer_metadata(
                 top_level=Path(depth_one_parent),
                 file_path=Path(attribute_path),
                 extensions=("fits",),
             )
-            for layer in layers.values():
-                layer_orm = LayerORM(
-                    layer_id=layer_id,
-                    name=attribute_description,
-                    description=f"{attribute_description} layer for band {band_orm.name}",
-                    grant=grant,
-                    band_id=band_orm.id,
-                    **layer,
-                )
-                band_orm.layers.append(layer_orm)
+        except Exception as e:
+            raise MapCatRowError(
+                path=Path(depth_one_parent) / attribute_path, error=e
+            ) from e
 
-    return map_orm
+        new_layers.append((layer_id, attribute_description, layers))
+
+    if not inserter.has_map(map_id):
+        inserter.add_map(
+            map_id=map_id,
+            name=map_name,
+            description=map_description,
+            grant=grant,
+            map_group_id=map_group_id,
+        )
+
+    if not inserter.has_band(band_id):
+        inserter.add_band(
+            band_id=band_id,
+            map_id=map_id,
+            name=band_name,
+            description=f"Band for tube slot {depth_one_map.tube_slot} from {map_start_time} to {map_end_time}",
+            grant=grant,
+        )
+        inserter.add_band_times(
+            band_id=band_id,
+            start_time=map_start_time or map_central_time,
+            central_time=map_central_time,
+            end_time=map_end_time or map_central_time,
+        )
+
+    for layer_id, attribute_description, layers in new_layers:
+        # Files holding several images (e.g. T/Q/U) give several layers; the
+        # first keeps the attribute's ID, so existing layers still match.
+        for index, layer in enumerate(layers.values()):
+            inserter.add_layer(
+                layer_id=layer_id if index == 0 else f"{layer_id}-{index}",
+                band_id=band_id,
+                name=attribute_description,
+                description=f"{attribute_description} layer for band {band_name}",
+                grant=grant,
+                **layer,
+            )
+
+    return map_id
 
 
 class MapCatRegistration(Base):
@@ -171,7 +247,9 @@ class MapCatRegistration(Base):
 
     id = Column(Integer, primary_key=True)
 
-    time_added = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    time_added = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
     added_by = Column(String, nullable=False)
     last_updated = Column(
         DateTime,
@@ -187,8 +265,15 @@ class MapCatRegistration(Base):
     mapcat_database_type = Column(String, nullable=False)
     # Path to the root of the data that mapcat represents.
     mapcat_data_root = Column(String, nullable=False)
-    # Datetime at which the mapcat was last changed
+    # Datetime at which the mapcat was last parsed
     mapcat_last_update_time = Column(DateTime, nullable=True)
+    # Fingerprint of the mapcat table when it was last parsed; see
+    # mapcat_fingerprint.
+    mapcat_fingerprint = Column(String, nullable=True)
+    # Current interval between checks, adapted to how often the mapcat
+    # changes, and when the next check is due. Unset until the first check.
+    update_interval_minutes = Column(Float, nullable=True)
+    next_update = Column(DateTime, nullable=True)
 
     # The in SELECT * FROM $map_type WHERE $query
     query = Column(String, nullable=False)
@@ -201,9 +286,7 @@ class MapCatRegistration(Base):
     map_group_id = Column(
         Integer, ForeignKey("map_groups.id", ondelete="CASCADE"), nullable=False
     )
-    map_group = relationship(
-        "MapGroupORM", passive_deletes=True
-    )
+    map_group = relationship("MapGroupORM", passive_deletes=True)
 
     @classmethod
     def create(
@@ -225,6 +308,8 @@ class MapCatRegistration(Base):
         database. Requires a session to the tilemaker database.
         """
 
+        from tilemaker.metadata.generation import filename_to_id
+
         map_group_orm = MapGroupORM(
             map_group_id=f"mapcat-{filename_to_id(map_group_name)}",
             name=map_group_name,
@@ -250,83 +335,805 @@ class MapCatRegistration(Base):
 
         return mapcat_registration
 
-    @cached_property
-    def mapcat_settings(self):
-        from mapcat.helper import Settings
-
-        return Settings(
-            database_name=self.mapcat_path,
-            database_type=self.mapcat_database_type,
-            depth_one_coadd_parent=self.mapcat_data_root,
-            depth_one_parent=self.mapcat_data_root,
-            atomic_coadd_parent=self.mapcat_data_root,
-            atomic_parent=self.mapcat_data_root,
+    def mapcat_session(self) -> Session:
+        """
+        A read-only session to the mapcat database, using the process-wide
+        engine pool so that engines are shared between registrations and runs.
+        """
+
+        return mapcat_engines.session(
+            database_type=self.mapcat_database_type, path=self.mapcat_path
         )
 
+    @property
+    def scan_key(self) -> tuple[str, str, str]:
+        """
+        Registrations sharing a scan key read the same mapcat table, and so
+        can be served by a single scan.
+        """
+        return (self.mapcat_database_type, self.mapcat_path, self.map_type)
+
+    @property
+    def update_interval(self) -> timedelta:
+        """
+        The current interval between checks, starting from the configured
+        cadence.
+        """
+        if self.update_interval_minutes is None:
+            return timedelta(hours=self.update_cadence_hours)
+
+        return timedelta(minutes=self.update_interval_minutes)
+
+    def mapcat_changed(self, fingerprint: str | None) -> bool:
+        """
+        Whether the mapcat may have changed since we last parsed it, given
+        its current fingerprint. A missing fingerprint always counts as a
+        change.
+        """
+
+        if self.mapcat_last_update_time is None or fingerprint is None:
+            return True
+
+        return fingerprint != self.mapcat_fingerprint
+
     def update_mapcat(self, session: Session):
         """
         Update the mapcat by re-parsing it and updating the database
         if necessary. Requires a tilemaker database session.
         """
 
-        self.last_updated = datetime.now(timezone.utc)
+        update_mapcats(registrations=[self], session=session)
+
+        return
+
+    def parse_mapcat(self, session: Session) -> bulk_result:
+        """
+        Parse the mapcat and write any new maps, bands, and layers to the
+        tilemaker database. Requires a session from the tilemaker database.
+        Returns the number of new rows of each type.
+        """
+
+        return parse_mapcat_registrations(registrations=[self], session=session)[
+            self.id
+        ]
+
+
+class MapCatQuarantine(Base):
+    """
+    Mapcat rows that failed to parse for a registration. They are skipped on
+    later runs until the modification time of the failing file changes.
+    """
+
+    __tablename__ = "mapcat_quarantine"
+    __table_args__ = (UniqueConstraint("registration_id", "mapcat_map_id"),)
+
+    id = Column(Integer, primary_key=True)
+
+    registration_id = Column(
+        Integer,
+        ForeignKey("mapcat_registration.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    # Primary key and name of the row in the mapcat table
+    mapcat_map_id = Column(String, nullable=False)
+    map_name = Column(String, nullable=True)
+
+    # The file that could not be read, and its modification time when it
+    # failed (None if it did not exist).
+    path = Column(String, nullable=False)
+    file_mtime_ns = Column(BigInteger, nullable=True)
+    error = Column(String, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=1)
+    first_failed = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    last_failed = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class MapCatSync(Base):
+    """
+    A check of a registration's mapcat, whether or not it needed scanning.
+    Only the most recent checks of each registration are kept; they are used
+    to adapt how often it is checked.
+    """
+
+    __tablename__ = "mapcat_sync"
+
+    id = Column(Integer, primary_key=True)
+
+    registration_id = Column(
+        Integer,
+        ForeignKey("mapcat_registration.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
 
-        if self.mapcat_last_update_time is not None:
-            last_update_time = datetime.fromtimestamp(
-                os.stat(self.mapcat_path).st_mtime
+    started = Column(DateTime, nullable=False)
+    seconds = Column(Float, nullable=False, default=0.0)
+
+    # Whether the catalog was scanned, and whether its fingerprint had changed
+    scanned = Column(Boolean, nullable=False, default=False)
+    fingerprint_changed = Column(Boolean, nullable=False, default=False)
+
+    # New rows written by the scan
+    maps = Column(Integer, nullable=False, default=0)
+    bands = Column(Integer, nullable=False, default=0)
+    layers = Column(Integer, nullable=False, default=0)
+
+    # The interval until the next check chosen after this one
+    interval_minutes = Column(Float, nullable=False)
+
+    @property
+    def changed(self) -> bool:
+        return self.fingerprint_changed or self.maps + self.bands + self.layers > 0
+
+
+cadence_bounds = namedtuple("CadenceBounds", ("minimum", "maximum"))
+
+
+def adapt_interval(
+    history: Sequence[tuple[datetime, bool]],
+    current: timedelta,
+    bounds: cadence_bounds,
+) -> timedelta:
+    """
+    Choose the interval until the next check of a mapcat from its recent
+    checks, given oldest first as (time, whether it had changed).
+
+    When the mapcat changed during the window, it is checked twice per mean
+    time between changes; when it did not, the current interval is doubled.
+    The result is clamped to `bounds`.
+    """
+
+    if len(history) < 2:
+        interval = current
+    else:
+        span = history[-1][0] - history[0][0]
+        changes = sum(changed for _, changed in history[1:])
+        interval = span / changes / 2 if changes else current * 2
+
+    return min(max(interval, bounds.minimum), bounds.maximum)
+
+
+def record_syncs(
+    session: Session,
+    registrations: Sequence[MapCatRegistration],
+    syncs: dict[int, MapCatSync],
+    cadence: cadence_bounds | None,
+    keep: int,
+):
+    """
+    Record a check of each registration, choose when each is next due, and
+    drop all but the `keep` most recent checks of each. With no `cadence`,
+    registrations are checked at their configured cadence. Does not commit.
+    """
+
+    history = defaultdict(list)
+
+    if cadence is not None:
+        for previous in session.execute(
+            select(MapCatSync)
+            .where(MapCatSync.registration_id.in_(list(syncs)))
+            .order_by(MapCatSync.started)
+        ).scalars():
+            history[previous.registration_id].append(
+                (naive_utc(previous.started), previous.changed)
             )
 
-            if last_update_time == self.mapcat_last_update_time:
-                session.add(self)
-                session.commit()
-                return
+    for registration in registrations:
+        sync = syncs[registration.id]
 
-        session.add(self)
-        self.parse_mapcat(session=session)
+        if cadence is None:
+            interval = timedelta(hours=registration.update_cadence_hours)
+        else:
+            recent = history[registration.id][-(keep - 1) :] if keep > 1 else []
+            interval = adapt_interval(
+                history=[*recent, (naive_utc(sync.started), sync.changed)],
+                current=registration.update_interval,
+                bounds=cadence,
+            )
 
-        return
+        sync.interval_minutes = interval.total_seconds() / 60
+        registration.update_interval_minutes = sync.interval_minutes
+        registration.next_update = sync.started + interval
 
-    def parse_mapcat(self, session: Session) -> Sequence[MapORM]:
-        """
-        Parse the mapcat and return a list of MapORM objects. Requires
-        a session from the tilemaker database.
-        """
+        session.add(sync)
 
-        formulated_query = f"SELECT * FROM {self.map_type} WHERE {self.query};"
-        expected_return_type = {
-            "depth_one_maps": DepthOneMapTable,
-            # TODO: Support non-depth-one maps.
-            # "depth_one_coadds": DepthOneCoaddTable,
-            # "atomic_maps": AtomicMapTable,
-            # "atomic_coadds": AtomicCoaddTable,
-        }
-
-        if self.map_type not in expected_return_type:
-            raise ValueError(f"Unknown map type: {self.map_type}")
-
-        with self.mapcat_settings.session() as mapcat_session:
-            print(formulated_query)
-            query = select(expected_return_type[self.map_type]).from_statement(
-                text(formulated_query)
+    session.flush()
+
+    for registration_id in syncs:
+        kept = (
+            select(MapCatSync.id)
+            .where(MapCatSync.registration_id == registration_id)
+            .order_by(MapCatSync.started.desc())
+            .limit(keep)
+        )
+        session.execute(
+            delete(MapCatSync).where(
+                MapCatSync.registration_id == registration_id,
+                MapCatSync.id.not_in(kept.scalar_subquery()),
             )
-            result = mapcat_session.scalars(query)
-
-            existing_maps = {map.map_id: map for map in self.map_group.maps}
-
-            for map in result:
-                parse_depth_one_map(
-                    depth_one_map=map,
-                    depth_one_parent=self.mapcat_settings.depth_one_parent,
-                    map_group_id=self.map_group_id,
-                    prefix=self.map_group.name,
-                    grant=self.map_group.grant,
-                    existing_maps=existing_maps,
+        )
+
+
+def file_mtime_ns(path: str | Path) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def mapcat_fingerprint(database_type: str, path: str, map_type: str) -> str | None:
+    """
+    A cheap fingerprint of a mapcat table that changes whenever rows are
+    added, removed, or updated. Returns None if it cannot be taken.
+
+    On SQLite this is the modification time and size of the file and of its
+    write-ahead log, so any write to the catalog (to any table, or a vacuum)
+    changes it, and only costs a rescan. On Postgres, it is the cumulative
+    insert, update, and delete counters from pg_stat_user_tables, which are
+    only reset with the server's statistics. These can lag commits by
+    several seconds; rows they miss are picked up by a later run, as the
+    fingerprint is taken before scanning.
+    """
+
+    if database_type == "sqlite":
+        signature = sqlite_file_signature(path)
+
+        if signature is None:
+            return None
+
+        return ":".join([database_type, *(str(x) for x in signature)])
+
+    name = mapcat_table(map_type).__table__.name
+    engine = mapcat_engines.engine(database_type=database_type, path=path)
+    statement = text(
+        "SELECT n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables "
+        "WHERE schemaname = current_schema() AND relname = :name"
+    ).bindparams(name=name)
+
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(statement).one_or_none()
+    except Exception as e:
+        get_logger().warning(
+            "mapcat.fingerprint_failed",
+            database_type=database_type,
+            mapcat_path=path,
+            error=str(e),
+        )
+        return None
+
+    if row is None:
+        return None
+
+    return ":".join([database_type, *(str(x) for x in row)])
+
+
+def quarantine_changed(session: Session, registration_ids: Sequence[int]) -> set[int]:
+    """
+    The registrations with a quarantined row whose failing file has changed
+    since it failed, and so should be retried even if the mapcat itself has
+    not changed.
+    """
+
+    entries = session.execute(
+        select(
+            MapCatQuarantine.registration_id,
+            MapCatQuarantine.path,
+            MapCatQuarantine.file_mtime_ns,
+        ).where(MapCatQuarantine.registration_id.in_(registration_ids))
+    )
+
+    return {
+        registration_id
+        for registration_id, path, mtime_ns in entries
+        if file_mtime_ns(path) != mtime_ns
+    }
+
+
+# The mapcat_map_id of a quarantine entry recording that a registration's
+# whole scan failed, rather than one of its rows.
+SCAN_FAILED = "*"
+
+
+def quarantine_registration(
+    session: Session, registration: MapCatRegistration, error: Exception
+) -> MapCatQuarantine:
+    """
+    Record (or re-record) a registration whose scan failed as a whole. It is
+    retried once its catalog changes. Does not commit.
+    """
+
+    entry = session.execute(
+        select(MapCatQuarantine).where(
+            MapCatQuarantine.registration_id == registration.id,
+            MapCatQuarantine.mapcat_map_id == SCAN_FAILED,
+        )
+    ).scalar_one_or_none() or MapCatQuarantine(
+        registration_id=registration.id, mapcat_map_id=SCAN_FAILED, attempts=0
+    )
+
+    entry.map_name = None
+    entry.path = registration.mapcat_path
+    entry.file_mtime_ns = file_mtime_ns(registration.mapcat_path)
+    entry.error = str(error)[:2048]
+    entry.attempts += 1
+    entry.last_failed = datetime.now(timezone.utc)
+
+    session.add(entry)
+
+    return entry
+
+
+def quarantine_row(
+    session: Session,
+    registration: MapCatRegistration,
+    row: "DepthOneMapTable",
+    error: MapCatRowError,
+    existing: MapCatQuarantine | None,
+) -> MapCatQuarantine:
+    """
+    Record (or re-record) a failing row. Does not commit.
+    """
+
+    entry = existing or MapCatQuarantine(
+        registration_id=registration.id,
+        mapcat_map_id=str(row.map_id),
+        attempts=0,
+    )
+
+    entry.map_name = row.map_name
+    entry.path = str(error.path)
+    entry.file_mtime_ns = file_mtime_ns(error.path)
+    entry.error = str(error.error)[:2048]
+    entry.attempts += 1
+    entry.last_failed = datetime.now(timezone.utc)
+
+    session.add(entry)
+
+    return entry
+
+
+def scan_mapcat(
+    mapcat_session: Session, map_type: str, queries: Sequence[str]
+) -> Iterator[tuple["DepthOneMapTable", tuple[bool, ...]]]:
+    """
+    Scan a mapcat table once for the union of the given WHERE clauses. Yields
+    each matching row along with a tuple saying which of the clauses it
+    matched, so that the rows can be fanned out to their registrations.
+    """
+
+    table = mapcat_table(map_type)
+
+    flags = [
+        literal_column(f"CASE WHEN ({query}) THEN 1 ELSE 0 END").label(f"match_{i}")
+        for i, query in enumerate(queries)
+    ]
+
+    statement = select(table, *flags).where(
+        or_(*[text(f"({query})") for query in queries])
+    )
+
+    for row in mapcat_session.execute(statement):
+        yield row[0], tuple(bool(x) for x in row[1:])
+
+
+def parse_mapcat_registrations(
+    registrations: Sequence[MapCatRegistration],
+    session: Session,
+    checkpoint_layers: int = 5000,
+) -> dict[int, bulk_result]:
+    """
+    Parse a set of registrations that all share the same scan key with a
+    single pass over the mapcat, writing new maps, bands, and layers to the
+    tilemaker database. Returns the number of new rows of each type, keyed
+    by registration ID.
+
+    Rows that fail to parse are quarantined and the scan carries on; they are
+    skipped by later runs until the failing file changes. New rows are
+    committed every `checkpoint_layers` layers, so an interrupted run keeps
+    its progress, and re-running is always safe as existing rows are skipped.
+    """
+
+    log = get_logger()
+
+    scan_key = registrations[0].scan_key
+
+    if any(x.scan_key != scan_key for x in registrations):
+        raise ValueError("All registrations must share the same mapcat and map type")
+
+    # Registrations into the same map group must share an inserter so that
+    # they see each other's new rows.
+    inserters = {}
+    time_ranges = {}
+    written = {}
+
+    for registration in registrations:
+        if registration.map_group_id not in inserters:
+            inserters[registration.map_group_id] = BulkInsert.for_map_group(
+                session=session, map_group_id=registration.map_group_id
+            )
+            time_ranges[registration.map_group_id] = (None, None)
+            written[registration.map_group_id] = bulk_result(0, 0, 0, 0)
+
+    quarantined = {
+        (x.registration_id, x.mapcat_map_id): x
+        for x in session.execute(
+            select(MapCatQuarantine).where(
+                MapCatQuarantine.registration_id.in_([x.id for x in registrations])
+            )
+        ).scalars()
+    }
+
+    # Read up front, as checkpoints expire the ORM objects.
+    targets = [
+        (
+            x.id,
+            x.map_group_id,
+            x.mapcat_data_root,
+            x.map_group.name,
+            x.map_group.grant,
+        )
+        for x in registrations
+    ]
+
+    def checkpoint():
+        for map_group_id, inserter in inserters.items():
+            result = inserter.write(session=session)
+            written[map_group_id] = bulk_result(
+                *(a + b for a, b in zip(written[map_group_id], result))
+            )
+            record_additions(
+                session=session,
+                map_group_id=map_group_id,
+                written=result,
+                start_time=time_ranges[map_group_id][0],
+                end_time=time_ranges[map_group_id][1],
+                synced=True,
+            )
+
+        session.commit()
+
+    failed = 0
+    skipped = 0
+
+    with registrations[0].mapcat_session() as mapcat_session:
+        for map, matches in scan_mapcat(
+            mapcat_session=mapcat_session,
+            map_type=registrations[0].map_type,
+            queries=[x.query for x in registrations],
+        ):
+            for registration, target, matched in zip(registrations, targets, matches):
+                if not matched:
+                    continue
+
+                registration_id, map_group_id, data_root, prefix, grant = target
+
+                key = (registration_id, str(map.map_id))
+                entry = quarantined.get(key)
+
+                unchanged = (
+                    entry is not None
+                    and file_mtime_ns(entry.path) == entry.file_mtime_ns
                 )
 
-            session.add(*existing_maps.values())
+                if unchanged:
+                    skipped += 1
+                    continue
+
+                try:
+                    parse_depth_one_map(
+                        depth_one_map=map,
+                        depth_one_parent=data_root,
+                        map_group_id=map_group_id,
+                        prefix=prefix,
+                        grant=grant,
+                        inserter=inserters[map_group_id],
+                    )
+                except MapCatRowError as e:
+                    failed += 1
+                    log.warning(
+                        "mapcat.row_failed",
+                        mapcat_id=registration_id,
+                        mapcat_map_id=key[1],
+                        path=str(e.path),
+                        error=str(e.error),
+                    )
+                    quarantined[key] = quarantine_row(
+                        session=session,
+                        registration=registration,
+                        row=map,
+                        error=e,
+                        existing=entry,
+                    )
+                    continue
+
+                if entry is not None:
+                    session.delete(quarantined.pop(key))
+
+                start, end = time_ranges[map_group_id]
+                map_start = as_utc_datetime(map.start_time or map.ctime)
+                map_end = as_utc_datetime(map.stop_time or map.ctime)
+                time_ranges[map_group_id] = (
+                    map_start if start is None else min(start, map_start),
+                    map_end if end is None else max(end, map_end),
+                )
+
+            if sum(len(x.layers) for x in inserters.values()) >= checkpoint_layers:
+                checkpoint()
+
+    checkpoint()
+
+    if failed or skipped:
+        log.info(
+            "mapcat.quarantine",
+            mapcat_ids=[x[0] for x in targets],
+            failed=failed,
+            skipped=skipped,
+        )
+
+    return {x[0]: written[x[1]] for x in targets}
+
+
+def scan_separately(
+    registrations: Sequence[MapCatRegistration], session: Session
+) -> dict[int, bulk_result]:
+    """
+    Parse each registration with its own scan, quarantining those whose scan
+    fails as a whole (e.g. on a malformed query) rather than on one of its
+    rows. Returns the results of the registrations that succeeded.
+    """
+
+    results = {}
+
+    for registration in registrations:
+        try:
+            results.update(
+                parse_mapcat_registrations(
+                    registrations=[registration], session=session
+                )
+            )
+        except Exception as e:
+            session.rollback()
+            get_logger().error(
+                "mapcat.registration_failed", mapcat_id=registration.id, error=str(e)
+            )
+            quarantine_registration(session=session, registration=registration, error=e)
             session.commit()
 
-        return list(existing_maps.values())
+    return results
+
+
+def update_mapcats(
+    registrations: Sequence[MapCatRegistration],
+    session: Session,
+    cadence: cadence_bounds | None = None,
+    keep_syncs: int = 20,
+) -> dict[int, bulk_result]:
+    """
+    Update a set of registrations, grouping those that share a mapcat and map
+    type so that each distinct catalog table is only scanned once. Returns the
+    number of new rows of each type, keyed by registration ID, for the
+    registrations that were parsed.
+
+    Registrations whose catalog fingerprint has not changed since they were
+    last parsed are skipped, unless one of their quarantined files has
+    changed. Every check is recorded in the registration's sync history,
+    and its next check is scheduled from it; see `record_syncs`.
+    """
+
+    log = get_logger()
+
+    scans = defaultdict(list)
+    fingerprints = {}
+    unchanged = []
+    syncs = {}
+
+    retry = quarantine_changed(
+        session=session, registration_ids=[x.id for x in registrations]
+    )
+
+    for registration in registrations:
+        registration.last_updated = datetime.now(timezone.utc)
+        session.add(registration)
+
+        # Taken once per catalog table, before scanning, so that rows added
+        # during the scan are picked up by the next run.
+        if registration.scan_key not in fingerprints:
+            fingerprints[registration.scan_key] = mapcat_fingerprint(
+                *registration.scan_key
+            )
+
+        fingerprint = fingerprints[registration.scan_key]
+
+        syncs[registration.id] = MapCatSync(
+            registration_id=registration.id,
+            started=datetime.now(timezone.utc),
+            scanned=False,
+            fingerprint_changed=fingerprint is None
+            or fingerprint != registration.mapcat_fingerprint,
+            maps=0,
+            bands=0,
+            layers=0,
+        )
+
+        if registration.mapcat_changed(fingerprint) or registration.id in retry:
+            scans[registration.scan_key].append(registration)
+        else:
+            unchanged.append(registration.id)
+
+    session.commit()
+
+    if unchanged:
+        log.info("mapcat.unchanged", mapcat_ids=unchanged)
+
+    results = {}
+
+    for scan_key, grouped in scans.items():
+        log.info(
+            "mapcat.scan",
+            database_type=scan_key[0],
+            mapcat_path=scan_key[1],
+            map_type=scan_key[2],
+            mapcat_ids=[x.id for x in grouped],
+        )
+        start = time.perf_counter()
+
+        try:
+            results.update(
+                parse_mapcat_registrations(registrations=grouped, session=session)
+            )
+        except Exception as e:
+            session.rollback()
+            log.error(
+                "mapcat.scan_failed",
+                mapcat_path=scan_key[1],
+                mapcat_ids=[x.id for x in grouped],
+                error=str(e),
+            )
+            # A shared scan fails as a whole if any one registration's query
+            # is broken, so find it by scanning each on its own.
+            results.update(scan_separately(registrations=grouped, session=session))
+
+        seconds = time.perf_counter() - start
+
+        for registration in grouped:
+            # Failed registrations are also marked as parsed, so that they
+            # are not retried until their catalog changes.
+            registration.mapcat_fingerprint = fingerprints[scan_key]
+            registration.mapcat_last_update_time = datetime.now(timezone.utc)
+
+            if registration.id not in results:
+                continue
+
+            sync = syncs[registration.id]
+            sync.scanned = True
+            sync.seconds = seconds
+            sync.maps = results[registration.id].maps
+            sync.bands = results[registration.id].bands
+            sync.layers = results[registration.id].layers
+
+        session.execute(
+            delete(MapCatQuarantine).where(
+                MapCatQuarantine.registration_id.in_(
+                    [x.id for x in grouped if x.id in results]
+                ),
+                MapCatQuarantine.mapcat_map_id == SCAN_FAILED,
+            )
+        )
+        session.commit()
+
+    record_syncs(
+        session=session,
+        registrations=registrations,
+        syncs=syncs,
+        cadence=cadence,
+        keep=keep_syncs,
+    )
+    session.commit()
+
+    return results
+
+
+mapcat_registration_summary = namedtuple(
+    "MapCatRegistrationSummary",
+    (
+        "id",
+        "map_group_name",
+        "mapcat_path",
+        "map_type",
+        "query",
+        "last_updated",
+        "quarantined",
+        "mapcat_last_update_time",
+        "update_cadence_hours",
+        "update_interval_minutes",
+        "next_update",
+    ),
+)
+mapcat_sync_item = namedtuple(
+    "MapCatSyncItem",
+    (
+        "registration_id",
+        "started",
+        "seconds",
+        "scanned",
+        "fingerprint_changed",
+        "maps",
+        "bands",
+        "layers",
+        "interval_minutes",
+    ),
+)
+
+
+def read_mapcat_registrations(session: Session) -> list[mapcat_registration_summary]:
+    """
+    Read all registrations along with the number of their quarantined rows.
+    """
+
+    quarantined = (
+        select(
+            MapCatQuarantine.registration_id,
+            func.count(MapCatQuarantine.id).label("quarantined"),
+        )
+        .group_by(MapCatQuarantine.registration_id)
+        .subquery()
+    )
+
+    results = session.execute(
+        select(
+            MapCatRegistration.id,
+            MapGroupORM.name,
+            MapCatRegistration.mapcat_path,
+            MapCatRegistration.map_type,
+            MapCatRegistration.query,
+            MapCatRegistration.last_updated,
+            func.coalesce(quarantined.c.quarantined, 0),
+            MapCatRegistration.mapcat_last_update_time,
+            MapCatRegistration.update_cadence_hours,
+            MapCatRegistration.update_interval_minutes,
+            MapCatRegistration.next_update,
+        )
+        .join(MapGroupORM, MapCatRegistration.map_group_id == MapGroupORM.id)
+        .outerjoin(quarantined, quarantined.c.registration_id == MapCatRegistration.id)
+        .order_by(MapCatRegistration.id)
+    )
+
+    return [mapcat_registration_summary._make(x) for x in results]
+
+
+def read_mapcat_syncs(session: Session) -> dict[int, list[mapcat_sync_item]]:
+    """
+    Read the recorded sync history of every registration, most recent first.
+    """
+
+    results = session.execute(
+        select(
+            MapCatSync.registration_id,
+            MapCatSync.started,
+            MapCatSync.seconds,
+            MapCatSync.scanned,
+            MapCatSync.fingerprint_changed,
+            MapCatSync.maps,
+            MapCatSync.bands,
+            MapCatSync.layers,
+            MapCatSync.interval_minutes,
+        ).order_by(MapCatSync.registration_id, MapCatSync.started.desc())
+    )
+
+    syncs = defaultdict(list)
+
+    for x in results:
+        syncs[x.registration_id].append(mapcat_sync_item._make(x))
+
+    return syncs
 
 
 class MapCatRegistrationFormData(BaseModel):
@@ -336,9 +1143,7 @@ class MapCatRegistrationFormData(BaseModel):
     )
     grant: str | None = Field(None, description="Required grant for the map group")
     mapcat_path: str = Field(..., description="Path to the mapcat database")
-    mapcat_database_type: str = Field(
-        "sqlite", description="Type of mapcat database"
-    )
+    mapcat_database_type: str = Field("sqlite", description="Type of mapcat database")
     mapcat_data_root: str = Field(
         ..., description="Path to the root of the data represented by the mapcat"
     )
@@ -0,0 +1,361 @@
+"""
+Versioned schema migrations for the tileadder database.
+
+`create_all` builds any missing tables, but it never changes tables that
+already exist. Migrations cover everything else: indexes on the tilemaker
+tables, and later changes to our own tables. Each migration runs once, in
+order, and its version is recorded in the `tileadder_schema_version` table.
+Migrations must be safe to run against a freshly created database, where
+`create_all` may already have done some of their work.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Index,
+    Integer,
+    String,
+    Text,
+    bindparam,
+    cast,
+    delete,
+    func,
+    inspect,
+    select,
+    text,
+    update,
+)
+from structlog import get_logger
+from tilemaker.metadata.orm import BandORM, Base, LayerORM, MapORM
+
+from tileadder.service.filesystem import compact_provider
+from tileadder.service.mapcat import MapCatRegistration
+from tileadder.service.pregenerate import TilePregeneration  # noqa: F401
+from tileadder.service.ranges import LayerRangeFailure  # noqa: F401
+from tileadder.service.summary import MapGroupSummary
+from tileadder.service.times import BandTime, backfill_band_times, refresh_map_times
+from tileadder.service.upsert import UPSERT_INDEXES
+
+migration = namedtuple("Migration", ("version", "description", "apply"))
+
+
+class SchemaVersion(Base):
+    __tablename__ = "tileadder_schema_version"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+# Indexes for the lookups made by the read and write paths: maps by group,
+# bands by map and by name, layers by band, and registrations by group.
+LOOKUP_INDEXES = (
+    Index("ix_maps_map_group_id", MapORM.map_group_id),
+    Index("ix_bands_map_id", BandORM.map_id),
+    Index("ix_bands_name", BandORM.name),
+    Index("ix_layers_band_id", LayerORM.band_id),
+    Index("ix_mapcat_registration_map_group_id", MapCatRegistration.map_group_id),
+)
+
+
+def create_indexes(*indexes: Index) -> Callable:
+    """
+    A migration that creates the given indexes if they do not already exist.
+    """
+
+    def apply(connection: Connection):
+        for index in indexes:
+            index.create(bind=connection, checkfirst=True)
+
+    return apply
+
+
+def merge_duplicates(connection: Connection):
+    """
+    Merge the duplicate bands (by name within a map) and layers (by ID within
+    a band) left by earlier versions, so that the upsert indexes can be
+    built. Duplicate bands are folded into the oldest, taking their layers
+    with them; of duplicate layers, the most recently added is kept. The
+    times of the affected maps are refreshed, and the summaries of their
+    groups are dropped so that they are recomputed in the background.
+    """
+
+    bands = BandORM.__table__
+    layers = LayerORM.__table__
+    maps = MapORM.__table__
+    affected = set()
+
+    duplicate_bands = connection.execute(
+        select(bands.c.map_id, bands.c.name, func.min(bands.c.id))
+        .where(bands.c.name.is_not(None))
+        .group_by(bands.c.map_id, bands.c.name)
+        .having(func.count() > 1)
+    ).all()
+
+    for map_id, name, kept in duplicate_bands:
+        affected.add(map_id)
+        merged = select(bands.c.id).where(
+            bands.c.map_id == map_id, bands.c.name == name, bands.c.id != kept
+        )
+        connection.execute(
+            delete(BandTime).where(BandTime.band_id.in_(merged.scalar_subquery()))
+        )
+        connection.execute(
+            update(layers)
+            .where(layers.c.band_id.in_(merged.scalar_subquery()))
+            .values(band_id=kept)
+        )
+        connection.execute(
+            delete(bands).where(bands.c.id.in_(merged.scalar_subquery()))
+        )
+
+    duplicate_layers = connection.execute(
+        select(layers.c.band_id, layers.c.layer_id, func.max(layers.c.id))
+        .where(layers.c.layer_id.is_not(None))
+        .group_by(layers.c.band_id, layers.c.layer_id)
+        .having(func.count() > 1)
+    ).all()
+
+    removed = 0
+
+    for band_id, layer_id, kept in duplicate_layers:
+        affected.add(
+            connection.execute(
+                select(bands.c.map_id).where(bands.c.id == band_id)
+            ).scalar_one()
+        )
+        removed += connection.execute(
+            delete(layers).where(
+                layers.c.band_id == band_id,
+                layers.c.layer_id == layer_id,
+                layers.c.id != kept,
+            )
+        ).rowcount
+
+    if affected:
+        refresh_map_times(connection, affected)
+        connection.execute(
+            delete(MapGroupSummary).where(
+                MapGroupSummary.map_group_id.in_(
+                    select(maps.c.map_group_id)
+                    .where(maps.c.id.in_(affected))
+                    .scalar_subquery()
+                )
+            )
+        )
+
+    get_logger().info(
+        "migrations.duplicates_merged",
+        bands=len(duplicate_bands),
+        layers=removed,
+    )
+
+
+def upsert_indexes(connection: Connection):
+    """
+    Build the unique indexes used by the upserts, merging any duplicates
+    that would stop them from being built first. Failures are not caught, so
+    the migration is never recorded without its indexes.
+    """
+
+    merge_duplicates(connection)
+    create_indexes(*UPSERT_INDEXES)(connection)
+
+
+def add_columns(*columns: Column) -> Callable:
+    """
+    A migration that adds the given nullable columns to their existing
+    tables, skipping any that `create_all` has already created.
+    """
+
+    def apply(connection: Connection):
+        preparer = connection.dialect.identifier_preparer
+
+        for column in columns:
+            existing = {
+                x["name"] for x in inspect(connection).get_columns(column.table.name)
+            }
+
+            if column.name in existing:
+                continue
+
+            connection.execute(
+                text(
+                    f"ALTER TABLE {preparer.format_table(column.table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=connection.dialect)}"
+                )
+            )
+
+    return apply
+
+
+def provider_storage(connection: Connection) -> tuple[int, int]:
+    """
+    The number of layers, and the total size in bytes of their serialized
+    providers, as stored.
+    """
+
+    return connection.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(func.length(cast(LayerORM.provider, Text))), 0),
+        )
+    ).one()
+
+
+def compact_providers(connection: Connection, batch_size: int = 5000):
+    """
+    Rewrite stored layer providers in their compact form, a batch of layers
+    at a time, and report the storage they take before and after.
+    """
+
+    table = LayerORM.__table__
+    layers, before = provider_storage(connection)
+    rewritten = 0
+    last = 0
+
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.provider)
+            .where(table.c.id > last)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        last = rows[-1].id
+        updates = [
+            {"_id": id, "provider": compact}
+            for id, provider in rows
+            if (compact := compact_provider(provider)) != provider
+        ]
+
+        if updates:
+            connection.execute(
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values(provider=bindparam("provider")),
+                updates,
+            )
+
+        rewritten += len(updates)
+
+    _, after = provider_storage(connection)
+
+    get_logger().info(
+        "migrations.providers_compacted",
+        layers=layers,
+        rewritten=rewritten,
+        bytes_before=before,
+        bytes_after=after,
+    )
+
+
+MIGRATIONS = (
+    migration(
+        version=1,
+        description="Unique indexes for band and layer upserts",
+        apply=upsert_indexes,
+    ),
+    migration(
+        version=2,
+        description="Indexes for map, band, layer, and registration lookups",
+        apply=create_indexes(*LOOKUP_INDEXES),
+    ),
+    migration(
+        version=3,
+        description="Compact stored layer providers",
+        apply=compact_providers,
+    ),
+    migration(
+        version=4,
+        description="Backfill band and map times from band descriptions",
+        apply=backfill_band_times,
+    ),
+    migration(
+        version=5,
+        description="Mapcat registration fingerprints",
+        apply=add_columns(MapCatRegistration.__table__.c.mapcat_fingerprint),
+    ),
+    migration(
+        version=6,
+        description="Adaptive mapcat check intervals",
+        apply=add_columns(
+            MapCatRegistration.__table__.c.update_interval_minutes,
+            MapCatRegistration.__table__.c.next_update,
+        ),
+    ),
+)
+
+
+def current_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+
+    return connection.execute(
+        select(func.coalesce(func.max(SchemaVersion.version), 0))
+    ).scalar_one()
+
+
+def check_version(engine: Engine) -> int:
+    """
+    The schema version of the database, raising a RuntimeError if any
+    migrations are outstanding. Server workers call this rather than
+    `migrate`, which is left to the process that starts them.
+    """
+
+    with engine.connect() as connection:
+        version = current_version(connection)
+
+    if version < MIGRATIONS[-1].version:
+        raise RuntimeError(
+            f"Database schema is at version {version}, but version "
+            f"{MIGRATIONS[-1].version} is required; run `tileadder migrate`"
+        )
+
+    return version
+
+
+def migrate(engine: Engine) -> int:
+    """
+    Create any missing tables and apply outstanding migrations, each in its
+    own transaction. Returns the schema version of the database afterwards.
+    """
+
+    log = get_logger()
+
+    Base.metadata.create_all(engine)
+
+    with engine.connect() as connection:
+        version = current_version(connection)
+
+    for step in MIGRATIONS:
+        if step.version <= version:
+            continue
+
+        log.info("migrations.apply", version=step.version, description=step.description)
+
+        with engine.begin() as connection:
+            step.apply(connection)
+            connection.execute(
+                SchemaVersion.__table__.insert().values(
+                    version=step.version,
+                    description=step.description,
+                    applied_at=datetime.now(timezone.utc),
+                )
+            )
+
+        version = step.version
+
+    return version
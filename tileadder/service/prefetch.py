@@ -0,0 +1,76 @@
+"""
+Speculative reading of FITS metadata for the files in a directory that has
+just been listed, as the next thing a user does is almost always to
+evaluate some of them. Reads go through the same cache as `safe_evaluate`,
+so a later evaluation of a prefetched file does not touch the disk.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from structlog import get_logger
+
+from tileadder.service.filesystem import safe_evaluate
+
+
+class MetadataPrefetcher:
+    """
+    A small, dedicated pool that reads ahead on behalf of listings. At most
+    `max_files` files are read per listing, and each owner (user) has only
+    one listing being prefetched at a time: listing another directory
+    cancels whatever is still queued for the previous one. When more than
+    `max_pending` reads are outstanding across all owners, new listings
+    are not prefetched at all, so that read-ahead never competes with real
+    requests for long.
+    """
+
+    def __init__(self, workers: int = 1, max_files: int = 16, max_pending: int = 64):
+        self.max_files = max_files
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="prefetch"
+        )
+        self._pending: dict[str, list[Future]] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, top_level: Path, path: Path):
+        try:
+            safe_evaluate(top_level=top_level, file_path=top_level / path)
+        except (OSError, ValueError) as e:
+            # The user will see the error if they evaluate the file.
+            get_logger().debug("prefetch.failed", path=path, error=str(e))
+
+    def prefetch(self, owner: str, top_level: Path, paths: list[Path]) -> int:
+        """
+        Queue reads of (up to `max_files` of) `paths` for `owner`, replacing
+        any reads still queued for them. Returns the number queued.
+        """
+
+        with self._lock:
+            for future in self._pending.pop(owner, []):
+                future.cancel()
+
+            self._pending = {
+                k: [x for x in v if not x.done()] for k, v in self._pending.items()
+            }
+
+            outstanding = sum(len(x) for x in self._pending.values())
+            count = min(self.max_files, self.max_pending - outstanding, len(paths))
+
+            if count <= 0:
+                get_logger().debug(
+                    "prefetch.busy", owner=owner, outstanding=outstanding
+                )
+                return 0
+
+            self._pending[owner] = [
+                self._executor.submit(self._read, top_level, path)
+                for path in paths[:count]
+            ]
+
+        return count
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,314 @@
+"""
+Pre-rendering the top levels of the tile pyramid for newly added layers, so
+that the first people to open a fresh map are not left waiting on tilemaker
+to cut every tile from the FITS files on demand.
+
+Tiles are written as images below a cache directory using the same layout
+as tilemaker's tile URLs (`{layer_id}/{level}/{y}/{x}/tile.{ext}`), so the
+directory can be served directly in front of tilemaker.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    func,
+    or_,
+    select,
+)
+from sqlalchemy.orm import Session
+from structlog import get_logger
+from tilemaker.metadata.orm import BandORM, Base, LayerORM
+
+
+class TilePregeneration(Base):
+    """
+    Layers whose top levels have been pre-rendered, or which failed to be.
+    Layers without a row here are still waiting in the queue.
+    """
+
+    __tablename__ = "tile_pregeneration"
+
+    layer_id = Column(
+        Integer, ForeignKey("layers.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    # Number of levels rendered, and of tiles written; tiles that do not
+    # overlap the map at all are skipped.
+    levels = Column(Integer, nullable=False)
+    tiles = Column(Integer, nullable=False, default=0)
+    seconds = Column(Float, nullable=False, default=0.0)
+    error = Column(String, nullable=True)
+
+    completed = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+pending_layer = namedtuple(
+    "PendingLayer",
+    (
+        "id",
+        "layer_id",
+        "name",
+        "grant",
+        "provider",
+        "number_of_levels",
+        "tile_size",
+        "vmin",
+        "vmax",
+        "cmap",
+        "bounding_left",
+        "bounding_right",
+        "bounding_top",
+        "bounding_bottom",
+    ),
+)
+
+pregeneration_result = namedtuple(
+    "PregenerationResult", ("id", "levels", "tiles", "seconds", "error")
+)
+
+
+def _pending(worker_index: int, worker_count: int):
+    # Layers still on "auto" are left until their ranges have been filled
+    # in, as tiles rendered without them would not match what is viewed.
+    return (
+        select(LayerORM.id)
+        .outerjoin(TilePregeneration, TilePregeneration.layer_id == LayerORM.id)
+        .where(
+            TilePregeneration.layer_id.is_(None),
+            # Unset (NULL) ranges are rendered with the renderer's defaults.
+            or_(LayerORM.vmin.is_(None), LayerORM.vmin != "auto"),
+            or_(LayerORM.vmax.is_(None), LayerORM.vmax != "auto"),
+            LayerORM.id % worker_count == worker_index,
+        )
+    )
+
+
+def layers_to_pregenerate(
+    session: Session, limit: int, worker_index: int = 0, worker_count: int = 1
+) -> list[pending_layer]:
+    """
+    Read up to `limit` layers that have not yet been pre-rendered, those in
+    the most recently added maps first. Layers are sharded between
+    background workers by database ID.
+    """
+
+    query = (
+        select(
+            LayerORM.id,
+            LayerORM.layer_id,
+            LayerORM.name,
+            LayerORM.grant,
+            LayerORM.provider,
+            LayerORM.number_of_levels,
+            LayerORM.tile_size,
+            LayerORM.vmin,
+            LayerORM.vmax,
+            LayerORM.cmap,
+            LayerORM.bounding_left,
+            LayerORM.bounding_right,
+            LayerORM.bounding_top,
+            LayerORM.bounding_bottom,
+        )
+        .join(BandORM, BandORM.id == LayerORM.band_id)
+        .where(LayerORM.id.in_(_pending(worker_index, worker_count)))
+        .order_by(BandORM.map_id.desc(), LayerORM.id)
+        .limit(limit)
+    )
+
+    return [pending_layer._make(x) for x in session.execute(query)]
+
+
+def count_layers_to_pregenerate(
+    session: Session, worker_index: int = 0, worker_count: int = 1
+) -> int:
+    return session.execute(
+        select(func.count()).select_from(
+            _pending(worker_index, worker_count).subquery()
+        )
+    ).scalar_one()
+
+
+def tile_path(directory: Path, layer_id: str, level: int, y: int, x: int, ext: str):
+    return directory / layer_id / str(level) / str(y) / str(x) / f"tile.{ext}"
+
+
+def _write_atomically(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+def pregenerate_layers(
+    layers: list[pending_layer],
+    directory: Path,
+    levels: int = 3,
+    workers: int = 4,
+    ext: str = "webp",
+) -> list[pregeneration_result]:
+    """
+    Render the top `levels` zoom levels of each layer into `directory`,
+    cutting at most `workers` tiles at a time across all of the layers.
+    Layers are rendered with their own colour map and range.
+    """
+
+    from tilemaker.metadata.definitions import Layer
+    from tilemaker.processing.renderer import Renderer, RenderOptions
+    from tilemaker.providers.core import PullableTile
+    from tilemaker.providers.fits import FITSTileProvider
+
+    log = get_logger()
+    renderer = Renderer(format=ext)
+
+    # A provider over just this batch, rather than every configured layer.
+    provider = FITSTileProvider(map_groups=[])
+    options: dict[int, RenderOptions] = {}
+    errors: dict[int, str] = {}
+    depth: dict[int, int] = {}
+
+    for layer in layers:
+        try:
+            provider.layers[layer.layer_id] = Layer(
+                layer_id=layer.layer_id,
+                name=layer.name,
+                grant=layer.grant,
+                provider=layer.provider,
+                number_of_levels=layer.number_of_levels,
+                tile_size=layer.tile_size,
+                bounding_left=layer.bounding_left,
+                bounding_right=layer.bounding_right,
+                bounding_top=layer.bounding_top,
+                bounding_bottom=layer.bounding_bottom,
+            )
+            options[layer.id] = RenderOptions(
+                **{
+                    k: v
+                    for k, v in (
+                        ("cmap", layer.cmap),
+                        ("vmin", layer.vmin),
+                        ("vmax", layer.vmax),
+                    )
+                    if v is not None
+                }
+            )
+            depth[layer.id] = min(
+                levels, provider.layers[layer.layer_id].number_of_levels
+            )
+        except Exception as e:
+            errors[layer.id] = str(e)
+
+    def render(work: tuple[pending_layer, int, int, int]) -> bool:
+        layer, level, y, x = work
+
+        tile = provider.pull(
+            PullableTile(layer_id=layer.layer_id, x=x, y=y, level=level, grants=set())
+        )
+
+        if tile.data is None:
+            return False
+
+        with io.BytesIO() as output:
+            renderer.render(output, tile.data, render_options=options[layer.id])
+            _write_atomically(
+                tile_path(directory, layer.layer_id, level, y, x, ext),
+                output.getvalue(),
+            )
+
+        return True
+
+    # The pyramid has 2^(level + 1) by 2^level tiles at each level.
+    work = [
+        (layer, level, y, x)
+        for layer in layers
+        if layer.id not in errors
+        for level in range(depth[layer.id])
+        for y in range(2**level)
+        for x in range(2 ** (level + 1))
+    ]
+
+    written = dict.fromkeys((x.id for x in layers), 0)
+    start: dict[int, float] = {}
+    finished: dict[int, float] = {}
+    lock = threading.Lock()
+
+    def run(item: tuple[pending_layer, int, int, int]):
+        layer = item[0]
+
+        with lock:
+            start.setdefault(layer.id, time.perf_counter())
+
+        try:
+            rendered = render(item)
+        except Exception as e:
+            rendered = False
+
+            with lock:
+                errors.setdefault(layer.id, str(e))
+
+        with lock:
+            written[layer.id] += rendered
+            finished[layer.id] = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Tiles are handed out in order, so layers finish in priority order.
+        for _ in executor.map(run, work):
+            pass
+
+    results = []
+
+    for layer in layers:
+        result = pregeneration_result(
+            id=layer.id,
+            levels=depth.get(layer.id, 0),
+            tiles=written[layer.id],
+            seconds=finished.get(layer.id, 0.0) - start.get(layer.id, 0.0),
+            error=errors.get(layer.id),
+        )
+
+        if result.error is None:
+            log.debug("pregenerate.layer", layer_id=layer.layer_id, **result._asdict())
+        else:
+            log.warning(
+                "pregenerate.failed", layer_id=layer.layer_id, error=result.error
+            )
+
+        results.append(result)
+
+    return results
+
+
+def store_pregeneration(session: Session, results: list[pregeneration_result]):
+    """
+    Record layers as pre-rendered (or failed), removing them from the queue.
+    """
+
+    completed = datetime.now(timezone.utc)
+
+    session.add_all(
+        TilePregeneration(
+            layer_id=x.id,
+            levels=x.levels,
+            tiles=x.tiles,
+            seconds=x.seconds,
+            error=x.error,
+            completed=completed,
+        )
+        for x in results
+    )
+
+    session.commit()
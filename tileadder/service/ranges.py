@@ -0,0 +1,157 @@
+"""
+Filling in colour ranges (vmin/vmax) for layers that were added with them
+left on "auto", so that tilemaker does not need to work them out at view
+time.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    bindparam,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session
+from structlog import get_logger
+from tilemaker.metadata.orm import Base, LayerORM
+
+from tileadder.service.filesystem import layer_range
+
+
+class LayerRangeFailure(Base):
+    """
+    Layers whose colour ranges could not be computed. They stay on "auto"
+    and are not retried; delete the row to try again.
+    """
+
+    __tablename__ = "layer_range_failures"
+
+    layer_id = Column(
+        Integer, ForeignKey("layers.id", ondelete="CASCADE"), primary_key=True
+    )
+    error = Column(String, nullable=True)
+    failed = Column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+pending_layer = namedtuple(
+    "PendingLayer", ("id", "layer_id", "provider", "vmin", "vmax")
+)
+
+range_result = namedtuple("RangeResult", ("id", "range", "error"))
+
+
+def layers_missing_ranges(
+    session: Session, limit: int, worker_index: int = 0, worker_count: int = 1
+) -> list[pending_layer]:
+    """
+    Read up to `limit` layers whose vmin or vmax is "auto", skipping those
+    that have already failed. Layers are sharded between background workers
+    by database ID.
+    """
+
+    query = (
+        select(
+            LayerORM.id,
+            LayerORM.layer_id,
+            LayerORM.provider,
+            LayerORM.vmin,
+            LayerORM.vmax,
+        )
+        .outerjoin(LayerRangeFailure, LayerRangeFailure.layer_id == LayerORM.id)
+        .where(
+            or_(LayerORM.vmin == "auto", LayerORM.vmax == "auto"),
+            LayerRangeFailure.layer_id.is_(None),
+            LayerORM.id % worker_count == worker_index,
+        )
+        .order_by(LayerORM.id)
+        .limit(limit)
+    )
+
+    return [pending_layer._make(x) for x in session.execute(query)]
+
+
+def compute_layer_ranges(
+    layers: list[pending_layer],
+    workers: int = 4,
+    percentiles: tuple[float, float] = (1.0, 99.0),
+    max_samples: int = 1_000_000,
+) -> list[range_result]:
+    """
+    Compute colour ranges for a set of layers in parallel. Each result has
+    either the range of the layer or the error that stopped it from being
+    computed.
+    """
+
+    log = get_logger()
+
+    def compute(layer: pending_layer) -> range_result:
+        try:
+            bounds = layer_range(
+                provider=layer.provider,
+                percentiles=percentiles,
+                max_samples=max_samples,
+            )
+        except Exception as e:
+            log.warning("ranges.failed", layer_id=layer.layer_id, error=str(e))
+            return range_result(id=layer.id, range=None, error=str(e))
+
+        if bounds is None:
+            return range_result(id=layer.id, range=None, error="No usable data")
+
+        return range_result(id=layer.id, range=bounds, error=None)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compute, layers))
+
+
+def store_layer_ranges(
+    session: Session, layers: list[pending_layer], results: list[range_result]
+) -> int:
+    """
+    Write computed ranges back, replacing only the bounds that are still
+    "auto", and record the layers that failed so that they are not read
+    again. Returns the number of layers updated.
+    """
+
+    ranges = {x.id: x.range for x in results if x.error is None}
+
+    rows: list[dict[str, Any]] = [
+        {
+            "_id": x.id,
+            "vmin": str(ranges[x.id][0]) if x.vmin == "auto" else x.vmin,
+            "vmax": str(ranges[x.id][1]) if x.vmax == "auto" else x.vmax,
+        }
+        for x in layers
+        if x.id in ranges
+    ]
+
+    if rows:
+        session.execute(
+            update(LayerORM.__table__)
+            .where(LayerORM.__table__.c.id == bindparam("_id"))
+            .values(vmin=bindparam("vmin"), vmax=bindparam("vmax")),
+            rows,
+        )
+
+    failed = datetime.now(timezone.utc)
+
+    session.add_all(
+        LayerRangeFailure(layer_id=x.id, error=x.error, failed=failed)
+        for x in results
+        if x.error is not None
+    )
+
+    session.commit()
+
+    return len(rows)
@@ -0,0 +1,271 @@
+"""
+Per-map-group summary statistics, maintained incrementally by the write
+paths so that they never need to be computed on the fly.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    case,
+    func,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session
+from tilemaker.metadata.orm import BandORM, Base, LayerORM, MapGroupORM, MapORM
+
+from tileadder.service.bulk import bulk_result
+from tileadder.service.filesystem import layers_file_size
+from tileadder.service.times import naive_utc
+from tileadder.service.upsert import dialect_insert
+
+
+class MapGroupSummary(Base):
+    __tablename__ = "map_group_summary"
+
+    map_group_id = Column(
+        Integer, ForeignKey("map_groups.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    maps = Column(Integer, nullable=False, default=0)
+    bands = Column(Integer, nullable=False, default=0)
+    layers = Column(Integer, nullable=False, default=0)
+
+    # Time range covered by the maps in the group, where known.
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+
+    # Last time a mapcat sync wrote to this group.
+    last_sync = Column(DateTime, nullable=True)
+
+    # Total size of the FITS files referenced by the group's layers, counted
+    # once per layer that refers to them (see `layers_file_size`).
+    total_fits_bytes = Column(BigInteger, nullable=False, default=0)
+
+
+def _get_or_create(session: Session, map_group_id: int) -> MapGroupSummary:
+    summary = session.get(MapGroupSummary, map_group_id)
+
+    if summary is None:
+        summary = MapGroupSummary(
+            map_group_id=map_group_id, maps=0, bands=0, layers=0, total_fits_bytes=0
+        )
+        session.add(summary)
+
+    return summary
+
+
+def record_additions(
+    session: Session,
+    map_group_id: int,
+    written: bulk_result,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    synced: bool = False,
+):
+    """
+    Add newly written rows to a map group's summary. Does not commit; call
+    this within the same transaction as the write itself.
+    """
+
+    # Counters are updated in SQL, rather than read and written back, so
+    # that concurrent writers to the same group do not lose each other's.
+    insert = dialect_insert(session)
+    session.execute(
+        insert(MapGroupSummary)
+        .values(
+            map_group_id=map_group_id, maps=0, bands=0, layers=0, total_fits_bytes=0
+        )
+        .on_conflict_do_nothing(index_elements=[MapGroupSummary.map_group_id])
+    )
+
+    values = {
+        "maps": MapGroupSummary.maps + written.maps,
+        "bands": MapGroupSummary.bands + written.bands,
+        "layers": MapGroupSummary.layers + written.layers,
+        "total_fits_bytes": MapGroupSummary.total_fits_bytes + written.fits_bytes,
+    }
+
+    if start_time is not None:
+        start_time = naive_utc(start_time)
+        values["start_time"] = case(
+            (
+                or_(
+                    MapGroupSummary.start_time.is_(None),
+                    MapGroupSummary.start_time > start_time,
+                ),
+                start_time,
+            ),
+            else_=MapGroupSummary.start_time,
+        )
+
+    if end_time is not None:
+        end_time = naive_utc(end_time)
+        values["end_time"] = case(
+            (
+                or_(
+                    MapGroupSummary.end_time.is_(None),
+                    MapGroupSummary.end_time < end_time,
+                ),
+                end_time,
+            ),
+            else_=MapGroupSummary.end_time,
+        )
+
+    if synced:
+        values["last_sync"] = datetime.now(timezone.utc)
+
+    session.execute(
+        update(MapGroupSummary)
+        .where(MapGroupSummary.map_group_id == map_group_id)
+        .values(**values)
+    )
+
+
+def _totals(session: Session, *where) -> bulk_result:
+    """
+    Count the maps, bands, and layers matching the given criteria (on the
+    joined maps/bands/layers tables) along with the size of their files.
+    """
+
+    maps, bands, layers = session.execute(
+        select(
+            func.count(MapORM.id.distinct()),
+            func.count(BandORM.id.distinct()),
+            func.count(LayerORM.id.distinct()),
+        )
+        .select_from(MapORM)
+        .outerjoin(BandORM, BandORM.map_id == MapORM.id)
+        .outerjoin(LayerORM, LayerORM.band_id == BandORM.id)
+        .where(*where)
+    ).one()
+
+    providers = session.execute(
+        select(LayerORM.provider)
+        .join(BandORM, LayerORM.band_id == BandORM.id)
+        .join(MapORM, BandORM.map_id == MapORM.id)
+        .where(*where)
+    ).scalars()
+
+    return bulk_result(
+        maps=maps, bands=bands, layers=layers, fits_bytes=layers_file_size(providers)
+    )
+
+
+def _decremented(column, amount: int):
+    return case((column > amount, column - amount), else_=0)
+
+
+def _subtract(session: Session, map_group_id: int, removed: bulk_result):
+    session.execute(
+        update(MapGroupSummary)
+        .where(MapGroupSummary.map_group_id == map_group_id)
+        .values(
+            maps=_decremented(MapGroupSummary.maps, removed.maps),
+            bands=_decremented(MapGroupSummary.bands, removed.bands),
+            layers=_decremented(MapGroupSummary.layers, removed.layers),
+            total_fits_bytes=_decremented(
+                MapGroupSummary.total_fits_bytes, removed.fits_bytes
+            ),
+        )
+    )
+
+
+def record_map_removal(session: Session, map_id: int):
+    """
+    Remove a map and its children from its group's summary. Call this before
+    the map is deleted.
+    """
+
+    map_group_id = session.execute(
+        select(MapORM.map_group_id).where(MapORM.id == map_id)
+    ).scalar_one_or_none()
+
+    if map_group_id is None:
+        return
+
+    _subtract(
+        session=session,
+        map_group_id=map_group_id,
+        removed=_totals(session, MapORM.id == map_id),
+    )
+
+
+def record_band_removal(session: Session, band_id: int):
+    """
+    Remove a band and its layers from its group's summary. Call this before
+    the band is deleted.
+    """
+
+    map_group_id = session.execute(
+        select(MapORM.map_group_id)
+        .join(BandORM, BandORM.map_id == MapORM.id)
+        .where(BandORM.id == band_id)
+    ).scalar_one_or_none()
+
+    if map_group_id is None:
+        return
+
+    removed = _totals(session, BandORM.id == band_id)
+
+    _subtract(
+        session=session,
+        map_group_id=map_group_id,
+        removed=removed._replace(maps=0),
+    )
+
+
+def refresh_summary(session: Session, map_group_id: int) -> MapGroupSummary:
+    """
+    Recompute a map group's summary from scratch. This is expensive for large
+    groups and is only used to backfill groups that have no summary yet. The
+    time range cannot be recovered and is left empty.
+    """
+
+    totals = _totals(session, MapORM.map_group_id == map_group_id)
+
+    summary = _get_or_create(session=session, map_group_id=map_group_id)
+
+    summary.maps = totals.maps
+    summary.bands = totals.bands
+    summary.layers = totals.layers
+    summary.total_fits_bytes = totals.fits_bytes
+
+    return summary
+
+
+def backfill_summaries(
+    session: Session, limit: int, worker_index: int = 0, worker_count: int = 1
+) -> int:
+    """
+    Create summaries for up to `limit` map groups that do not yet have one,
+    committing after each. Groups are sharded between background workers by
+    id. Returns the number of summaries created.
+    """
+
+    missing = (
+        session.execute(
+            select(MapGroupORM.id)
+            .outerjoin(MapGroupSummary, MapGroupSummary.map_group_id == MapGroupORM.id)
+            .where(
+                MapGroupSummary.map_group_id.is_(None),
+                MapGroupORM.id % worker_count == worker_index,
+            )
+            .order_by(MapGroupORM.id)
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+    for map_group_id in missing:
+        refresh_summary(session=session, map_group_id=map_group_id)
+        session.commit()
+
+    return len(missing)
@@ -0,0 +1,200 @@
+"""
+Observation times of maps and bands, kept in indexed side tables alongside
+the tilemaker tables so that maps can be found by date range without
+parsing their names or descriptions.
+
+Band times are written when bands are ingested; the time span of a map is
+derived from those of its bands.
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.orm import Session
+from structlog import get_logger
+from tilemaker.metadata.orm import BandORM, Base, MapORM
+
+
+class BandTime(Base):
+    __tablename__ = "band_times"
+
+    band_id = Column(
+        Integer, ForeignKey("bands.id", ondelete="CASCADE"), primary_key=True
+    )
+    map_id = Column(
+        Integer, ForeignKey("maps.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+
+    # Stored as naive UTC. The central time is unknown for bands backfilled
+    # from their descriptions.
+    start_time = Column(DateTime, nullable=False, index=True)
+    central_time = Column(DateTime, nullable=True, index=True)
+    end_time = Column(DateTime, nullable=False, index=True)
+
+
+class MapTime(Base):
+    __tablename__ = "map_times"
+    __table_args__ = (
+        Index("ix_map_times_group_start_end", "map_group_id", "start_time", "end_time"),
+    )
+
+    map_id = Column(
+        Integer, ForeignKey("maps.id", ondelete="CASCADE"), primary_key=True
+    )
+    # Copied from the map so that range queries within a group are answered
+    # from the index alone.
+    map_group_id = Column(
+        Integer, ForeignKey("map_groups.id", ondelete="CASCADE"), nullable=False
+    )
+
+    # The span of the map's bands; the central time is the earliest of theirs.
+    start_time = Column(DateTime, nullable=False, index=True)
+    central_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=False, index=True)
+
+
+def naive_utc(time: datetime) -> datetime:
+    """
+    Times are stored as naive UTC so that they compare consistently across
+    database backends.
+    """
+    if time.tzinfo is None:
+        return time
+
+    return time.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def overlapping(table: type[BandTime] | type[MapTime], start=None, end=None):
+    """
+    Criteria selecting rows whose time span overlaps `[start, end]`; either
+    bound may be left open.
+    """
+
+    criteria = []
+
+    if start is not None:
+        criteria.append(table.end_time >= naive_utc(start))
+
+    if end is not None:
+        criteria.append(table.start_time <= naive_utc(end))
+
+    return criteria
+
+
+def refresh_map_times(
+    session: Session | Connection, map_ids: Iterable[int], batch_size: int = 5000
+):
+    """
+    Recompute the time spans of the given maps from their bands. Does not
+    commit.
+    """
+
+    map_ids = sorted(set(map_ids))
+
+    for start in range(0, len(map_ids), batch_size):
+        _refresh_map_times(session, map_ids[start : start + batch_size])
+
+
+def _refresh_map_times(session: Session | Connection, map_ids: list[int]):
+    session.execute(delete(MapTime).where(MapTime.map_id.in_(map_ids)))
+    session.execute(
+        insert(MapTime).from_select(
+            ["map_id", "map_group_id", "start_time", "central_time", "end_time"],
+            select(
+                BandTime.map_id,
+                MapORM.map_group_id,
+                func.min(BandTime.start_time),
+                func.min(BandTime.central_time),
+                func.max(BandTime.end_time),
+            )
+            .join(MapORM, MapORM.id == BandTime.map_id)
+            .where(BandTime.map_id.in_(map_ids))
+            .group_by(BandTime.map_id, MapORM.map_group_id),
+        )
+    )
+
+
+def record_band_times(
+    session: Session | Connection, rows: list[dict[str, Any]], batch_size: int = 5000
+):
+    """
+    Write times for new bands, given as dictionaries of `band_id`, `map_id`,
+    and `start_time`/`central_time`/`end_time`, and update their maps' spans
+    to match. Does not commit.
+    """
+
+    if not rows:
+        return
+
+    rows = [
+        {
+            **x,
+            "start_time": naive_utc(x["start_time"]),
+            "central_time": None
+            if x.get("central_time") is None
+            else naive_utc(x["central_time"]),
+            "end_time": naive_utc(x["end_time"]),
+        }
+        for x in rows
+    ]
+
+    for start in range(0, len(rows), batch_size):
+        session.execute(insert(BandTime), rows[start : start + batch_size])
+
+    refresh_map_times(session, (x["map_id"] for x in rows), batch_size=batch_size)
+
+
+# Mapcat bands were described as "... from {start} to {end}" before their
+# times were recorded.
+DESCRIPTION_TIMES = re.compile(r"from (\S+ \S+) to (\S+ \S+)$")
+
+
+def backfill_band_times(connection: Connection, batch_size: int = 5000):
+    """
+    Recover times for bands that have none from their descriptions, where
+    they were written by the mapcat ingestion.
+    """
+
+    rows = []
+    missing = connection.execute(
+        select(BandORM.id, BandORM.map_id, BandORM.description)
+        .outerjoin(BandTime, BandTime.band_id == BandORM.id)
+        .where(BandTime.band_id.is_(None), BandORM.description.like("%from % to %"))
+    )
+
+    for id, map_id, description in missing:
+        match = DESCRIPTION_TIMES.search(description)
+
+        if match is None:
+            continue
+
+        try:
+            start_time, end_time = map(datetime.fromisoformat, match.groups())
+        except ValueError:
+            continue
+
+        rows.append(
+            {
+                "band_id": id,
+                "map_id": map_id,
+                "start_time": start_time,
+                "end_time": end_time,
+            }
+        )
+
+    record_band_times(connection, rows, batch_size=batch_size)
+
+    get_logger().info("migrations.band_times_backfilled", bands=len(rows))
@@ -0,0 +1,232 @@
+"""
+Export and import of whole map groups, for replicating a curated group
+between deployments without re-reading any FITS files.
+
+The format is gzip-compressed JSON lines. The first record describes the
+map group, followed by every map, then every band, then every layer. Each
+record carries a `type` and the row's columns; children refer to their
+parents by string ID (`map_id`, `band_id`) rather than database ID.
+"""
+
+import json
+import zlib
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Table, Text, cast, select
+from sqlalchemy.orm import Session
+from structlog import get_logger
+from tilemaker.metadata.orm import BandORM, LayerORM, MapGroupORM, MapORM
+
+from tileadder.service.bulk import BulkInsert, bulk_result
+from tileadder.service.filesystem import compact_provider
+from tileadder.service.summary import MapGroupSummary, record_additions
+
+FORMAT_VERSION = 1
+
+
+def _columns(table: Table, *exclude: str) -> list:
+    return [c for c in table.c if c.name != "id" and c.name not in exclude]
+
+
+def _isoformat(time: datetime | None) -> str | None:
+    return time.isoformat() if time is not None else None
+
+
+def _fromisoformat(time: str | None) -> datetime | None:
+    return datetime.fromisoformat(time) if time is not None else None
+
+
+def _encode(record: dict[str, Any]) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+
+def _lines(session: Session, map_group_id: int, batch_size: int) -> Iterator[str]:
+    map_group = session.get(MapGroupORM, map_group_id)
+
+    if map_group is None:
+        raise ValueError(f"Map group with ID {map_group_id} does not exist")
+
+    summary = session.get(MapGroupSummary, map_group_id)
+
+    yield _encode(
+        {
+            "type": "map_group",
+            "version": FORMAT_VERSION,
+            "map_group_id": map_group.map_group_id,
+            "name": map_group.name,
+            "description": map_group.description,
+            "grant": map_group.grant,
+            "total_fits_bytes": summary.total_fits_bytes if summary else None,
+            "start_time": _isoformat(summary.start_time) if summary else None,
+            "end_time": _isoformat(summary.end_time) if summary else None,
+        }
+    )
+
+    in_group = MapORM.map_group_id == map_group_id
+
+    maps = select(*_columns(MapORM.__table__, "map_group_id")).where(in_group)
+
+    bands = (
+        select(*_columns(BandORM.__table__, "map_id"), MapORM.map_id)
+        .join(MapORM, BandORM.map_id == MapORM.id)
+        .where(in_group)
+    )
+
+    # Providers are read as their stored JSON text and spliced into the
+    # output as-is, rather than being decoded and re-encoded for every layer.
+    layers = (
+        select(
+            *_columns(LayerORM.__table__, "band_id", "provider"),
+            BandORM.band_id,
+            cast(LayerORM.provider, Text).label("provider"),
+        )
+        .join(BandORM, LayerORM.band_id == BandORM.id)
+        .join(MapORM, BandORM.map_id == MapORM.id)
+        .where(in_group)
+    )
+
+    for kind, statement in (("map", maps), ("band", bands)):
+        for row in session.execute(
+            statement.execution_options(yield_per=batch_size)
+        ).mappings():
+            yield _encode({"type": kind, **row})
+
+    for row in session.execute(
+        layers.execution_options(yield_per=batch_size)
+    ).mappings():
+        record = {"type": "layer", **row}
+        provider = record.pop("provider")
+        yield f'{_encode(record)[:-1]},"provider":{provider}}}'
+
+
+def export_map_group(
+    session: Session, map_group_id: int, batch_size: int = 5000
+) -> Iterator[bytes]:
+    """
+    Export a map group and all of its children, yielding chunks of the
+    gzip-compressed JSON-lines file. Rows are streamed from the database in
+    batches, so memory use does not grow with the size of the group.
+    """
+
+    # wbits=31 writes a gzip header and trailer, so the output can be
+    # read back with the gzip module or gunzip.
+    compressor = zlib.compressobj(wbits=31)
+
+    lines = []
+
+    for line in _lines(session, map_group_id, batch_size):
+        lines.append(line)
+
+        if len(lines) >= batch_size:
+            yield compressor.compress(("\n".join(lines) + "\n").encode())
+            lines = []
+
+    if lines:
+        yield compressor.compress(("\n".join(lines) + "\n").encode())
+
+    yield compressor.flush()
+
+
+def import_map_group(
+    session: Session, lines: Iterable[bytes | str], batch_size: int = 5000
+) -> tuple[int, bulk_result]:
+    """
+    Import a map group from the (decompressed) lines of an export. If a map
+    group with the same `map_group_id` already exists, the import is merged
+    into it and maps, bands, and layers that are already present are
+    skipped. FITS files are never opened. Returns the database ID of the
+    map group and the number of rows written.
+    """
+
+    log = get_logger()
+
+    lines = iter(lines)
+    header = json.loads(next(lines, "null") or "null")
+
+    if header is None or header.get("type") != "map_group":
+        raise ValueError("Not a map group export: missing map group record")
+
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export version {header.get('version')}")
+
+    map_group = session.execute(
+        select(MapGroupORM).where(MapGroupORM.map_group_id == header["map_group_id"])
+    ).scalar_one_or_none()
+
+    created = map_group is None
+
+    if created:
+        map_group = MapGroupORM(
+            map_group_id=header["map_group_id"],
+            name=header["name"],
+            description=header["description"],
+            grant=header["grant"],
+        )
+        session.add(map_group)
+        session.flush()
+        inserter = BulkInsert(batch_size=batch_size)
+    else:
+        inserter = BulkInsert.for_map_group(
+            session=session, map_group_id=map_group.id, batch_size=batch_size
+        )
+
+    totals = bulk_result(maps=0, bands=0, layers=0, fits_bytes=0)
+
+    def write():
+        nonlocal totals
+        written = inserter.write(session=session, measure_files=False)
+        totals = bulk_result(*(a + b for a, b in zip(totals, written)))
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        record: dict[str, Any] = json.loads(line)
+        kind = record.pop("type")
+
+        if kind == "map":
+            if not inserter.has_map(record["map_id"]):
+                inserter.add_map(map_group_id=map_group.id, **record)
+        elif kind == "band":
+            if not inserter.has_band(record["band_id"]):
+                inserter.add_band(**record)
+        elif kind == "layer":
+            if not inserter.has_layer(record["layer_id"]):
+                record["provider"] = compact_provider(record["provider"])
+                inserter.add_layer(**record)
+        else:
+            raise ValueError(f"Unknown record type {kind!r} in map group export")
+
+        # Maps and bands always precede their layers in the file, so any
+        # pending parents are written along with the layers.
+        if len(inserter.layers) >= batch_size:
+            write()
+
+    write()
+
+    # Measuring file sizes would mean touching every file, so a newly
+    # created group takes its size from the exporting deployment.
+    if created and header.get("total_fits_bytes"):
+        totals = totals._replace(fits_bytes=header["total_fits_bytes"])
+
+    record_additions(
+        session=session,
+        map_group_id=map_group.id,
+        written=totals,
+        start_time=_fromisoformat(header.get("start_time")),
+        end_time=_fromisoformat(header.get("end_time")),
+    )
+    session.commit()
+
+    log.info(
+        "transfer.imported",
+        map_group_id=header["map_group_id"],
+        created=created,
+        maps=totals.maps,
+        bands=totals.bands,
+        layers=totals.layers,
+    )
+
+    return map_group.id, totals
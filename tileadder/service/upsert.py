@@ -0,0 +1,156 @@
+"""
+Idempotent upserts of bands and layers into existing maps, using
+INSERT ... ON CONFLICT against composite unique indexes so that re-adding
+a file only ever touches the rows it contains.
+"""
+
+from collections import namedtuple
+from typing import Any
+
+from sqlalchemy import Index, case, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from tilemaker.metadata.orm import BandORM, LayerORM
+
+upsert_result = namedtuple(
+    "UpsertResult", ("band_id", "band_created", "created", "updated")
+)
+
+# Bands are unique by name within a map, and layers by ID within a band. These
+# are the conflict targets for the upserts below, created by the first
+# migration in tileadder.service.migrations.
+band_name_index = Index(
+    "uq_bands_map_id_name", BandORM.map_id, BandORM.name, unique=True
+)
+layer_id_index = Index(
+    "uq_layers_band_id_layer_id", LayerORM.band_id, LayerORM.layer_id, unique=True
+)
+
+UPSERT_INDEXES = (band_name_index, layer_id_index)
+
+# Columns of an existing layer that are overwritten when it is re-added.
+LAYER_UPDATE_COLUMNS = (
+    "name",
+    "description",
+    "grant",
+    "quantity",
+    "units",
+    "number_of_levels",
+    "tile_size",
+    "cmap",
+    "provider",
+    "bounding_left",
+    "bounding_right",
+    "bounding_top",
+    "bounding_bottom",
+)
+
+# Colour range columns, which are only overwritten by concrete values: a
+# re-added layer asking for "auto" keeps any range already computed for it.
+LAYER_RANGE_COLUMNS = ("vmin", "vmax")
+
+
+def dialect_insert(session: Session):
+    """
+    The dialect's own `insert`, which supports ON CONFLICT clauses.
+    """
+    name = session.get_bind().dialect.name
+
+    if name == "sqlite":
+        return sqlite.insert
+    if name == "postgresql":
+        return postgresql.insert
+
+    raise NotImplementedError(f"Upserts are not supported on {name}")
+
+
+def upsert_band(
+    session: Session,
+    map_id: int,
+    band_id: str,
+    name: str,
+    description: str | None,
+    grant: str | None,
+) -> tuple[int, str | None, bool]:
+    """
+    Find the band with this name in the map, creating it if needed. Existing
+    bands are left as they are. Returns the band's database ID, its grant,
+    and whether it was created.
+    """
+
+    existing = session.execute(
+        select(BandORM.id).where(BandORM.map_id == map_id, BandORM.name == name)
+    ).scalar_one_or_none()
+
+    insert = dialect_insert(session)
+
+    statement = insert(BandORM.__table__).values(
+        map_id=map_id,
+        band_id=band_id,
+        name=name,
+        description=description,
+        grant=grant,
+    )
+    # A no-op update, rather than DO NOTHING, so that RETURNING always
+    # hands back the row.
+    statement = statement.on_conflict_do_update(
+        index_elements=[BandORM.map_id, BandORM.name],
+        set_={"name": statement.excluded.name},
+    ).returning(BandORM.id, BandORM.grant)
+
+    id, grant = session.execute(statement).one()
+
+    return id, grant, existing is None
+
+
+def upsert_layers(
+    session: Session,
+    band_id: int,
+    layers: list[dict[str, Any]],
+    batch_size: int = 1000,
+) -> tuple[list[str], list[str]]:
+    """
+    Insert or update layers in a band, in batches. Each layer is a dictionary
+    of LayerORM columns including `layer_id`. Returns the layer IDs that were
+    created and those that were updated.
+    """
+
+    insert = dialect_insert(session)
+
+    created = []
+    updated = []
+
+    for start in range(0, len(layers), batch_size):
+        batch = [{**x, "band_id": band_id} for x in layers[start : start + batch_size]]
+        layer_ids = [x["layer_id"] for x in batch]
+
+        existing = set(
+            session.execute(
+                select(LayerORM.layer_id).where(
+                    LayerORM.band_id == band_id, LayerORM.layer_id.in_(layer_ids)
+                )
+            ).scalars()
+        )
+
+        statement = insert(LayerORM.__table__)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[LayerORM.band_id, LayerORM.layer_id],
+            set_={
+                **{c: excluded[c] for c in LAYER_UPDATE_COLUMNS},
+                **{
+                    c: case(
+                        (excluded[c] == "auto", LayerORM.__table__.c[c]),
+                        else_=excluded[c],
+                    )
+                    for c in LAYER_RANGE_COLUMNS
+                },
+            },
+        )
+
+        session.execute(statement, batch)
+
+        created += [x for x in layer_ids if x not in existing]
+        updated += [x for x in layer_ids if x in existing]
+
+    return created, updated
@@ -2,6 +2,7 @@
 Settings for the tileadder system
 """
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Literal
 from uuid import UUID
@@ -27,13 +28,88 @@ class Settings(BaseSettings):
     client_secret_filename: Path | None = None  # Suggest /data/client_secret
     public_key_filename: Path | None = None  # Suggest /data/public_key.pem
 
+    auth_cache_size: int = 1024
+    "Number of decoded access tokens to keep per server worker."
+    auth_cache_ttl_seconds: float = 60.0
+    "How long a decoded access token is reused for; never beyond its expiry."
+
     database_url: str = "sqlite:///database.db"
+    database_replica_url: str | None = None
+    "A read-only replica of the database, used for reads in the web interface."
+    replica_read_your_writes_seconds: int = 10
+    "How long a client's reads go to the primary after it changes something."
     map_directory: Path = Path(
         "/Users/borrow-adm/Documents/Projects/tileadder/tileadder"
     )
 
     default_required_grant: str = "simonsobs"
 
+    evaluate_workers: int = 4
+    "Number of files read in parallel when evaluating a batch from /add."
+    prefetch_metadata: bool = True
+    "Whether listing a directory in /add reads ahead the metadata of its files."
+    prefetch_max_files: int = 16
+    "Maximum number of files read ahead for each listing."
+    prefetch_workers: int = 1
+    "Number of files read ahead in parallel, across all users."
+    preview_size: int = 512
+    "Longest side, in pixels, of the layer previews shown when evaluating."
+    preview_workers: int = 2
+    "Number of layer previews rendered in parallel."
+
+    mapcat_engine_max_idle_seconds: float = 3600.0
+    "How long a pooled mapcat engine may go unused before it is disposed of."
+    adapt_mapcat_cadence: bool = True
+    "Whether each mapcat's check interval adapts to how often it changes."
+    mapcat_min_interval_minutes: float = 15.0
+    "Shortest interval between checks of a mapcat when adapting."
+    mapcat_max_interval_minutes: float = 7 * 24 * 60.0
+    "Longest interval between checks of a mapcat when adapting."
+    mapcat_sync_history: int = 20
+    "Number of recent checks kept for each mapcat, and used to adapt its interval."
+
+    host: str = "0.0.0.0"
+    port: int = 8000
+    migrate_on_startup: bool = True
+    "Whether the web app migrates at start-up; otherwise run `tileadder migrate`."
+    server_workers: int = 1
+    "Number of uvicorn worker processes sharing the listening socket."
+    background_workers: int = 1
+    "Number of background processes; mapcats are sharded between them."
+    restart_backoff_seconds: float = 1.0
+    "Initial delay before restarting a crashed child; doubles on each crash."
+    restart_backoff_max_seconds: float = 60.0
+    shutdown_grace_seconds: float = 30.0
+    "How long children are given to finish their work on shutdown."
+    server_heartbeat_timeout_seconds: float = 60.0
+    "How long a server worker's event loop may stall before it is restarted."
+    background_heartbeat_timeout_seconds: float = 6 * 60 * 60.0
+    "How long a round of background tasks may run before it is restarted."
+
+    watch_for_changes: bool = True
+    "Whether the background process watches mapcats for changes between runs."
+    watch_debounce_seconds: float = 10.0
+    "How long a watched file must be quiet before its change is acted on."
+
+    compute_layer_ranges: bool = False
+    "Whether the background process fills in vmin/vmax for layers left on auto."
+    layer_range_percentiles: tuple[float, float] = (1.0, 99.0)
+    "Percentiles of the (non-zero, finite) data used for vmin and vmax."
+    layer_range_max_samples: int = 1_000_000
+    "Approximate number of pixels sampled from each layer."
+    layer_range_workers: int = 4
+    "Number of layers whose ranges are computed in parallel."
+
+    pregenerate_tiles: bool = False
+    "Whether the background process pre-renders the top levels of new layers."
+    tile_cache_directory: Path = Path("tiles")
+    "Where pre-rendered tiles are written, laid out like tilemaker's tile URLs."
+    pregenerate_levels: int = 3
+    "Number of zoom levels, from the top of the pyramid, to pre-render."
+    pregenerate_workers: int = 4
+    "Number of tiles rendered in parallel."
+    pregenerate_format: Literal["webp", "png", "jpg"] = "webp"
+
     model_config = SettingsConfigDict(env_prefix="TILEADDER_", env_file=".env")
 
     @model_validator(mode="after")
@@ -50,3 +126,12 @@ class Settings(BaseSettings):
         self.public_key = self.public_key or maybe_read(self.public_key_filename)
 
         return self
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """
+    The settings for this process, read from the environment once and
+    shared between all modules.
+    """
+    return Settings()